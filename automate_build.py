@@ -16,6 +16,8 @@ parser.add_argument('-app', '--AppName', help='(STRING) App name', required=True
 parser.add_argument('-metadata', '--FlagMetadata', help='(BOOLEAN) Flag: Upload metadata files and staging', required=True)
 parser.add_argument('-build', '--FlagBuild', help='(BOOLEAN) Flag: Execute build', required=True)
 parser.add_argument('-grant', '--FlagGrant', help='(BOOLEAN) Flag: Grant permissions to EXEC role', required=True)
+parser.add_argument('-force', '--FlagForce', help='(BOOLEAN) Flag: Execute all model files, even the unchanged ones', action='store_true')
+parser.add_argument('-dryrun', '--FlagDryRun', help='(BOOLEAN) Flag: Only report the planned table migrations', action='store_true')
 
 args = vars(parser.parse_args())
 print(args)
@@ -24,7 +26,9 @@ app_name = args['AppName']
 flag_metadata = args['FlagMetadata']
 flag_build = args['FlagBuild']
 flag_grant = args['FlagGrant']
+flag_force = args['FlagForce']
+flag_dry_run = args['FlagDryRun']
 env_number = args['EnvironmentNumber'] if args['EnvironmentNumber'] else 0
 
-build = BuildRaven(database_name, app_name, flag_metadata, flag_build, flag_grant,env_number)
+build = BuildRaven(database_name, app_name, flag_metadata, flag_build, flag_grant,env_number,flag_force,flag_dry_run)
 result_dict = build.build_raven()
@@ -0,0 +1,92 @@
+#%%
+"""
+Benchmark of the RAVEN_COBID expression of the COPY statements (models/shared/copy_cob.py).
+
+Runs the COPY of the load plan of a wide dataset (RAVEN.METADATA_LOAD_PLAN), with every column of the file, into a temporary
+table like its target table, once per expression of RAVEN_COBID, and reports the rows per second:
+- FN_FIND_COB: RAVEN.FN_FIND_COB(metadata$filename) for every row (Snowpipe)
+- LOOKUP: CASE on metadata$filename with the COB of each listed file
+- LITERAL: the COB of the files as a number
+
+The files are the files of one COB (the COB is in the pattern), so the LITERAL expression applies.
+Each run truncates the table and loads the files again with FORCE = TRUE, the first run of each expression is discarded.
+"""
+import sys
+import time
+import json
+from raven_app import RavenTargetDB as raven_app
+from utils import get_project_root
+sys.path.insert(0, f"{get_project_root()}\\models\\shared")
+from copy_cob import COB_PLACEHOLDER, FIND_COB_EXPRESSION, cob_expression, file_cob
+from header_probe import stage_file_path
+
+
+###### Change here ######
+db_name = 'dvlp_musbi_REGOPS'
+project_name = 'musbi'
+dataset_name = 'WIDE_FILE'
+cobid = 20230626
+file_pattern = '/20230626/.*wide_file.*[.]csv.*'
+runs = 3
+#########################
+
+raven = raven_app(db_name,project_name)
+session = raven.get_snowflake_session()
+session.sql("ALTER SESSION SET USE_CACHED_RESULT = FALSE").collect()
+
+#%%
+# Load plan of the dataset for the COB
+sf_smp = session.table("RAVEN.VW_METADATA_STAGE_ME_PARAMETERS_COB") \
+    .filter(f"DATASET_NAME = '{dataset_name}' AND RAVEN_COBID = {cobid}") \
+    .select("STAGE_NAME", "COPY_TEMPLATE", "STAGING_SCOPE_FIELDS", "SOURCE_FILE_AND_FIELD").collect()
+assert sf_smp, f"No load plan for {dataset_name} and COB {cobid}"
+sf_smp = sf_smp[0]
+stage_name = sf_smp["STAGE_NAME"]
+target_table = json.loads(sf_smp["SOURCE_FILE_AND_FIELD"])["DESTINATION_FULL_TABLE_NAME"]
+assert str(cobid) in file_pattern, "The pattern must contain the COB"
+
+# Files of the pattern, as metadata$filename
+stage_url = session.sql(f"DESC STAGE {stage_name}").filter("\"property\" = 'URL'").collect()
+stage_url = stage_url[0]["property_value"].strip("[]\"") if stage_url else ""
+listed = session.sql(f"LIST @{stage_name} PATTERN = '.*{file_pattern}'").collect()
+file_paths = [stage_file_path(stage_name, r["name"], stage_url).split("/", 1)[1] for r in listed]
+assert file_paths, f"No file for the pattern {file_pattern}"
+assert {file_cob(path) for path in file_paths} == {cobid}, f"The files of the pattern are not all of the COB {cobid}"
+print(f"Files: {len(file_paths)}, columns: {sf_smp['COPY_TEMPLATE'].split('(', 1)[1].split(')', 1)[0].count(',') + 1}")
+
+expressions = {
+    "FN_FIND_COB": FIND_COB_EXPRESSION,
+    "LOOKUP": cob_expression(file_paths, ".*"),
+    "LITERAL": cob_expression(file_paths, file_pattern),
+}
+assert expressions["LOOKUP"].startswith("CASE"), expressions["LOOKUP"]
+assert expressions["LITERAL"] == str(cobid), expressions["LITERAL"]
+
+# Same COPY as PY_STAGE_ME, into a temporary table like the target table
+session.sql(f"CREATE OR REPLACE TEMPORARY TABLE RAVEN.TEMP_BENCHMARK_COPY_COB LIKE {db_name}.{target_table}").collect()
+cmd_copy = sf_smp["COPY_TEMPLATE"] \
+    .replace(f"|:DATABASE_TARGET:|.{target_table}", "RAVEN.TEMP_BENCHMARK_COPY_COB") \
+    .replace("|:PATTERN_FILE:|", file_pattern) \
+    .replace("|:STAGING_SCOPE_FIELDS:|", str(json.loads(sf_smp["STAGING_SCOPE_FIELDS"]))) + " FORCE = TRUE "
+
+#%%
+benchmark = {}
+for name, expression in expressions.items():
+    cmd_load = cmd_copy.replace(COB_PLACEHOLDER, expression)
+    elapsed = []
+    for run in range(runs + 1):
+        session.sql("TRUNCATE TABLE RAVEN.TEMP_BENCHMARK_COPY_COB").collect()
+        start = time.perf_counter()
+        session.sql(cmd_load).collect()
+        elapsed.append(time.perf_counter() - start)
+    rows = session.table("RAVEN.TEMP_BENCHMARK_COPY_COB").count()
+    seconds = min(elapsed[1:])
+    benchmark[name] = {"rows": rows, "seconds": round(seconds, 2), "rows_per_second": int(rows / seconds)}
+    print(f"{name}: {benchmark[name]}")
+
+#%%
+baseline = benchmark["FN_FIND_COB"]["rows_per_second"]
+for name, result in benchmark.items():
+    print(f"{name}: {result['rows_per_second']} rows/s ({result['rows_per_second'] / baseline:.2f}x FN_FIND_COB)")
+
+session.close()
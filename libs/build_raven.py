@@ -2,14 +2,14 @@ import sys, os, inspect, logging, time
 from snowflake.snowpark.types import *
 from snowflake.snowpark.functions import listagg
 
-from create_calendar import create_calendar
+from create_calendar import upload_calendar
 from raven_app import RavenTargetDB as raven_app
 from initialize_raven import InitializeRaven
 from utils import get_project_root
 
 class BuildRaven:
      
-     def __init__(self, database_name = "", app_name = "", flag_metadata = False, flag_build = False, flag_grant = False, env_number = 0):
+     def __init__(self, database_name = "", app_name = "", flag_metadata = False, flag_build = False, flag_grant = False, env_number = 0, flag_force = False, flag_dry_run = False):
           self.database_name = database_name
           self.database_env = (database_name.split("_")[0]).upper()
           self.database_name_app = database_name.split("_")[1]
@@ -18,6 +18,8 @@ class BuildRaven:
           self.flag_metadata = bool(flag_metadata)
           self.flag_build = bool(flag_build)
           self.flag_grant= bool(flag_grant)
+          self.flag_force = bool(flag_force)
+          self.flag_dry_run = bool(flag_dry_run)
 
 
      def build_raven(self):
@@ -44,23 +46,66 @@ class BuildRaven:
 
                result_dict = {}
 
-               if self.flag_build:
+               if self.flag_dry_run:
+                    # Only report the planned table changes
+                    print("Planning table migrations ...")
+                    migration_plan = init_raven.plan_table_migrations("models")
+                    logger.debug('Migration plan | %s',migration_plan)
+                    result_dict["Migration Plan"] = migration_plan
+
+               if self.flag_build and not self.flag_dry_run:
                     # Create schema RAVEN
                     create_schema = session.sql("CREATE SCHEMA IF NOT EXISTS RAVEN").collect()[0][0]
                     logger.debug('Create schema:: %s',create_schema)
                     result_dict["Create Schema"] = create_schema
                     session.use_schema("RAVEN")
 
+                    # Upload the shared Python modules imported by the procedures (IMPORTS clause)
+                    print("Uploading files ...")
+                    session.sql("CREATE STAGE IF NOT EXISTS RAVEN.INTSTAGE_RAVEN_FILES").collect()
+                    upload_result = init_raven.upload_files("models", build_configs.get("upload-max-workers", 8), build_configs.get("version", ""))
+                    logger.debug('Upload files | %s',upload_result)
+                    result_dict["Upload Files"] = upload_result["UPLOAD_SUMMARY"]
+                    # The procedures import the uploaded modules, the build stops before creating them
+                    if upload_result["UPLOAD_SUMMARY"]["failed"]:
+                         raise Exception(f"Upload failed: {upload_result['UPLOAD_SUMMARY']['failed_files']}")
+
                     print("Creating objects ...")
                     # Create objects
-                    exec_models_result = init_raven.execute_commands("models")
+                    exec_models_result = init_raven.execute_commands("models", build_configs.get("deploy-max-workers", 8), self.flag_force, build_configs.get("version", ""))
                     logger.debug('Create objects | %s',exec_models_result)
+                    logger.debug('Deploy report | %s',init_raven.deploy_report)
                     result_dict["Create Objects"] = exec_models_result
+                    result_dict["Deploy Report"] = init_raven.deploy_report
+
+                    # Fill the search columns of the staging log rows written before they existed
+                    print("Backfilling log keys ...")
+                    backfill_result = session.call("RAVEN.BACKFILL_LOG_STAGE_ME_STATUS_KEYS")
+                    logger.debug('Backfill log keys | %s',backfill_result)
+                    result_dict["Backfill Log Keys"] = backfill_result
+
+                    # Recompile the load plans, the metadata views may have changed
+                    print("Compiling load plans ...")
+                    compile_result = session.call("RAVEN.COMPILE_LOAD_PLANS")
+                    logger.debug('Compile load plans | %s',compile_result)
+                    result_dict["Compile Load Plans"] = compile_result
                     
                     if self.database_env == "PROD":
                          print("Resume tasks ...")
                          result_tasks = session.call("RAVEN.ALTER_TASKS")
                          logger.debug('Resume tasks | %s',result_tasks)
+                    else:
+                         # Tasks resumed outside PROD (resumed-tasks of eraven.yml): environments and schedule of each task
+                         for task_name, task_config in (build_configs.get("resumed-tasks") or {}).items():
+                              task_config = task_config or {}
+                              environments = [e.upper() for e in task_config.get("environments") or []]
+                              if environments and self.database_env not in environments:
+                                   continue
+                              if task_config.get("schedule"):
+                                   session.sql(f"ALTER TASK IF EXISTS RAVEN.{task_name} SUSPEND").collect()
+                                   session.sql(f"ALTER TASK IF EXISTS RAVEN.{task_name} SET SCHEDULE = '{task_config['schedule']}'").collect()
+                              result_task = session.sql(f"ALTER TASK IF EXISTS RAVEN.{task_name} RESUME").collect()
+                              logger.debug('Resume task %s | %s',task_name,result_task)
                     
                     # Create Stages in STAGING schema
                     print("Creating stages ...")
@@ -68,16 +113,17 @@ class BuildRaven:
                     logger.debug('Create External Stages | %s',exec_stages_result)
                     result_dict["Create External Stages"] = exec_stages_result
 
-               if self.flag_grant:                    
+               if self.flag_grant and not self.flag_dry_run:                 
                     print("Grating permissions ...")
                     grant_result = init_raven.grant_permission_raven()
                     logger.debug('Grant permission on RAVEN schema| %s',grant_result)
                     result_dict["Grant permission on RAVEN schema"] = grant_result
 
-               if self.flag_metadata:
-                    print("Creating CALENDAR.csv")
-                    df_calendar = create_calendar(params["country"],params["subdiv"],params["holiday_type"],params["fin_market"])
-                    df_calendar.to_csv(f"{root_path}/{build_configs['seed-path']}/{self.app_name}/CALENDAR.csv",index=False)
+               if self.flag_metadata and not self.flag_dry_run:
+                    # CALENDAR.csv was written in the seed folder by older deploys, the calendar is now merged by upload_calendar
+                    calendar_seed = f"{root_path}\\{build_configs['seed-path']}\\{self.app_name}\\CALENDAR.csv"
+                    if os.path.exists(calendar_seed):
+                         os.remove(calendar_seed)
 
                     print("Testing metadata ...")
                     result_validate_metadata = init_raven.build_metadata("test_metadata")
@@ -89,6 +135,18 @@ class BuildRaven:
                     logger.debug('Staging Metadata | %s',exec_metadata_result)
                     result_dict["Staging Metadata"] = exec_metadata_result
 
+                    # Only the calendar rows new or changed are merged into RAVEN.METADATA_CALENDAR
+                    print("Updating calendar ...")
+                    calendar_result = upload_calendar(session,params["calendar_markets"])
+                    logger.debug('Calendar | %s',calendar_result)
+                    result_dict["Calendar"] = calendar_result
+
+                    # The metadata upload refreshed the COB resolved stage parameters before the calendar was merged
+                    print("Refreshing stage parameters ...")
+                    refresh_result = session.call("RAVEN.REFRESH_STAGE_ME_PARAMETERS_COB")
+                    logger.debug('Refresh stage parameters | %s',refresh_result)
+                    result_dict["Refresh Stage Parameters"] = refresh_result
+
 
                print("----------- PROCESS COMPLETED -----------")
                return result_dict
@@ -1,78 +1,192 @@
 #%%
+"""
+Business calendar of RAVEN.METADATA_CALENDAR.
+
+The calendar covers from 3 years before to 3 years after the current year, for one or several markets in the same table
+(MARKET column). A market is a country holiday calendar (COUNTRY, SUBDIVISION) or a financial market calendar (FINANCIAL_MARKET),
+the first market of the app is the primary one (IS_PRIMARY_MARKET), used by the views and procedures joining on COBID.
+
+The holidays of each (market, year) are cached on disk in metadata\\holidays, so a deploy only asks the holidays package for the
+years it has not seen yet (or after an upgrade of the package). The columns are derived on the whole date range at once and
+only the rows new or changed compared with RAVEN.METADATA_CALENDAR are merged.
+"""
 from datetime import date
+import os, json
+import numpy as np
 import pandas as pd
 import holidays
-import warnings
+from utils import get_project_root
 
-warnings.simplefilter(action='ignore', category=pd.errors.PerformanceWarning)
+CALENDAR_YEARS_BEFORE = 3
+CALENDAR_YEARS_AFTER = 3
+
+def market_code(country,sdiv,holiday_type,fin_market):
+    """Return the MARKET of a calendar: the financial market, else the country and subdivision (GB-ENGLAND)
+
+    Args:
+        country (str): Country to get the national holidays for
+        sdiv (str): Subdivision Country (States, Provinces, etc...)
+        holiday_type (str): Financial or Country
+        fin_market (str): Financial market name
+    """
+    if holiday_type == 'Financial':
+        return fin_market.upper()
+    return f"{country}-{sdiv}".upper() if sdiv else country.upper()
+
+def get_year_holidays(year,country,sdiv,holiday_type,fin_market,cache_path=None):
+    """Return the list of holiday dates (YYYY-MM-DD) of one year, from the disk cache when it was already computed
+    with the same version of the holidays package.
 
-def get_national_holidays(start_date,end_date,country,sdiv,holiday_type,fin_market):
-    """Return a list of the dates of national holidays between two dates 
-    for a given country.
-    
     Args:
-        start_date (str): Start date of the period
-        end_date (str): End date of the period
+        year (int): Year of the holidays
         country (str): Country to get the national holidays for
         sdiv (str): Subdivision Country (States, Provinces, etc...)
-    
+        holiday_type (str): Financial or Country
+        fin_market (str): Financial market name
+        cache_path (str): Folder of the cache, metadata\\holidays when empty
+
     Returns:
-        list: List of national holiday dates
+        list: List of holiday dates
     """
+    cache_path = cache_path or f"{get_project_root()}\\metadata\\holidays"
+    cache_file = f"{cache_path}\\{holiday_type}_{market_code(country,sdiv,holiday_type,fin_market)}_{year}.json"
+
+    if os.path.exists(cache_file):
+        with open(cache_file) as f: cached = json.load(f)
+        if cached["version"] == holidays.__version__:
+            return cached["holidays"]
 
     # Get the Bank Holidays for the given country
     if holiday_type == 'Country':
-        holiday_days = holidays.CountryHoliday(country, subdiv = sdiv)
+        holiday_days = holidays.country_holidays(country, subdiv = sdiv, years = year)
     elif holiday_type == 'Financial':
-        holiday_days = holidays.financial_holidays(fin_market)
+        holiday_days = holidays.financial_holidays(fin_market, years = year)
+    else:
+        raise ValueError(f"Holiday type not supported: {holiday_type}")
+    year_holidays = sorted(day.isoformat() for day in holiday_days)
 
-    # Create a list of dates between the start and end date
-    date_range = pd.date_range(start_date, end_date)
+    os.makedirs(cache_path, exist_ok=True)
+    with open(cache_file, "w") as f: json.dump({"version": holidays.__version__, "holidays": year_holidays}, f)
+    return year_holidays
 
-    # Filter the dates to only include Bank Holidays
-    national_holidays = [date for date in date_range if date in holiday_days]
+def get_national_holidays(start_date,end_date,country,sdiv,holiday_type,fin_market):
+    """Return the dates of national holidays between two dates
+    for a given country.
 
-    return national_holidays
+    Args:
+        start_date (date): Start date of the period
+        end_date (date): End date of the period
+        country (str): Country to get the national holidays for
+        sdiv (str): Subdivision Country (States, Provinces, etc...)
+
+    Returns:
+        DatetimeIndex: National holiday dates
+    """
+    list_holidays = [day for year in range(start_date.year, end_date.year + 1)
+                     for day in get_year_holidays(year,country,sdiv,holiday_type,fin_market)]
+    national_holidays = pd.DatetimeIndex(list_holidays)
+    return national_holidays[(national_holidays >= pd.Timestamp(start_date)) & (national_holidays <= pd.Timestamp(end_date))]
 
 def create_calendar(country,sdiv,holiday_type,fin_market):
     """Return a calendar dataframe
-    
+
     Args:
         country (str): Country to get the national holidays for
         sdiv (str): Subdivision Country (States, Provinces, etc...)
         holiday_type (str): Financial or Country
         fin_market (str): Financial market name
-    
+
     Returns:
         MY_DATE: date of the year
-        IS_HOLIDAY: flag True or False
-        NEXT_WORKING_DAY: next working day considering holidays
-        CODID: MY_DATE as integer
+        IS_BANK_HOLIDAY: flag True or False
+        NEXT_BUSINESS_DAY: next working day considering holidays
+        COBID: MY_DATE as integer
+        MARKET: market of the calendar (see market_code)
     """
     # Get Start and End date
-    start_date = date(date.today().year-3, 1, 1)
-    end_date = date(date.today().year+3, 12, 31)
-
-    # Get list of holidays
-    list_holidays = get_national_holidays(start_date,end_date,country,sdiv,holiday_type,fin_market)
+    start_date = date(date.today().year-CALENDAR_YEARS_BEFORE, 1, 1)
+    end_date = date(date.today().year+CALENDAR_YEARS_AFTER, 12, 31)
 
-    # Transform list into Pandas dataframe
-    df_list_holidays = pd.DataFrame (list_holidays, columns = ['HOLIDAY'])
-    df_list_holidays.index = list(df_list_holidays["HOLIDAY"])
+    # Get list of holidays, with the next year so the last days have a next business day
+    list_holidays = get_national_holidays(start_date,date(end_date.year+1, 12, 31),country,sdiv,holiday_type,fin_market)
 
     # Create a range of dates for calendar
     date_range = pd.date_range(start_date, end_date)
-    df_calendar = date_range.to_frame(name='MY_DATE')
-
-    # Join calendar with holiday to define the flag IS_BANK_HOLIDAY
-    df_calendar_holiday = df_calendar.join(df_list_holidays)
-    df_calendar_holiday["IS_BANK_HOLIDAY"] = df_calendar_holiday['HOLIDAY'].apply(lambda x: False if pd.isnull(x) else True)
-
-    # Add column NEXT_WORKING_DAY and COBID
-    df_calendar_holiday["NEXT_BUSINESS_DAY"] = df_calendar['MY_DATE'] + pd.offsets.CustomBusinessDay(1, holidays=list_holidays)
-    df_calendar_holiday["COBID"] = df_calendar['MY_DATE'].apply(lambda x: int(x.strftime("%Y%m%d")))
-    
-    # Drop column HOLIDAY
-    df_calendar_holiday.drop('HOLIDAY', axis=1, inplace=True)
-    
-    return df_calendar_holiday
+    df_calendar = date_range.to_frame(name='MY_DATE', index=False)
+    df_calendar["IS_BANK_HOLIDAY"] = date_range.isin(list_holidays)
+
+    # Next business day: the day is moved back to a business day (weekends and holidays) and one business day is added
+    df_calendar["NEXT_BUSINESS_DAY"] = pd.to_datetime(np.busday_offset(date_range.values.astype("datetime64[D]"), 1, roll="backward",
+                                                                       holidays=list_holidays.values.astype("datetime64[D]")))
+    df_calendar["COBID"] = (date_range.year * 10000 + date_range.month * 100 + date_range.day).astype("int64")
+    df_calendar["MARKET"] = market_code(country,sdiv,holiday_type,fin_market)
+
+    return df_calendar
+
+def create_calendars(markets):
+    """Return the calendar dataframe of several markets, the first one is the primary market
+
+    Args:
+        markets (list): List of dictionaries with country, subdiv, holiday_type and fin_market
+
+    Returns:
+        Calendar of each market (see create_calendar) with IS_PRIMARY_MARKET
+    """
+    df_calendars = []
+    for position, market in enumerate(markets):
+        df_calendar = create_calendar(market["country"],market["subdiv"],market["holiday_type"],market["fin_market"])
+        df_calendar["IS_PRIMARY_MARKET"] = position == 0
+        df_calendars.append(df_calendar)
+    return pd.concat(df_calendars, ignore_index=True).drop_duplicates(subset=["MARKET","COBID"])
+
+def get_calendar_delta(df_calendar,df_current):
+    """Return the rows of the calendar new or changed compared with the current table
+
+    Args:
+        df_calendar (DataFrame): Calendar (see create_calendars)
+        df_current (DataFrame): MARKET, COBID, IS_BANK_HOLIDAY, NEXT_BUSINESS_DAY and IS_PRIMARY_MARKET of RAVEN.METADATA_CALENDAR.
+                                Rows with an empty MARKET were merged before the column existed and belong to the primary market
+
+    Returns:
+        DataFrame: Calendar rows to merge
+    """
+    df_current = df_current.copy()
+    primary_market = df_calendar.loc[df_calendar["IS_PRIMARY_MARKET"], "MARKET"].iloc[0]
+    df_current["MARKET_IS_EMPTY"] = df_current["MARKET"].fillna("") == ""
+    df_current.loc[df_current["MARKET_IS_EMPTY"], "MARKET"] = primary_market
+    df_current["NEXT_BUSINESS_DAY"] = pd.to_datetime(df_current["NEXT_BUSINESS_DAY"])
+
+    df_compare = df_calendar.merge(df_current, on=["MARKET","COBID"], how="left", suffixes=("", "_CURRENT"), indicator=True)
+    changed = (df_compare["_merge"] == "left_only") \
+        | df_compare["MARKET_IS_EMPTY"].fillna(False).astype(bool) \
+        | (df_compare["IS_BANK_HOLIDAY"] != df_compare["IS_BANK_HOLIDAY_CURRENT"]) \
+        | (df_compare["NEXT_BUSINESS_DAY"] != df_compare["NEXT_BUSINESS_DAY_CURRENT"]) \
+        | (df_compare["IS_PRIMARY_MARKET"] != df_compare["IS_PRIMARY_MARKET_CURRENT"])
+    return df_calendar[changed.values].reset_index(drop=True)
+
+def upload_calendar(session,markets):
+    """Merges into RAVEN.METADATA_CALENDAR the calendar rows new or changed (metadata\\merging\\delta\\CALENDAR.sql)
+
+    Args:
+        session: Snowpark session
+        markets (list): List of dictionaries with country, subdiv, holiday_type and fin_market, the primary market first
+
+    Returns:
+        str: Result of the merge, "No changes" when the table is up to date
+    """
+    df_calendar = create_calendars(markets)
+    df_current = session.table("RAVEN.METADATA_CALENDAR")\
+        .select("MARKET","COBID","IS_BANK_HOLIDAY","NEXT_BUSINESS_DAY","IS_PRIMARY_MARKET")\
+        .to_pandas()
+
+    df_delta = get_calendar_delta(df_calendar,df_current)
+    if df_delta.shape[0] == 0:
+        return "No changes"
+
+    # Dates as text, as the seed CSV files
+    df_delta["MY_DATE"] = df_delta["MY_DATE"].dt.strftime("%Y-%m-%d")
+    df_delta["NEXT_BUSINESS_DAY"] = df_delta["NEXT_BUSINESS_DAY"].dt.strftime("%Y-%m-%d")
+    session.write_pandas(df_delta, "TEMP_METADATA_DELTA_CALENDAR", auto_create_table=True, overwrite=True, table_type="temporary")
+
+    with open(f"{get_project_root()}\\metadata\\merging\\delta\\CALENDAR.sql") as f: obj_cmd = f.read()
+    return session.sql(obj_cmd).collect()[0][0]
@@ -1,67 +1,392 @@
-from snowflake.snowpark.functions import listagg, col
+import re
 import sys
 import pandas as pd
 
+# Snowflake synonyms, as reported in INFORMATION_SCHEMA.COLUMNS.DATA_TYPE
+TEXT_TYPES = ["VARCHAR", "STRING", "TEXT", "CHAR", "CHARACTER", "NCHAR", "NVARCHAR", "NVARCHAR2", "CHAR VARYING", "NCHAR VARYING"]
+NUMBER_TYPES = ["NUMBER", "NUMERIC", "DECIMAL", "DEC"]
+INTEGER_TYPES = ["INT", "INTEGER", "BIGINT", "SMALLINT", "TINYINT", "BYTEINT"]
+FLOAT_TYPES = ["FLOAT", "FLOAT4", "FLOAT8", "DOUBLE", "DOUBLE PRECISION", "REAL"]
+TIMESTAMP_TYPES = {"TIMESTAMP": "TIMESTAMP_NTZ", "DATETIME": "TIMESTAMP_NTZ", "TIMESTAMP_NTZ": "TIMESTAMP_NTZ",
+                   "TIMESTAMP_LTZ": "TIMESTAMP_LTZ", "TIMESTAMP_TZ": "TIMESTAMP_TZ", "TIME": "TIME"}
+TEXT_MAX_LENGTH = 16777216
 
-def create_table(session,obj_cmd):
-    try:
-        obj_name = ((obj_cmd.split("TABLE")[1]).split("(")[0]).strip()
+COLUMN_KEYWORDS = r"(?=\s+(?:NOT\s+NULL|NULL|COLLATE|AUTOINCREMENT|IDENTITY|COMMENT|CONSTRAINT|PRIMARY|UNIQUE)\b|\s*$)"
+DEFAULT_PATTERN = re.compile(r"\bDEFAULT\s+('(?:[^']|'')*'|.+?)" + COLUMN_KEYWORDS, re.IGNORECASE)
+COLLATE_PATTERN = re.compile(r"\bCOLLATE\s+'([^']*)'", re.IGNORECASE)
+TYPE_PATTERN = re.compile(r"^([A-Z_]+(?:\s+(?:PRECISION|VARYING))?)\s*(?:\(([^)]*)\))?", re.IGNORECASE)
+CLUSTER_BY_PATTERN = re.compile(r"\bCLUSTER\s+BY\s*(?:LINEAR\s*)?\((.*)\)", re.IGNORECASE | re.DOTALL)
 
-        session.use_schema("RAVEN")
 
-        if "." not in obj_name:
-            raise Exception("Create table command has not schema")
+def split_top_level(text: str) -> list:
+    """Splits a column list on the commas that are not inside parentheses or quotes."""
+    items, depth, quoted, current = [], 0, False, ""
+    for char in text:
+        if char == "'":
+            quoted = not quoted
+        elif not quoted and char == "(":
+            depth += 1
+        elif not quoted and char == ")":
+            depth -= 1
+        if char == "," and depth == 0 and not quoted:
+            items.append(current.strip())
+            current = ""
         else:
-            table_schema, table_name = obj_name.split(".")
+            current += char
+    if current.strip():
+        items.append(current.strip())
+    return items
 
-        # Use Schema
-        session.use_schema(table_schema)
 
-        # Check tables exists
-        tbl = session.sql(f"SHOW TABLES LIKE '{table_name}'")
-        tbl_check = tbl.count()
+def column_list(obj_cmd: str) -> str:
+    """Returns the text between the parentheses of the CREATE TABLE column list."""
+    start = obj_cmd.index("(")
+    depth, quoted = 0, False
+    for position in range(start, len(obj_cmd)):
+        char = obj_cmd[position]
+        if char == "'":
+            quoted = not quoted
+        elif not quoted and char == "(":
+            depth += 1
+        elif not quoted and char == ")":
+            depth -= 1
+            if depth == 0:
+                return obj_cmd[start + 1:position]
+    raise Exception("Create table command has not a valid column list")
 
-        if tbl_check > 0:
 
-            # Create intermediated table
-            obj_name_inter = f"{obj_name}_INT"
-            table_name_inter = obj_name.split(".")[1]
-            obj_cmd = obj_cmd.replace(obj_name, obj_name_inter)
-            obj_create = session.sql(obj_cmd).collect()[0][0]
+def normalize_data_type(data_type: str, args: list) -> dict:
+    """
+    Converts a data type of the CREATE TABLE command to the INFORMATION_SCHEMA.COLUMNS representation.
+    Only the attributes that apply to the data type are kept.
+    """
+    data_type = " ".join(data_type.upper().split())
+    args = [int(a) for a in args if str(a).strip().lstrip("-").isdigit()]
+
+    if data_type in TEXT_TYPES:
+        default_length = 1 if data_type in ["CHAR", "CHARACTER", "NCHAR"] else TEXT_MAX_LENGTH
+        return {"DATA_TYPE": "TEXT", "LENGTH": args[0] if args else default_length}
+    if data_type in NUMBER_TYPES:
+        return {"DATA_TYPE": "NUMBER", "PRECISION": args[0] if args else 38, "SCALE": args[1] if len(args) > 1 else 0}
+    if data_type in INTEGER_TYPES:
+        return {"DATA_TYPE": "NUMBER", "PRECISION": 38, "SCALE": 0}
+    if data_type in FLOAT_TYPES:
+        return {"DATA_TYPE": "FLOAT"}
+    if data_type in TIMESTAMP_TYPES:
+        return {"DATA_TYPE": TIMESTAMP_TYPES[data_type], "DATETIME_PRECISION": args[0] if args else 9}
+    return {"DATA_TYPE": data_type}
+
+
+def normalize_default(default) -> str:
+    """String literals are kept as they are, expressions are compared in upper case."""
+    if default is None:
+        return None
+    default = str(default).strip()
+    return default if default.startswith("'") else default.upper()
+
+
+def normalize_clustering_key(clustering_key) -> str:
+    """Clustering key without LINEAR(), spaces and quotes, in upper case. None if the table is not clustered."""
+    if not isinstance(clustering_key, str) or not clustering_key.strip():
+        return None
+    key = "".join(clustering_key.split()).upper().replace('"', "")
+    return key[len("LINEAR("):-1] if key.startswith("LINEAR(") else key
+
+
+def parse_clustering_key(obj_cmd: str) -> str:
+    """Clustering key of the CLUSTER BY clause after the column list of a CREATE TABLE command (see normalize_clustering_key)."""
+    table_options = obj_cmd[obj_cmd.index("(") + len(column_list(obj_cmd)) + 2:]
+    cluster_match = CLUSTER_BY_PATTERN.search(table_options)
+    return normalize_clustering_key(cluster_match.group(1)) if cluster_match else None
+
+
+def parse_primary_key(obj_cmd: str) -> list:
+    """Columns of the primary key of a CREATE TABLE command (constraint or column option), in key order."""
+    primary_key = []
+    for item in split_top_level(column_list(obj_cmd)):
+        if re.match(r"^(CONSTRAINT\b|PRIMARY\s+KEY\b|UNIQUE\b|FOREIGN\s+KEY\b)", item, re.IGNORECASE):
+            pk_match = re.search(r"PRIMARY\s+KEY\s*\(([^)]*)\)", item, re.IGNORECASE)
+            if pk_match:
+                primary_key += [c.strip().strip('"').upper() for c in pk_match.group(1).split(",")]
+        elif re.search(r"\bPRIMARY\s+KEY\b", item, re.IGNORECASE):
+            primary_key.append(item.split(None, 1)[0].strip('"').upper())
+    return primary_key
+
+
+def parse_primary_key_name(obj_cmd: str) -> str:
+    """Name of the primary key constraint of a CREATE TABLE command, None if it is not named."""
+    for item in split_top_level(column_list(obj_cmd)):
+        name_match = re.match(r"^CONSTRAINT\s+(\S+)\s+PRIMARY\s+KEY\b", item, re.IGNORECASE)
+        if name_match:
+            return name_match.group(1).strip('"').upper()
+    return None
+
+
+def parse_create_table_columns(obj_cmd: str) -> list:
+    """
+    Parses the column list of a CREATE TABLE command.
+
+    Returns:
+        list: One dict per column, in the table order, with the keys COLUMN_NAME, DATA_TYPE (plus LENGTH,
+              PRECISION, SCALE, DATETIME_PRECISION when they apply), IS_NULLABLE, COLUMN_DEFAULT,
+              COLLATION_NAME and IS_IDENTITY
+    """
+    body = column_list(obj_cmd)
+
+    columns = []
+    primary_key = parse_primary_key(obj_cmd)
+    for item in split_top_level(body):
+        if re.match(r"^(CONSTRAINT\b|PRIMARY\s+KEY\b|UNIQUE\b|FOREIGN\s+KEY\b)", item, re.IGNORECASE):
+            continue
+
+        column_name, definition = item.split(None, 1)
+        type_match = TYPE_PATTERN.match(definition)
+        type_args = type_match.group(2).split(",") if type_match.group(2) else []
+        column = {"COLUMN_NAME": column_name.strip('"').upper()}
+        column.update(normalize_data_type(type_match.group(1), type_args))
+
+        options = definition[type_match.end():]
+        default_match = DEFAULT_PATTERN.search(options)
+        collate_match = COLLATE_PATTERN.search(options)
+        is_identity = re.search(r"\b(AUTOINCREMENT|IDENTITY)\b", options, re.IGNORECASE) is not None
+
+        column["IS_NULLABLE"] = re.search(r"\bNOT\s+NULL\b", options, re.IGNORECASE) is None
+        column["COLUMN_DEFAULT"] = None if is_identity or not default_match else normalize_default(default_match.group(1))
+        column["COLLATION_NAME"] = collate_match.group(1).lower() if collate_match else None
+        column["IS_IDENTITY"] = is_identity
+        columns.append(column)
+
+    # Snowflake enforces NOT NULL on primary key columns
+    for column in columns:
+        if column["COLUMN_NAME"] in primary_key:
+            column["IS_NULLABLE"] = False
+
+    return columns
+
+
+def get_catalog_snapshot(session, table_schema: str = "RAVEN") -> dict:
+    """
+    Reads the columns of every table of the schema with one query, and the primary keys with SHOW PRIMARY KEYS.
+
+    Returns:
+        dict: Table name as key and dict with BYTES, CLUSTERING_KEY (see normalize_clustering_key), COLUMNS
+              (same format as parse_create_table_columns) and PRIMARY_KEY (columns in key order) as value
+    """
+    df = session.sql(f"""
+        SELECT C.TABLE_NAME, C.COLUMN_NAME, C.ORDINAL_POSITION, C.DATA_TYPE, C.CHARACTER_MAXIMUM_LENGTH,
+               C.NUMERIC_PRECISION, C.NUMERIC_SCALE, C.DATETIME_PRECISION, C.IS_NULLABLE, C.COLUMN_DEFAULT,
+               C.COLLATION_NAME, C.IS_IDENTITY, T.BYTES, T.CLUSTERING_KEY
+        FROM INFORMATION_SCHEMA.COLUMNS C
+        INNER JOIN INFORMATION_SCHEMA.TABLES T
+            ON T.TABLE_SCHEMA = C.TABLE_SCHEMA AND T.TABLE_NAME = C.TABLE_NAME
+        WHERE C.TABLE_SCHEMA = '{table_schema}' AND T.TABLE_TYPE = 'BASE TABLE'
+        ORDER BY C.TABLE_NAME, C.ORDINAL_POSITION
+    """).to_pandas()
+
+    catalog = {}
+    for row in df.itertuples(index=False):
+        table = catalog.setdefault(row.TABLE_NAME, {"BYTES": row.BYTES, "CLUSTERING_KEY": normalize_clustering_key(row.CLUSTERING_KEY),
+                                                    "COLUMNS": [], "PRIMARY_KEY": []})
+        type_args = {"TEXT": [row.CHARACTER_MAXIMUM_LENGTH],
+                     "NUMBER": [row.NUMERIC_PRECISION, row.NUMERIC_SCALE]}.get(row.DATA_TYPE, [row.DATETIME_PRECISION])
+        column = {"COLUMN_NAME": row.COLUMN_NAME}
+        column.update(normalize_data_type(row.DATA_TYPE, [int(a) for a in type_args if pd.notna(a)]))
+        is_identity = row.IS_IDENTITY == "YES"
+        column["IS_NULLABLE"] = row.IS_NULLABLE == "YES"
+        column["COLUMN_DEFAULT"] = None if is_identity or pd.isna(row.COLUMN_DEFAULT) else normalize_default(row.COLUMN_DEFAULT)
+        column["COLLATION_NAME"] = row.COLLATION_NAME.lower() if isinstance(row.COLLATION_NAME, str) else None
+        column["IS_IDENTITY"] = is_identity
+        table["COLUMNS"].append(column)
+
+    primary_keys = session.sql(f"SHOW PRIMARY KEYS IN SCHEMA {table_schema}").collect()
+    for row in sorted(primary_keys, key=lambda r: (r["table_name"], r["key_sequence"])):
+        if row["table_name"] in catalog:
+            catalog[row["table_name"]]["PRIMARY_KEY"].append(row["column_name"].upper())
+
+    return catalog
+
+
+CONSTANT_DEFAULT_PATTERN = re.compile(r"^('(?:[^']|'')*'|-?\d+(\.\d+)?|TRUE|FALSE|NULL)$", re.IGNORECASE)
+
+
+def table_name_from_command(obj_cmd: str) -> str:
+    obj_name = ((obj_cmd.split("TABLE")[1]).split("(")[0]).strip()
+    if "." not in obj_name:
+        raise Exception("Create table command has not schema")
+    return obj_name
+
+
+def column_definitions(obj_cmd: str) -> dict:
+    """Column name as key and the column definition of the CREATE TABLE command as value."""
+    definitions = {}
+    for item in split_top_level(column_list(obj_cmd)):
+        if not re.match(r"^(CONSTRAINT\b|PRIMARY\s+KEY\b|UNIQUE\b|FOREIGN\s+KEY\b)", item, re.IGNORECASE):
+            definitions[item.split(None, 1)[0].strip('"').upper()] = item
+    return definitions
 
-            # Get columns from both versions
-            old_columns = session.table(obj_name).columns
-            new_columns = session.table(obj_name_inter).columns
-
-            # Compare the schema
-            df = session.table("INFORMATION_SCHEMA.COLUMNS")\
-                .filter(
-                    (col("TABLE_SCHEMA") == table_schema) &
-                    ((col("TABLE_NAME") == table_name) | (col("TABLE_NAME") == table_name_inter))
-                )
-            df_table = df.filter(col("TABLE_NAME") == table_name).drop(col("TABLE_NAME")).to_pandas()
-            df_table_int = df.filter(col("TABLE_NAME") == table_name_inter).drop(col("TABLE_NAME")).to_pandas()
-
-            df_diff = pd.concat([df_table, df_table_int]).drop_duplicates(keep=False)
-            
-            if old_columns != new_columns or df_diff.shape[0]>0:
-                # Insert Intersection Columns
-                inter_columns = [value for value in new_columns if value in old_columns]
-                srt_inter_columns = ",".join(inter_columns)
-                session.sql(f"INSERT INTO {obj_name_inter} ({srt_inter_columns}) SELECT {srt_inter_columns} FROM {obj_name}").collect()
-                # Swap and drop table
-                session.sql(f"ALTER TABLE {obj_name_inter} SWAP WITH {obj_name}").collect()
-
-            else:
-                obj_create = f"Table {obj_name} already exists"
- 
-            # Drop intermediated table   
-            session.sql(f"DROP TABLE IF EXISTS {obj_name_inter}").collect()
 
+def data_type_sql(column: dict) -> str:
+    if column["DATA_TYPE"] == "TEXT":
+        return f"VARCHAR({column['LENGTH']})"
+    if column["DATA_TYPE"] == "NUMBER":
+        return f"NUMBER({column['PRECISION']},{column['SCALE']})"
+    return column["DATA_TYPE"]
+
+
+def classify_column_change(old: dict, new: dict) -> list:
+    """
+    Classifies the differences of one column present in both versions of the table.
+
+    Returns:
+        list: (change class, ALTER COLUMN clause or None when the change can't be done in place)
+    """
+    changes = []
+    name = new["COLUMN_NAME"]
+
+    type_keys = ["DATA_TYPE", "LENGTH", "PRECISION", "SCALE", "DATETIME_PRECISION"]
+    if any(old.get(k) != new.get(k) for k in type_keys):
+        if old["DATA_TYPE"] == new["DATA_TYPE"] == "TEXT" and new["LENGTH"] > old["LENGTH"]:
+            changes.append(("WIDEN", f"{name} SET DATA TYPE {data_type_sql(new)}"))
+        elif old["DATA_TYPE"] == new["DATA_TYPE"] == "NUMBER" and new["SCALE"] == old["SCALE"] and new["PRECISION"] > old["PRECISION"]:
+            changes.append(("WIDEN", f"{name} SET DATA TYPE {data_type_sql(new)}"))
+        else:
+            changes.append(("INCOMPATIBLE_TYPE", None))
+
+    if old["COLUMN_DEFAULT"] != new["COLUMN_DEFAULT"]:
+        # Snowflake can only drop a default in place (or set a sequence, not used by Raven tables)
+        changes.append(("DEFAULT", f"{name} DROP DEFAULT" if new["COLUMN_DEFAULT"] is None else None))
+
+    if old["IS_NULLABLE"] != new["IS_NULLABLE"]:
+        changes.append(("NULLABILITY", f"{name} {'DROP' if new['IS_NULLABLE'] else 'SET'} NOT NULL"))
+
+    if old["COLLATION_NAME"] != new["COLLATION_NAME"] or old["IS_IDENTITY"] != new["IS_IDENTITY"]:
+        changes.append(("INCOMPATIBLE_TYPE", None))
+
+    return changes
+
+
+def plan_table_migration(obj_cmd: str, catalog: dict) -> dict:
+    """
+    Plans the statements to move an existing table to the version of the CREATE TABLE command.
+
+    The changes are classified as:
+        - ADD_COLUMN: column appended at the end, nullable or with a constant default -> ALTER TABLE ADD COLUMN
+        - DROP_COLUMN: column removed -> ALTER TABLE DROP COLUMN
+        - WIDEN: bigger VARCHAR length or NUMBER precision with the same scale -> ALTER COLUMN SET DATA TYPE
+        - DEFAULT / NULLABILITY: default removed or NOT NULL changed -> ALTER COLUMN
+        - CLUSTER_BY: CLUSTER BY clause added, changed or removed -> ALTER TABLE CLUSTER BY / DROP CLUSTERING KEY
+        - PRIMARY_KEY: primary key added, changed or removed -> ALTER TABLE DROP PRIMARY KEY / ADD PRIMARY KEY,
+          after the column changes so the new key columns exist
+        - REORDER / INCOMPATIBLE_TYPE / any other change -> copy of the table into <table>_INT and SWAP
+    
+    Only when one change can't be done in place the whole table is copied (COPY_SWAP).
+
+    Args:
+        obj_cmd (str): CREATE TABLE command
+        catalog (dict): Catalog snapshot (see get_catalog_snapshot)
+
+    Returns:
+        dict: TABLE_NAME, STRATEGY (CREATE, NONE, IN_PLACE or COPY_SWAP), CHANGES, STATEMENTS and ESTIMATED_BYTES_REWRITTEN
+    """
+    obj_name = table_name_from_command(obj_cmd)
+    table_name = obj_name.split(".")[1]
+    plan = {"TABLE_NAME": obj_name, "STRATEGY": "NONE", "CHANGES": [], "STATEMENTS": [], "ESTIMATED_BYTES_REWRITTEN": 0}
+
+    if table_name not in catalog:
+        plan.update({"STRATEGY": "CREATE", "CHANGES": [("CREATE", table_name)], "STATEMENTS": [obj_cmd]})
+        return plan
+
+    old_columns = {c["COLUMN_NAME"]: c for c in catalog[table_name]["COLUMNS"]}
+    new_columns = {c["COLUMN_NAME"]: c for c in parse_create_table_columns(obj_cmd)}
+    old_clustering_key = catalog[table_name].get("CLUSTERING_KEY")
+    new_clustering_key = parse_clustering_key(obj_cmd)
+    old_primary_key = catalog[table_name].get("PRIMARY_KEY", [])
+    new_primary_key = parse_primary_key(obj_cmd)
+    if list(old_columns.values()) == list(new_columns.values()) and old_clustering_key == new_clustering_key \
+            and old_primary_key == new_primary_key:
+        return plan
+
+    definitions = column_definitions(obj_cmd)
+    changes, clauses = [], []
+
+    # Columns kept must be in the same order and new columns can only be appended
+    old_kept = [c for c in old_columns if c in new_columns]
+    new_kept = [c for c in new_columns if c in old_columns]
+    new_names = list(new_columns)
+    last_kept = max([new_names.index(c) for c in new_kept], default=-1)
+    if old_kept != new_kept or any(new_names.index(c) < last_kept for c in new_names if c not in old_columns):
+        changes.append(("REORDER", None, None))
+
+    for name in old_columns:
+        if name not in new_columns:
+            changes.append(("DROP_COLUMN", name, f"ALTER TABLE {obj_name} DROP COLUMN {name}"))
+
+    for name, new in new_columns.items():
+        if name not in old_columns:
+            cheap = not new["IS_IDENTITY"] and (
+                new["COLUMN_DEFAULT"] is None and new["IS_NULLABLE"]
+                or new["COLUMN_DEFAULT"] is not None and CONSTANT_DEFAULT_PATTERN.match(new["COLUMN_DEFAULT"]))
+            changes.append(("ADD_COLUMN", name, f"ALTER TABLE {obj_name} ADD COLUMN {definitions[name]}" if cheap else None))
         else:
+            for change_class, clause in classify_column_change(old_columns[name], new):
+                changes.append((change_class, name, f"ALTER TABLE {obj_name} ALTER COLUMN {clause}" if clause else None))
+
+    if old_clustering_key != new_clustering_key:
+        changes.append(("CLUSTER_BY", new_clustering_key, f"ALTER TABLE {obj_name} CLUSTER BY ({new_clustering_key})" if new_clustering_key
+                        else f"ALTER TABLE {obj_name} DROP CLUSTERING KEY"))
+
+    if old_primary_key != new_primary_key:
+        if old_primary_key:
+            changes.append(("PRIMARY_KEY", ",".join(old_primary_key), f"ALTER TABLE {obj_name} DROP PRIMARY KEY"))
+        if new_primary_key:
+            constraint_name = parse_primary_key_name(obj_cmd)
+            constraint = f"CONSTRAINT {constraint_name} " if constraint_name else ""
+            changes.append(("PRIMARY_KEY", ",".join(new_primary_key),
+                            f"ALTER TABLE {obj_name} ADD {constraint}PRIMARY KEY ({', '.join(new_primary_key)})"))
+
+    plan["CHANGES"] = [(change_class, name) for change_class, name, _ in changes]
+
+    if all(statement for _, _, statement in changes):
+        plan["STRATEGY"] = "IN_PLACE"
+        plan["STATEMENTS"] = [statement for _, _, statement in changes]
+    else:
+        obj_name_inter = f"{obj_name}_INT"
+        srt_inter_columns = ",".join(new_kept)
+        plan["STRATEGY"] = "COPY_SWAP"
+        plan["STATEMENTS"] = [
+            obj_cmd.replace(obj_name, obj_name_inter),
+            f"INSERT INTO {obj_name_inter} ({srt_inter_columns}) SELECT {srt_inter_columns} FROM {obj_name}",
+            f"ALTER TABLE {obj_name_inter} SWAP WITH {obj_name}",
+            f"DROP TABLE IF EXISTS {obj_name_inter}"]
+        plan["ESTIMATED_BYTES_REWRITTEN"] = int(catalog[table_name]["BYTES"] or 0)
+
+    return plan
+
+
+def create_table(session,obj_cmd,catalog=None):
+    try:
+        obj_name = table_name_from_command(obj_cmd)
+        table_schema, table_name = obj_name.split(".")
+
+        # Current columns of the schema tables
+        if catalog is None:
+            catalog = get_catalog_snapshot(session, table_schema)
+
+        plan = plan_table_migration(obj_cmd, catalog)
+
+        if plan["STRATEGY"] == "CREATE":
             print(f"Create Table: {table_name}")
             obj_create = session.sql(obj_cmd).collect()[0][0]
 
+        elif plan["STRATEGY"] == "NONE":
+            obj_create = f"Table {obj_name} already exists"
+
+        else:
+            print(f"Migrate Table: {table_name} ({plan['STRATEGY']})")
+            for statement in plan["STATEMENTS"]:
+                session.sql(statement).collect()
+            obj_create = f"Table {obj_name} migrated ({plan['STRATEGY']}): " + ", ".join([f"{c} {n}" for c, n in plan["CHANGES"]])
+
     except:
         exc_type, exc_value, exc_traceback = sys.exc_info()
         obj_create = exc_value
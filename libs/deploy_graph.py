@@ -0,0 +1,146 @@
+"""
+Dependency graph for the Raven model files.
+
+Each model file creates one Snowflake object (file format, table, view, function, procedure, task ...).
+The object name is read from the CREATE statement and every "RAVEN.<OBJECT>" reference found in the
+file body becomes an edge to the file that creates that object. References to objects that are not
+created by a model file (INFORMATION_SCHEMA, SNOWFLAKE.ACCOUNT_USAGE, stages created by the build ...)
+are ignored.
+
+The graph is split in waves: every file of a wave only depends on files of previous waves, so the
+files of the same wave can be executed at the same time.
+"""
+import re
+
+CREATE_OBJECT_PATTERN = re.compile(
+    r"CREATE\s+(?:OR\s+REPLACE\s+)?(?:SECURE\s+|TRANSIENT\s+|TEMPORARY\s+)?"
+    r"(TABLE|VIEW|PROCEDURE|FUNCTION|FILE\s+FORMAT|TASK|STAGE|PIPE|STREAM)\s+"
+    r"(?:IF\s+NOT\s+EXISTS\s+)?([\w$.\"]+)",
+    re.IGNORECASE)
+REFERENCE_PATTERN = re.compile(r"\bRAVEN\.\"?([A-Z0-9_$]+)", re.IGNORECASE)
+COMMENT_PATTERN = re.compile(r"/\*.*?\*/|--[^\n]*", re.DOTALL)
+
+
+def parse_model_object(obj_cmd: str) -> tuple:
+    """
+    Finds the object created by a model file and the RAVEN objects it references.
+
+    Args:
+        obj_cmd (str): Content of the model file
+
+    Returns:
+        tuple: (object name as SCHEMA.NAME in upper case or None, set of referenced object names)
+    """
+    object_name = None
+    create_match = CREATE_OBJECT_PATTERN.search(COMMENT_PATTERN.sub(" ", obj_cmd))
+    if create_match:
+        object_name = create_match.group(2).replace('"', "").upper()
+        if "." not in object_name:
+            object_name = f"RAVEN.{object_name}"
+
+    references = {f"RAVEN.{ref.upper()}" for ref in REFERENCE_PATTERN.findall(obj_cmd)}
+    references.discard(object_name)
+
+    return object_name, references
+
+
+class DeployGraph:
+
+    def __init__(self, model_cmds: dict):
+        """
+        Builds the dependency graph between model files.
+
+        Args:
+            model_cmds (dict): File name as key and file content as value. The dict order is used
+                               as tie-breaker inside a wave.
+        """
+        self.files = list(model_cmds.keys())
+        self.objects = {}
+        references = {}
+
+        for file_name, obj_cmd in model_cmds.items():
+            object_name, references[file_name] = parse_model_object(obj_cmd)
+            if object_name:
+                self.objects[object_name] = file_name
+
+        # Only keep references to objects created by other model files
+        self.dependencies = {
+            file_name: {self.objects[ref] for ref in refs if ref in self.objects and self.objects[ref] != file_name}
+            for file_name, refs in references.items()
+        }
+
+        self.dependents = {file_name: set() for file_name in self.files}
+        for file_name, deps in self.dependencies.items():
+            for dep in deps:
+                self.dependents[dep].add(file_name)
+
+    def waves(self) -> list:
+        """
+        Splits the files in waves using Kahn's algorithm.
+
+        Returns:
+            list: List of waves, each wave is a list of file names that can run at the same time
+        """
+        pending = {file_name: set(deps) for file_name, deps in self.dependencies.items()}
+        waves = []
+
+        while pending:
+            wave = [f for f in self.files if f in pending and not pending[f]]
+            if not wave:
+                raise Exception("Dependency cycle between model files: " + ", ".join(sorted(pending)))
+
+            for file_name in wave:
+                del pending[file_name]
+            for deps in pending.values():
+                deps.difference_update(wave)
+
+            waves.append(wave)
+
+        return waves
+
+    def downstream(self, file_names) -> set:
+        """
+        Returns the given files plus every file that depends on them, directly or not.
+        """
+        selected = set()
+        stack = list(file_names)
+        while stack:
+            file_name = stack.pop()
+            if file_name not in selected:
+                selected.add(file_name)
+                stack.extend(self.dependents.get(file_name, ()))
+        return selected
+
+    def critical_path(self, durations: dict) -> tuple:
+        """
+        Finds the longest chain of dependent files based on the execution time of each file.
+
+        Args:
+            durations (dict): File name as key and execution time in seconds as value.
+                              Files without duration are not part of the path.
+
+        Returns:
+            tuple: (total seconds of the path, list of file names from the first to the last file)
+        """
+        finish = {}
+        previous = {}
+        for wave in self.waves():
+            for file_name in wave:
+                if file_name not in durations:
+                    continue
+                deps = [d for d in self.dependencies[file_name] if d in finish]
+                slowest_dep = max(deps, key=lambda d: finish[d]) if deps else None
+                finish[file_name] = durations[file_name] + (finish[slowest_dep] if slowest_dep else 0)
+                previous[file_name] = slowest_dep
+
+        if not finish:
+            return 0, []
+
+        file_name = max(finish, key=finish.get)
+        total_seconds = finish[file_name]
+        path = []
+        while file_name:
+            path.insert(0, file_name)
+            file_name = previous[file_name]
+
+        return total_seconds, path
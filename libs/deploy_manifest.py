@@ -0,0 +1,150 @@
+"""
+Deploy manifest of the Raven model files.
+
+The table RAVEN.LOG_DEPLOY_MANIFEST keeps one row per model file with the hash of its normalized content
+and the version of the last deploy. On the next build only the files whose hash changed are executed,
+plus every file that depends on them (see deploy_graph.DeployGraph.downstream).
+
+The shared Python modules (models/shared/*.py) are hashed in the same table: a procedure is changed when one
+of the modules of its IMPORTS changed, since the module is only read when the procedure is created.
+The files uploaded to the internal stage and the privileges of the ALL PRIVILEGES grants are also saved (see record_hashes).
+"""
+import hashlib
+import re
+from snowflake.snowpark.functions import current_timestamp, when_matched, when_not_matched
+from snowflake.snowpark.exceptions import SnowparkSQLException
+
+SHARED_IMPORT_PATTERN = re.compile(r"@RAVEN\.INTSTAGE_RAVEN_FILES/(models/shared/[\w.]+\.py)", re.IGNORECASE)
+
+
+def normalize_model(obj_cmd: str) -> str:
+    """
+    Normalizes a model file content before hashing it: line endings, trailing spaces and empty lines
+    do not change the deployed object. Indentation is kept since it matters in Python procedures.
+    """
+    lines = [line.rstrip() for line in obj_cmd.replace("\r\n", "\n").split("\n")]
+    return "\n".join([line for line in lines if line]).strip()
+
+
+def hash_model(obj_cmd: str) -> str:
+    """Returns the SHA-256 of the normalized model content."""
+    return hashlib.sha256(normalize_model(obj_cmd).encode("utf8")).hexdigest()
+
+
+def shared_imports(obj_cmd: str) -> set:
+    """Returns the shared modules imported by a procedure, as keys of the manifest (models/shared/<module>.py)."""
+    return set(SHARED_IMPORT_PATTERN.findall(obj_cmd))
+
+
+class DeployManifest:
+
+    table_name = "RAVEN.LOG_DEPLOY_MANIFEST"
+
+    def __init__(self, session, root_path: str, deploy_version: str = ""):
+        self.session = session
+        self.root_path = root_path
+        self.deploy_version = deploy_version
+
+    def model_key(self, file_name: str) -> str:
+        """Model file path relative to the project root, so the key is the same for every machine."""
+        return file_name.replace(self.root_path, "").replace("\\", "/").strip("/")
+
+    def get_deployed_hashes(self) -> dict:
+        """
+        Reads the manifest table.
+
+        Returns:
+            dict: Model file key as key and content hash as value. Empty if the table does not exist yet.
+        """
+        try:
+            rows = self.session.table(self.table_name).select("MODEL_FILE", "CONTENT_HASH").collect()
+        except SnowparkSQLException:
+            return {}
+        return {row["MODEL_FILE"]: row["CONTENT_HASH"] for row in rows}
+
+    def select_files(self, graph, model_cmds: dict, force: bool = False, shared_cmds: dict = None) -> tuple:
+        """
+        Finds the model files to execute.
+
+        Args:
+            graph (DeployGraph): Dependency graph of the model files
+            model_cmds (dict): File name as key and file content as value
+            force (bool): If True, every file is selected
+            shared_cmds (dict): Shared module file name as key and file content as value
+
+        Returns:
+            tuple: (set of file names to execute, list of file names whose content or imported modules changed)
+        """
+        if force:
+            return set(model_cmds), list(model_cmds)
+
+        deployed_hashes = self.get_deployed_hashes()
+        changed_shared = {self.model_key(file_name) for file_name, obj_cmd in (shared_cmds or {}).items()
+                          if deployed_hashes.get(self.model_key(file_name)) != hash_model(obj_cmd)}
+        changed = [file_name for file_name, obj_cmd in model_cmds.items()
+                   if deployed_hashes.get(self.model_key(file_name)) != hash_model(obj_cmd)
+                   or shared_imports(obj_cmd) & changed_shared]
+
+        return graph.downstream(changed), changed
+
+    def record(self, graph, model_cmds: dict, file_names, shared_cmds: dict = None) -> None:
+        """
+        Saves the hash of the executed files and of the shared modules in the manifest table.
+        The procedures importing a changed module were selected, so every module is recorded.
+        """
+        file_to_object = {file_name: object_name for object_name, file_name in graph.objects.items()}
+        rows = [{
+                "MODEL_FILE": self.model_key(file_name),
+                "OBJECT_NAME": file_to_object.get(file_name),
+                "CONTENT_HASH": hash_model(model_cmds[file_name]),
+                "DEPLOY_VERSION": self.deploy_version
+            } for file_name in file_names]
+        rows += [{
+                "MODEL_FILE": self.model_key(file_name),
+                "OBJECT_NAME": None,
+                "CONTENT_HASH": hash_model(obj_cmd),
+                "DEPLOY_VERSION": self.deploy_version
+            } for file_name, obj_cmd in (shared_cmds or {}).items()]
+
+        self.merge_rows(rows)
+
+    def record_hashes(self, hashes: dict, object_name: str) -> None:
+        """
+        Saves hashes that are not model files: the files uploaded to the internal stage, with the stage path as key
+        (LIST returns the md5 of the encrypted staged file, so upload_files compares the local file with this hash), and
+        the schema privileges held after "grant ALL PRIVILEGES", with the grant as key (see InitializeRaven.reconcile_role_grants).
+        Nothing is saved when the table does not exist yet (first build), the files are uploaded again next time.
+        """
+        rows = [{
+                "MODEL_FILE": key,
+                "OBJECT_NAME": object_name,
+                "CONTENT_HASH": content_hash,
+                "DEPLOY_VERSION": self.deploy_version
+            } for key, content_hash in hashes.items()]
+
+        try:
+            self.merge_rows(rows)
+        except SnowparkSQLException:
+            pass
+
+    def merge_rows(self, rows: list) -> None:
+        """Merges the rows in the manifest table on MODEL_FILE."""
+        if not rows:
+            return
+
+        target = self.session.table(self.table_name)
+        source = self.session.create_dataframe(rows)
+
+        target.merge(source, target["MODEL_FILE"] == source["MODEL_FILE"],
+            [when_matched().update({
+                "OBJECT_NAME" : source["OBJECT_NAME"],
+                "CONTENT_HASH" : source["CONTENT_HASH"],
+                "DEPLOY_VERSION" : source["DEPLOY_VERSION"],
+                "DEPLOY_TIMESTAMP" : current_timestamp()}),
+            when_not_matched().insert({
+                "MODEL_FILE" : source["MODEL_FILE"],
+                "OBJECT_NAME" : source["OBJECT_NAME"],
+                "CONTENT_HASH" : source["CONTENT_HASH"],
+                "DEPLOY_VERSION" : source["DEPLOY_VERSION"],
+                "DEPLOY_TIMESTAMP" : current_timestamp()})
+            ])
@@ -20,8 +20,8 @@ It also tells the Snowflake session which database to use.
 2. The upload_files method which loops through the provided file paths, uploads each file to a Snowflake internal stage, 
 and returns a dictionary of info about each uploaded file.
 
-3. The execute_commands method which loops through Raven files, executes the SQL commands in them to create database objects, 
-and returns a dictionary of the execution results.
+3. The execute_commands method which sorts the Raven files in a dependency graph, executes the SQL commands in them to create 
+database objects (independent objects at the same time), and returns a dictionary of the execution results.
 
 4. The grant_permission_raven method which grants permissions to a role so it can access the Raven schema where these objects are created.
 
@@ -30,14 +30,46 @@ and returns a dictionary of the execution results.
 So in summary, this InitializeRaven class handles all the initial setup steps needed to get a Raven application ready to use inside a Snowflake database. 
 The methods upload necessary files, create database objects by executing those files, and set permissions.
 """
-import sys
+import os, sys, time
+from concurrent.futures import ThreadPoolExecutor
 from snowflake.snowpark.types import *
 from snowflake.snowpark.functions import listagg
+from snowflake.snowpark.exceptions import SnowparkSQLException
 
 from metadata import BuildMetadata
-from create_tables import create_table
+from create_tables import create_table, get_catalog_snapshot, plan_table_migration
 from create_calendar import create_calendar
-from utils import get_project_root
+from deploy_graph import DeployGraph
+from deploy_manifest import DeployManifest, hash_model
+from utils import get_project_root, file_sha256
+
+# Permissions per role type. "on" is SCHEMA (the schema itself) or the object type of "ON ALL <objects> IN SCHEMA"
+GRANT_SPEC = {
+    "batch": [
+        {"privileges": ["USAGE"], "on": "SCHEMA", "schema": "RAVEN"},
+        {"privileges": ["USAGE"], "on": "PROCEDURES", "schema": "RAVEN"},
+        {"privileges": ["USAGE"], "on": "FUNCTIONS", "schema": "RAVEN"},
+        {"privileges": ["USAGE"], "on": "FILE FORMATS", "schema": "RAVEN"},
+        {"privileges": ["READ"], "on": "STAGES", "schema": "RAVEN"},
+        {"privileges": ["DELETE", "INSERT", "SELECT", "UPDATE"], "on": "TABLES", "schema": "RAVEN"},
+        {"privileges": ["SELECT"], "on": "VIEWS", "schema": "RAVEN"},
+        {"privileges": ["CREATE TABLE"], "on": "SCHEMA", "schema": "STAGING"},
+        {"privileges": ["USAGE"], "on": "STAGES", "schema": "STAGING"},
+        {"privileges": ["ALL PRIVILEGES"], "on": "SCHEMA", "schema": "STAGING"},
+        {"privileges": ["DELETE", "INSERT", "SELECT", "UPDATE"], "on": "TABLES", "schema": "STAGING"}
+    ],
+    "rw": [
+        {"privileges": ["ALL PRIVILEGES"], "on": "SCHEMA", "schema": "STAGING"},
+        {"privileges": ["DELETE", "INSERT", "SELECT", "UPDATE"], "on": "TABLES", "schema": "STAGING"}
+    ]
+}
+
+# Object type in SHOW GRANTS (granted_on) for "ON ALL <objects> IN SCHEMA"
+GRANT_OBJECT_TYPES = {"PROCEDURES": "PROCEDURE", "FUNCTIONS": "FUNCTION", "FILE FORMATS": "FILE_FORMAT",
+                      "STAGES": "STAGE", "TABLES": "TABLE", "VIEWS": "VIEW"}
+
+# Stages of the privileges of "ON ALL STAGES": READ and WRITE only apply to internal stages, USAGE to external stages
+STAGE_PRIVILEGE_TYPES = {"READ": "INTERNAL STAGE", "WRITE": "INTERNAL STAGE", "USAGE": "EXTERNAL STAGE"}
 
 class InitializeRaven:
      
@@ -47,8 +79,11 @@ class InitializeRaven:
         self.raven_file_paths = raven_file_paths
         self.session = session
         self.session.use_database(database_name)
+        self.deploy_report = {}
+        self.catalog_snapshot = None
+        self.metadata = None
         
-    def upload_files(self,build_process: str) -> dict:
+    def upload_files(self,build_process: str, max_workers: int = 8, deploy_version: str = "") -> dict:
         """
         Uploads Raven component files to a Snowflake internal stage.
         
@@ -57,23 +92,34 @@ class InitializeRaven:
         dictionary containing metadata about each uploaded file.
         
         The filepath for the stage is constructed by removing the filename, replacing the 
-        project root path, and joining the remaining path segments. The file is then uploaded
-        using the Snowflake PUT command.
+        project root path, and joining the remaining path segments. The md5 returned by LIST is the one
+        of the encrypted staged file, so the hash of each uploaded file is saved in the deploy manifest
+        (RAVEN.LOG_DEPLOY_MANIFEST). Files still listed in the stage whose hash is the one saved at the
+        last upload are skipped. The other files are uploaded using the Snowflake PUT command on a pool
+        of max_workers threads.
         
         Parameters:
             build_process (str): The type of Raven component (e.g. "models"). Used to filter
                                 filepaths.
+            max_workers (int): Number of PUT commands running at the same time.
+            deploy_version (str): Version saved in the deploy manifest with the hash of the uploaded files.
         
         Returns:
-            dict: Metadata about each uploaded file, with the filename as the key.
+            dict: Metadata about each uploaded file, with the filename as the key, and the
+                  key UPLOAD_SUMMARY with the uploaded/skipped/failed counts, the bytes transferred
+                  and the files whose PUT failed (status other than UPLOADED or SKIPPED).
         """
         root_path = get_project_root()
+        manifest = DeployManifest(self.session, root_path, deploy_version)
+        uploaded_hashes = manifest.get_deployed_hashes()
 
         upload_result = {}
   
         upload_files = [f for key,value in self.raven_file_paths.items() if "nee" in key for f in value for p in f.split("\\") if p == build_process]
         upload_files = [x for x in upload_files if "__pycache__" not in x]
 
+        # Group files by stage directory
+        stage_files = {}
         for file_obj in upload_files:
             # Get only file name
             filename = file_obj.split("\\")[-1]
@@ -83,122 +129,369 @@ class InitializeRaven:
             filepath = filepath.split("\\")
             filepath_stage = "/".join([f for f in filepath if f.upper() != self.app_name.upper()])
             filepath_stage = f"@RAVEN.INTSTAGE_RAVEN_FILES{filepath_stage}"
-
-            # Upload the file
-            file_upload = self.session.file.put(file_obj, filepath_stage, auto_compress=False, overwrite=True)
-            upload_result[filename.split(".")[0]] = file_upload[0]._asdict()
+            stage_files.setdefault(filepath_stage, []).append(file_obj)
+
+        files_to_put = []
+        file_hashes = {}
+        skipped_bytes = 0
+        for filepath_stage, files in stage_files.items():
+            staged = self.list_stage_files(filepath_stage)
+
+            for file_obj in files:
+                filename = file_obj.split("\\")[-1]
+                file_size = os.path.getsize(file_obj)
+                staged_file = staged.get(filename)
+                file_hashes[file_obj] = file_sha256(file_obj)
+
+                if staged_file and uploaded_hashes.get(f"{filepath_stage}{filename}") == file_hashes[file_obj]:
+                    upload_result[filename.split(".")[0]] = {
+                        "source": filename, "target": filename,
+                        "source_size": file_size, "target_size": staged_file["size"],
+                        "source_compression": "NONE", "target_compression": "NONE",
+                        "status": "SKIPPED", "message": "File unchanged in stage"}
+                    skipped_bytes += file_size
+                else:
+                    files_to_put.append((file_obj, filepath_stage))
+
+        # Upload the files
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {file_obj: executor.submit(self.session.file.put, file_obj, filepath_stage, auto_compress=False, overwrite=True)
+                       for file_obj, filepath_stage in files_to_put}
+
+            for file_obj, future in futures.items():
+                filename = file_obj.split("\\")[-1]
+                try:
+                    upload_result[filename.split(".")[0]] = future.result()[0]._asdict()
+                except:
+                    exc_type, exc_value, exc_traceback = sys.exc_info()
+                    upload_result[filename.split(".")[0]] = {
+                        "source": filename, "target": filename,
+                        "source_size": os.path.getsize(file_obj), "target_size": None,
+                        "source_compression": "NONE", "target_compression": "NONE",
+                        "status": "FAILED", "message": f"{exc_type} - {exc_value}"}
+
+        # Hash of the uploaded files, compared on the next build
+        uploaded_files = {}
+        for file_obj, filepath_stage in files_to_put:
+            filename = file_obj.split("\\")[-1]
+            if upload_result[filename.split(".")[0]]["status"] == "UPLOADED":
+                uploaded_files[f"{filepath_stage}{filename}"] = file_hashes[file_obj]
+        manifest.record_hashes(uploaded_files, "RAVEN.INTSTAGE_RAVEN_FILES")
+
+        uploaded = [v for v in upload_result.values() if v["status"] == "UPLOADED"]
+        failed = [v for v in upload_result.values() if v["status"] not in ("UPLOADED", "SKIPPED")]
+        upload_result["UPLOAD_SUMMARY"] = {
+            "uploaded": len(uploaded),
+            "skipped": len(upload_result) - len(uploaded) - len(failed),
+            "failed": len(failed),
+            "uploaded_bytes": sum([v["target_size"] or 0 for v in uploaded]),
+            "skipped_bytes": skipped_bytes,
+            "failed_files": [{"source": v["source"], "status": v["status"], "message": v["message"]} for v in failed]
+        }
         
         return upload_result
 
+    def list_stage_files(self, filepath_stage: str) -> dict:
+        """
+        Lists the files in a stage directory (not recursive).
 
-    def execute_commands(self,build_process: str) -> dict:
+        Returns:
+            dict: File name as key and dict with size and md5 (of the encrypted file) as value. Empty if the stage can't be listed.
+        """
+        directory = filepath_stage.split("@RAVEN.INTSTAGE_RAVEN_FILES")[-1].strip("/").lower()
+        try:
+            rows = self.session.sql(f"LIST {filepath_stage}").collect()
+        except SnowparkSQLException:
+            return {}
+
+        staged = {}
+        for row in rows:
+            # name is <stage name>/<directory>/<file name>
+            name = row["name"].split("/", 1)[-1]
+            file_directory, _, filename = name.rpartition("/")
+            if file_directory.lower() == directory:
+                staged[filename] = {"size": row["size"], "md5": row["md5"]}
+        return staged
+
+
+    def execute_commands(self,build_process: str, max_workers: int = 8, force: bool = True, deploy_version: str = "") -> dict:
         """
         Executes Raven component SQL files.
 
         This function executes the SQL files for different Raven components like models, connectors etc. 
         It first filters the file paths to only include the relevant component type based on the build_process parameter.
 
-        The files are then sorted if it is a models build, to ensure they are created in the correct sequence.
+        The files are sorted in a dependency graph (see deploy_graph.DeployGraph) built from the objects each file 
+        creates and references. Files of the same wave do not depend on each other and are executed at the same time
+        on a pool of max_workers threads.
 
         Each file is then executed using Snowflake SQL commands and the results are captured in a dictionary.
+        The waves timing and the critical path are saved in the attribute deploy_report.
+
+        For models, when force is False only the files whose content hash differs from the deploy manifest
+        (RAVEN.LOG_DEPLOY_MANIFEST) are executed, together with their downstream dependents. A procedure is also
+        executed when one of the shared modules of its IMPORTS (models/shared/*.py) changed. The manifest is
+        updated once every selected file is executed.
         """
 
         exec_files = [f for key,value in self.raven_file_paths.items() if "nee" not in key for f in value for p in f.split("\\") if p == build_process]
         exec_files = [x for x in exec_files if "__pycache__" not in x]
 
         if build_process == 'models':
+            # Folder sequence is only used as tie-breaker inside a wave
             seq_objects = ['file_formats', 'tables', 'functions', 'views', 'table_functions', 'procedures', 'tasks']
-            values = set(map(lambda x:x.split("\\")[-2], exec_files))
-            dict_objs = {seq_objects.index(x):[y for y in exec_files if y.split("\\")[-2]==x] for x in values}
-            newlist = []
-            for key,item in sorted(dict_objs.items()):
-                newlist = newlist + item
-            exec_files = newlist                                                      
+            exec_files = sorted(exec_files, key=lambda x: (seq_objects.index(x.split("\\")[-2]) if x.split("\\")[-2] in seq_objects else len(seq_objects), x))
 
-        exec_result = {}
+        model_cmds = {}
         for file_name in exec_files:
-            print(f"File executed: {file_name}")
-            with open(file_name, encoding="utf8") as f: obj_cmd = f.read()
+            with open(file_name, encoding="utf8") as f: model_cmds[file_name] = f.read()
 
-            if any("tables" == s for s in file_name.split("\\")):
-                exec_cmd = create_table(self.session,obj_cmd)
-            else:
-                exec_cmd = self.session.sql(obj_cmd).collect()[0][0]
+        graph = DeployGraph(model_cmds)
 
-            exec_result[file_name.split(".")[0]] = exec_cmd
+        selected_files = set(model_cmds)
+        manifest = None
+        shared_cmds = {}
+        if build_process == 'models':
+            manifest = DeployManifest(self.session, get_project_root(), deploy_version)
+            shared_files = [f for key,value in self.raven_file_paths.items() if "nee" in key for f in value
+                            if build_process in f.split("\\") and "shared" in f.split("\\") and f.endswith(".py")]
+            for file_name in shared_files:
+                with open(file_name, encoding="utf8") as f: shared_cmds[file_name] = f.read()
+            selected_files, changed_files = manifest.select_files(graph, model_cmds, force, shared_cmds)
+            print(f"Model files changed: {len(changed_files)}, executed with dependents: {len(selected_files)} of {len(model_cmds)}")
+
+        # One snapshot of the existing table columns for the whole deploy
+        if any("tables" == p for f in selected_files for p in f.split("\\")):
+            self.catalog_snapshot = get_catalog_snapshot(self.session)
+
+        exec_result = {}
+        durations = {}
+        wave_report = []
+        build_start = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for wave_number, wave in enumerate(graph.waves(), start=1):
+                wave_start = time.perf_counter()
+                for file_name in wave:
+                    if file_name not in selected_files:
+                        exec_result[file_name.split(".")[0]] = "Skipped: content unchanged"
+                wave = [f for f in wave if f in selected_files]
+                if not wave:
+                    continue
+
+                futures = {file_name: executor.submit(self.execute_model, file_name, model_cmds[file_name]) for file_name in wave}
+
+                for file_name, future in futures.items():
+                    exec_cmd, durations[file_name] = future.result()
+                    exec_result[file_name.split(".")[0]] = exec_cmd
+
+                wave_seconds = round(time.perf_counter() - wave_start, 3)
+                wave_report.append({"wave": wave_number, "seconds": wave_seconds, "objects": [f.split("\\")[-1] for f in wave]})
+                print(f"Wave {wave_number}: {len(wave)} object(s) in {wave_seconds}s")
+
+        if manifest:
+            manifest.record(graph, model_cmds, selected_files, shared_cmds)
+
+        critical_seconds, critical_path = graph.critical_path(durations)
+        self.deploy_report = {
+            "total_seconds": round(time.perf_counter() - build_start, 3),
+            "executed_files": len(selected_files),
+            "skipped_files": len(model_cmds) - len(selected_files),
+            "waves": wave_report,
+            "critical_path_seconds": round(critical_seconds, 3),
+            "critical_path": [file_name.split("\\")[-1] for file_name in critical_path]
+        }
+        print(f"Critical path ({self.deploy_report['critical_path_seconds']}s): " + " -> ".join(self.deploy_report["critical_path"]))
         
         return exec_result
 
-    def grant_permission_raven(self) -> dict:
+    def plan_table_migrations(self, build_process: str = "models") -> dict:
         """
-        Grants permissions to the RAVEN schema and objects for the given role.
+        Dry-run of the table changes: plans the statements of every table file without executing them.
 
-        This grants usage and privileges on the RAVEN schema, procedures, 
-        functions, file formats, stages, tables, and views to the provided role name.
+        Returns:
+            dict: File name as key and migration plan as value (see create_tables.plan_table_migration), and the
+                  key MIGRATION_SUMMARY with the number of tables per strategy and the estimated bytes rewritten.
+        """
+        table_files = [f for key,value in self.raven_file_paths.items() if "nee" not in key for f in value 
+                       if build_process in f.split("\\") and "tables" in f.split("\\")]
 
-        It also grants privileges to create tables and full access to the STAGING schema.
+        self.catalog_snapshot = get_catalog_snapshot(self.session)
 
-        The grants are executed and results are captured in a dictionary.
-        """
+        plan_result = {}
+        for file_name in sorted(table_files):
+            with open(file_name, encoding="utf8") as f: obj_cmd = f.read()
+            plan_result[file_name.split("\\")[-1].split(".")[0]] = plan_table_migration(obj_cmd, self.catalog_snapshot)
 
-        env = self.database_name.split("_")[0]
+        strategies = [plan["STRATEGY"] for plan in plan_result.values()]
+        plan_result["MIGRATION_SUMMARY"] = {
+            "tables": {strategy: strategies.count(strategy) for strategy in sorted(set(strategies))},
+            "estimated_bytes_rewritten": sum([plan["ESTIMATED_BYTES_REWRITTEN"] for plan in plan_result.values()])
+        }
+
+        for name, plan in plan_result.items():
+            if name != "MIGRATION_SUMMARY" and plan["STRATEGY"] != "NONE":
+                print(f"{plan['TABLE_NAME']} ({plan['STRATEGY']}, {plan['ESTIMATED_BYTES_REWRITTEN']} bytes rewritten):")
+                for statement in plan["STATEMENTS"]:
+                    print(f"    {statement.strip()}")
 
-        batch_role_list = [f"{env}_RAVEN_BATCH", f"{env}_RAPTOR_BATCH"]
-        rw_role_list = [f"{env}_{self.app_name}_RW"]
+        return plan_result
 
-        batch_permission_list = [
-        "grant USAGE on SCHEMA RAVEN TO ROLE |:role_name:|",
+    def execute_model(self, file_name: str, obj_cmd: str) -> tuple:
+        """
+        Executes one model file.
 
-        "grant USAGE on ALL PROCEDURES IN SCHEMA RAVEN TO ROLE |:role_name:|",
+        Returns:
+            tuple: (execution result, execution time in seconds)
+        """
+        start = time.perf_counter()
+        print(f"File executed: {file_name}")
 
-        "grant USAGE on ALL FUNCTIONS IN SCHEMA RAVEN TO ROLE |:role_name:|",
+        if any("tables" == s for s in file_name.split("\\")):
+            exec_cmd = create_table(self.session,obj_cmd,self.catalog_snapshot)
+        else:
+            exec_cmd = self.session.sql(obj_cmd).collect()[0][0]
 
-        "grant USAGE on ALL FILE FORMATS IN SCHEMA RAVEN TO ROLE |:role_name:|",
+        return exec_cmd, time.perf_counter() - start
 
-        "grant READ on ALL STAGES in SCHEMA RAVEN TO ROLE |:role_name:|",
+    def grant_permission_raven(self, max_workers: int = 4) -> dict:
+        """
+        Grants permissions to the RAVEN schema and objects for the given role.
 
-        "grant DELETE,INSERT,SELECT,UPDATE on ALL TABLES IN SCHEMA RAVEN TO ROLE |:role_name:|",
+        This grants usage and privileges on the RAVEN schema, procedures, 
+        functions, file formats, stages, tables, and views to the provided role name.
 
-        "grant SELECT on ALL VIEWS IN SCHEMA RAVEN TO ROLE |:role_name:|",
+        It also grants privileges to create tables and full access to the STAGING schema.
 
-        "grant CREATE TABLE ON SCHEMA STAGING TO ROLE |:role_name:|",
+        The grants are declared in GRANT_SPEC. For each role the current grants are read once (SHOW GRANTS TO ROLE)
+        and only the missing grants are executed. A grant "ON ALL <objects> IN SCHEMA" is present when the role
+        has the privileges on every object of that type in the schema. The privileges of "ALL PRIVILEGES" depend on
+        the account, so the schema privileges held after the grant are saved in the deploy manifest and the grant is
+        present while the role holds the same privileges. The roles are processed at the same time.
 
-        "grant USAGE on ALL STAGES in SCHEMA STAGING TO ROLE |:role_name:|",
+        Returns:
+            dict: Role name as key and dict with the lists granted, already_present and failed (command and error) as value.
+        """
 
-        "grant ALL PRIVILEGES on SCHEMA STAGING TO ROLE |:role_name:|",
+        env = self.database_name.split("_")[0]
 
-        "grant DELETE,INSERT,SELECT,UPDATE on ALL TABLES IN SCHEMA STAGING TO ROLE |:role_name:|"
+        role_lists = {
+            "batch": [f"{env}_RAVEN_BATCH", f"{env}_RAPTOR_BATCH"],
+            "rw": [f"{env}_{self.app_name}_RW"]
+        }
 
-        ]
+        object_counts = self.get_schema_object_counts()
+        manifest = DeployManifest(self.session, get_project_root())
+        recorded_hashes = manifest.get_deployed_hashes()
 
-        rw_permission_list = [
-        "grant ALL PRIVILEGES on SCHEMA STAGING TO ROLE |:role_name:|",
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {role: executor.submit(self.reconcile_role_grants, role, GRANT_SPEC[role_type], object_counts, manifest, recorded_hashes)
+                       for role_type, role_list in role_lists.items() for role in role_list}
+            grant_result = {role: future.result() for role, future in futures.items()}
 
-        "grant DELETE,INSERT,SELECT,UPDATE on ALL TABLES IN SCHEMA STAGING TO ROLE |:role_name:|"
+        return grant_result
 
-        ]
+    def get_schema_object_counts(self) -> dict:
+        """
+        Counts the objects per type and schema, used to check the "ON ALL <objects> IN SCHEMA" grants.
 
-        grant_dict = {
-            "rw": {"role_list": rw_role_list, "permission_list": rw_permission_list}, 
-            "batch": {"role_list": batch_role_list, "permission_list": batch_permission_list}
-        }
+        Returns:
+            dict: (object type as in SHOW GRANTS granted_on, schema name) as key and number of objects as value.
+                  The stages are also counted as INTERNAL STAGE and EXTERNAL STAGE (see STAGE_PRIVILEGE_TYPES)
+        """
+        rows = self.session.sql("""
+            SELECT IFF(TABLE_TYPE = 'VIEW', 'VIEW', 'TABLE') AS OBJECT_TYPE, TABLE_SCHEMA AS OBJECT_SCHEMA, COUNT(*) AS OBJECTS
+            FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_TYPE IN ('BASE TABLE', 'VIEW') GROUP BY 1, 2
+            UNION ALL
+            SELECT 'PROCEDURE', PROCEDURE_SCHEMA, COUNT(*) FROM INFORMATION_SCHEMA.PROCEDURES GROUP BY 1, 2
+            UNION ALL
+            SELECT 'FUNCTION', FUNCTION_SCHEMA, COUNT(*) FROM INFORMATION_SCHEMA.FUNCTIONS GROUP BY 1, 2
+            UNION ALL
+            SELECT 'FILE_FORMAT', FILE_FORMAT_SCHEMA, COUNT(*) FROM INFORMATION_SCHEMA.FILE_FORMATS GROUP BY 1, 2
+            UNION ALL
+            SELECT 'STAGE', STAGE_SCHEMA, COUNT(*) FROM INFORMATION_SCHEMA.STAGES GROUP BY 1, 2
+            UNION ALL
+            SELECT IFF(STAGE_TYPE ILIKE 'EXTERNAL%', 'EXTERNAL STAGE', 'INTERNAL STAGE'), STAGE_SCHEMA, COUNT(*) FROM INFORMATION_SCHEMA.STAGES GROUP BY 1, 2
+        """).collect()
+        return {(row["OBJECT_TYPE"], row["OBJECT_SCHEMA"]): row["OBJECTS"] for row in rows}
+
+    def read_role_grants(self, role: str) -> dict:
+        """
+        Grants of the role on the objects of the database.
 
-        grant_result = {}
-        for role_type,role_data in grant_dict.items():
-            for role in role_data["role_list"]:
-                print(f"---------------- {role} ----------------")
-                for permission in role_data["permission_list"]:
-                    permission = permission.replace("|:role_name:|", role)
-                    print(permission)
-                    try:
-                        grant_return = self.session.sql(permission).collect()[0][0]
-                        grant_result[permission] = grant_return
-                    except:
-                        exc_type, exc_value, exc_traceback = sys.exc_info()
-                        error_msg = f'ERROR | {exc_type} - {exc_value}'
-                        grant_result[grant_cmd] = error_msg
+        Returns:
+            dict: (privilege, granted_on, schema) as key and set of object names as value. Empty if the role can't be read.
+        """
+        current_grants = {}
+        try:
+            for row in self.session.sql(f"SHOW GRANTS TO ROLE {role}").collect():
+                name_parts = row["name"].replace('"', "").split(".")
+                if len(name_parts) < 2 or name_parts[0].upper() != self.database_name.upper():
+                    continue
+                key = (row["privilege"], row["granted_on"], name_parts[1].upper())
+                current_grants.setdefault(key, set()).add(row["name"] if len(name_parts) > 2 else name_parts[1].upper())
+        except SnowparkSQLException:
+            pass
+        return current_grants
+
+    @staticmethod
+    def schema_privileges_hash(current_grants: dict, schema: str) -> str:
+        """Hash of the privileges of the role on the schema, compared with the one saved after "grant ALL PRIVILEGES"."""
+        privileges = sorted(privilege for privilege, granted_on, grant_schema in current_grants
+                            if granted_on == "SCHEMA" and grant_schema == schema and privilege != "OWNERSHIP")
+        return hash_model(",".join(privileges))
+
+    def reconcile_role_grants(self, role: str, grant_spec: list, object_counts: dict, manifest: DeployManifest, recorded_hashes: dict) -> dict:
+        """
+        Executes the grants of the spec that the role does not have yet.
+        """
+        print(f"---------------- {role} ----------------")
+        role_result = {"granted": [], "already_present": [], "failed": []}
+
+        # Current grants as {(privilege, granted_on, schema): set of object names}
+        current_grants = self.read_role_grants(role)
+        all_privileges_granted = []
+
+        for grant in grant_spec:
+            schema = grant["schema"]
+            if grant["on"] == "SCHEMA":
+                granted_on = "SCHEMA"
+                permission = f"grant {','.join(grant['privileges'])} on SCHEMA {schema} TO ROLE {role}"
+            else:
+                granted_on = GRANT_OBJECT_TYPES[grant["on"]]
+                permission = f"grant {','.join(grant['privileges'])} on ALL {grant['on']} IN SCHEMA {schema} TO ROLE {role}"
 
-        return grant_result
+            ownership = len(current_grants.get(("OWNERSHIP", granted_on, schema), ()))
+            if grant["privileges"] == ["ALL PRIVILEGES"]:
+                present = ownership > 0 or recorded_hashes.get(permission.upper()) == self.schema_privileges_hash(current_grants, schema)
+            else:
+                objects = {privilege: 1 if granted_on == "SCHEMA" else
+                           object_counts.get((STAGE_PRIVILEGE_TYPES.get(privilege, granted_on) if granted_on == "STAGE" else granted_on, schema), 0)
+                           for privilege in grant["privileges"]}
+                present = all(max(len(current_grants.get((privilege, granted_on, schema), ())), ownership) >= objects[privilege]
+                              for privilege in grant["privileges"])
+            if present:
+                role_result["already_present"].append(permission)
+                continue
+
+            print(permission)
+            try:
+                self.session.sql(permission).collect()
+                role_result["granted"].append(permission)
+                if grant["privileges"] == ["ALL PRIVILEGES"]:
+                    all_privileges_granted.append((permission, schema))
+            except:
+                exc_type, exc_value, exc_traceback = sys.exc_info()
+                error_msg = f'ERROR | {exc_type} - {exc_value}'
+                role_result["failed"].append({"command": permission, "error": error_msg})
+
+        # Privileges produced by "grant ALL PRIVILEGES" in this account
+        if all_privileges_granted:
+            current_grants = self.read_role_grants(role)
+            manifest.record_hashes({permission.upper(): self.schema_privileges_hash(current_grants, schema)
+                                    for permission, schema in all_privileges_granted}, role)
+
+        return role_result
         
     def build_metadata(self,step: str) -> dict:
         """
@@ -210,7 +503,10 @@ class InitializeRaven:
         Returns:
           The results of the metadata test or upload.
         """
-        metadata = BuildMetadata(self.session, self.database_name,self.app_name)
+        # Same instance for every step, so the seeds and the catalog are read once
+        if self.metadata is None:
+            self.metadata = BuildMetadata(self.session, self.database_name,self.app_name)
+        metadata = self.metadata
         if step == "test_metadata":
             return metadata.test_metadata()
         elif step == "upload_metadata":
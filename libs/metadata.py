@@ -22,13 +22,29 @@ The logic works as follows:
 - Open the SQL file, read the contents into a string, and execute it via Snowflake.
 - Store the SQL execution result in the dictionary, using the SQL file path as the key.
 - Return the final dictionary containing all SQL execution results after looping through all CSVs.
+- Seeds with a delta merge script only upload the rows changed since the last merge (local snapshot in metadata\\snapshots), 
+  the whole CSV is uploaded when the snapshot is missing or stale.
 - This allows the metadata CSVs to be uploaded and merged in a simple automated way. The SQL execution results are captured to enable checking for any errors.
 
 """
-import os, sys
+import os, sys, json, shutil
+from concurrent.futures import ThreadPoolExecutor
 from snowflake.snowpark.functions import col, concat_ws, lit, listagg, upper
 import pandas as pd
 from utils import get_project_root
+from metadata_validation import as_text, validate_seeds
+
+# Primary key of the seed tables with a delta merge
+SEED_PRIMARY_KEYS = {
+    "SOURCE_FILE": ["SOURCE_SYSTEM_CODE", "SOURCE_FEED_CODE"],
+    "SOURCE_FIELD": ["SOURCE_SYSTEM_CODE", "SOURCE_FEED_CODE", "SOURCE_FIELD_NAME"],
+    "STAGE_ME_PARAMETERS": ["DATASET_NAME"]
+}
+
+# Key columns trimmed by the delta merge (metadata/merging/delta), the other key columns are compared as they are
+SEED_TRIMMED_KEYS = {
+    "SOURCE_FIELD": ["SOURCE_FIELD_NAME"]
+}
 
 class BuildMetadata:
      
@@ -42,91 +58,174 @@ class BuildMetadata:
         self.source_file_path = f'{self.seed_path}\\SOURCE_FILE.csv'
         self.source_field_path = f'{self.seed_path}\\SOURCE_FIELD.csv'
         self.stage_me_parameters_path = f'{self.seed_path}\\STAGE_ME_PARAMETERS.csv'
+        self.seeds = None
+        self.catalog = None
     
-    def test_metadata(self):
-        # Validates metadata by reading in CSVs, checking for duplicates, 
-        # comparing to database objects, and raising errors if issues are found.
-        try:
-            # SOURCE_FILE.csv
-            df_source_file = pd.read_csv(self.source_file_path)
-            # SOURCE_FIELD.csv
-            df_source_field = pd.read_csv(self.source_field_path)
-            # STAGE_ME_PARAMETERS.csv
-            df_stage_me_parameters = pd.read_csv(self.stage_me_parameters_path)
-
-            # Get distinct value for FILE FORMAT and STAGE
-            list_src_file_format = df_source_file["FILE_FORMAT"].drop_duplicates().tolist()
-            list_src_stage = df_source_file["STAGE_NAME"].drop_duplicates().tolist()
-
+    def load_seeds(self) -> dict:
+        """
+        Reads every seed CSV once. The DataFrames are shared by the validation and the upload.
+
+        Returns:
+            dict: CSV name without extension as key and DataFrame as value
+        """
+        if self.seeds is None:
+            seed_files = [f for (dirpath, dirnames, filenames) in os.walk(f"{self.seed_path}") for f in filenames]
+            self.seeds = {csv_name.split('.')[0]: pd.read_csv(f"{self.seed_path}\\{csv_name}") for csv_name in seed_files}
+        return self.seeds
 
+    def get_catalog(self) -> dict:
+        """File formats of the RAVEN schema and stages of the database, read once."""
+        if self.catalog is None:
             # List all FILE FORMATS and STAGES in RAVEN schema
             df_show_file_format = self.session.sql("SHOW FILE FORMATS IN SCHEMA RAVEN") # Get file formats create by RAVEN
             df_stage = self.session.sql("SHOW STAGES IN DATABASE") # Get the list of stages
             df_stage = df_stage.with_column('"full_stage_name"', concat_ws(lit("."),df_stage['"schema_name"'],df_stage['"name"']))
 
-            list_sf_file_format = pd.DataFrame(df_show_file_format.collect()).name.tolist()
-            list_sf_stage = pd.DataFrame(df_stage.collect()).full_stage_name.tolist()
+            self.catalog = {
+                "file_formats": [row["name"] for row in df_show_file_format.collect()],
+                "stages": [row["full_stage_name"] for row in df_stage.collect()]
+            }
+        return self.catalog
 
-            ############################# Validate Metadata #############################
-
-            file_format_not_valid = [x for x in list_src_file_format if x not in list_sf_file_format]
-            stage_not_valid = [x for x in list_src_stage if x not in list_sf_stage]
+    def test_metadata(self):
+        # Validates metadata by running every rule of metadata_validation on the seeds 
+        # and raising one error with all the issues found.
+        try:
+            report = validate_seeds(self.load_seeds(), self.get_catalog())
 
-            # Raise an exception if there are FILE FORMATS and/or STAGES listed in the metadata and not present in RAVEN schema
-            if (len(file_format_not_valid) > 0 or len(stage_not_valid) > 0) :
-                err_fileformat = "File Formats: " + ",".join(file_format_not_valid)
-                err_stages = "Stages: " + ",".join(stage_not_valid)
-                error_message = "Metadata not valid: \n" + "\n".join([err_stages,err_fileformat])
+            if report["ERROR"]:
+                error_message = "Metadata not valid: \n" + "\n".join([f"{rule}: {violations}" for rule, violations in report["ERROR"].items()])
                 raise ValueError(error_message)
 
-            pk_source_file = df_source_file[["SOURCE_SYSTEM_CODE", "SOURCE_FEED_CODE"]]
-            dpk_source_file = pk_source_file[pk_source_file.duplicated(keep=False)]
-
-            pk_source_field = df_source_field[["SOURCE_SYSTEM_CODE", "SOURCE_FEED_CODE","SOURCE_FIELD_NAME"]]
-            dpk_source_field = pk_source_field[pk_source_field.duplicated(keep=False)]
-
-            pk_target_field = df_source_field[["SOURCE_SYSTEM_CODE", "SOURCE_FEED_CODE","TARGET_FIELD_NAME"]]
-            dpk_target_field = pk_target_field[pk_target_field.duplicated(keep=False)]
-
-            pk_stage_me_parameters = df_stage_me_parameters[["DATASET_NAME"]]
-            dpk_stage_me_parameters = pk_stage_me_parameters[pk_stage_me_parameters.duplicated(keep=False)]
-
-            if (len(dpk_source_file) > 0 or len(dpk_source_field) > 0 or len(dpk_target_field) > 0 or len(dpk_stage_me_parameters) > 0):
-                err_source_file = "CSV SOURCE_FILE: " + str(dpk_source_file.to_dict('index'))
-                err_source_field_src = "CSV SOURCE FIELD SRC: " + str(dpk_source_field.to_dict('index'))
-                err_source_field_tgt = "CSV SOURCE FIELD TGT: " + str(dpk_target_field.to_dict('index'))
-                err_stage_me_parameters = "CSV STAGE ME PARAMETERS: " + str(dpk_stage_me_parameters.to_dict('index'))
-                error_message = "Metadata not valid. Duplicate keys for: \n" + "\n".join([err_source_file,err_source_field_src,err_source_field_tgt,err_stage_me_parameters])
-                raise ValueError(error_message)
+            if report["WARNING"]:
+                return "Metadata was successfully verified. Warnings: \n" + "\n".join([f"{rule}: {violations}" for rule, violations in report["WARNING"].items()])
             
             return  "Metadata was successfully verified."
         except:
             exc_type, exc_value, exc_traceback = sys.exc_info()
             raise exc_value
 
-    def upload_metadata(self):
+    def upload_metadata(self, full_resync: bool = False, max_workers: int = 4):
         # Uploads metadata CSV files from the seed path into Snowflake, executes 
         # associated SQL scripts to merge the data, and returns a dict of the
         # executed SQL file paths and command results.
+        # Seeds with a delta merge (metadata\merging\delta) are compared with the local snapshot of the last
+        # merge and only the changed rows are uploaded. When the snapshot is missing or does not match the
+        # table (row count and last modified), or full_resync is True, the whole CSV is merged.
+        # The seed tables are independent, so the merges run at the same time.
+        # After the merges, the load plans (RAVEN.METADATA_LOAD_PLAN) are compiled from the new metadata.
         try:
             
             exec_result = {}
-            seed_files = [f for (dirpath, dirnames, filenames) in os.walk(f"{self.seed_path}") for f in filenames]
+            seeds = self.load_seeds()
             self.session.use_schema("RAVEN")
 
-            for csv_name in seed_files:
-                metadata_file = csv_name.split('.')[0]
-                csv_path = f"{self.seed_path}\\{csv_name}"
-                df_metadata = pd.read_csv(csv_path)
-                self.session.write_pandas(df_metadata, f"TEMP_METADATA_SRC_{metadata_file}", auto_create_table=True, overwrite=True, table_type="temporary")
-
-                sql_path = f"{self.root_path}\\metadata\\merging\\{metadata_file}.sql"
-                with open(sql_path) as f: obj_cmd = f.read()
-                exec_cmd = self.session.sql(obj_cmd).collect()[0][0]
-                exec_result[sql_path.split(".")[0]] = exec_cmd
-                print(f"File executed: {sql_path}")
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = [executor.submit(self.upload_seed, metadata_file, df_metadata, full_resync) for metadata_file, df_metadata in seeds.items()]
+                for future in futures:
+                    sql_path, exec_cmd = future.result()
+                    exec_result[sql_path.split(".")[0]] = exec_cmd
+
+            exec_result["COMPILE_LOAD_PLANS"] = self.session.call("RAVEN.COMPILE_LOAD_PLANS")
                 
             return exec_result
         except:
             exc_type, exc_value, exc_traceback = sys.exc_info()
             raise exc_value
+
+    def upload_seed(self, metadata_file: str, df_metadata: pd.DataFrame, full_resync: bool = False) -> tuple:
+        """
+        Uploads and merges one seed CSV, full or delta.
+
+        Returns:
+            tuple: (merge SQL file path, command result)
+        """
+        csv_path = f"{self.seed_path}\\{metadata_file}.csv"
+
+        delta_sql_path = f"{self.root_path}\\metadata\\merging\\delta\\{metadata_file}.sql"
+        delta_mode = (not full_resync and metadata_file in SEED_PRIMARY_KEYS and os.path.exists(delta_sql_path)
+                      and self.snapshot_is_current(metadata_file))
+
+        if delta_mode:
+            df_delta = self.get_seed_delta(metadata_file, df_metadata)
+            sql_path = delta_sql_path
+            if df_delta.shape[0] == 0:
+                print(f"No changes: {csv_path}")
+                return sql_path, "No changes"
+            self.session.write_pandas(df_delta, f"TEMP_METADATA_DELTA_{metadata_file}", auto_create_table=True, overwrite=True, table_type="temporary")
+        else:
+            sql_path = f"{self.root_path}\\metadata\\merging\\{metadata_file}.sql"
+            self.session.write_pandas(df_metadata, f"TEMP_METADATA_SRC_{metadata_file}", auto_create_table=True, overwrite=True, table_type="temporary")
+
+        with open(sql_path) as f: obj_cmd = f.read()
+        exec_cmd = self.session.sql(obj_cmd).collect()[0][0]
+        print(f"File executed: {sql_path}")
+
+        if metadata_file in SEED_PRIMARY_KEYS:
+            self.save_snapshot(metadata_file)
+
+        return sql_path, exec_cmd
+
+    def seed_key(self, metadata_file: str, df: pd.DataFrame) -> pd.Series:
+        """Primary key of the seed rows, with the columns trimmed by the merge trimmed (SEED_TRIMMED_KEYS)."""
+        df_key = df[SEED_PRIMARY_KEYS[metadata_file]].astype(str)
+        for key in SEED_TRIMMED_KEYS.get(metadata_file, []):
+            df_key[key] = df_key[key].str.strip()
+        return df_key.agg("|".join, axis=1)
+
+    def get_seed_delta(self, metadata_file: str, df_metadata: pd.DataFrame) -> pd.DataFrame:
+        """
+        Compares the seed with the snapshot of the last merge.
+
+        Returns:
+            DataFrame: Changed and new rows with RAVEN_ACTION = UPSERT, and the primary key of the removed rows
+                       with RAVEN_ACTION = DISABLE
+        """
+        # Snapshot is read as the seed, both are compared as text with the same representation of numbers and empty values
+        df_snapshot = as_text(pd.read_csv(self.snapshot_paths(metadata_file)[0]))
+        df_current = as_text(df_metadata)
+
+        current_key = self.seed_key(metadata_file, df_current)
+        snapshot_key = self.seed_key(metadata_file, df_snapshot)
+
+        # Same columns in both versions, otherwise every row changed
+        if list(df_snapshot.columns) == list(df_current.columns):
+            snapshot_rows = set((snapshot_key + "\x1f" + df_snapshot.agg("\x1f".join, axis=1)).tolist())
+            changed = ~(current_key + "\x1f" + df_current.agg("\x1f".join, axis=1)).isin(snapshot_rows)
+        else:
+            changed = pd.Series(True, index=df_current.index)
+
+        df_upsert = df_metadata[changed.values].copy()
+        df_upsert["RAVEN_ACTION"] = "UPSERT"
+
+        df_disable = df_snapshot[~snapshot_key.isin(set(current_key.tolist()))][SEED_PRIMARY_KEYS[metadata_file]].copy()
+        df_disable["RAVEN_ACTION"] = "DISABLE"
+
+        return pd.concat([df_upsert, df_disable], ignore_index=True)
+
+    def snapshot_paths(self, metadata_file: str) -> tuple:
+        snapshot_path = f"{self.root_path}\\metadata\\snapshots\\{self.database_name.lower()}\\{self.app_name}"
+        return f"{snapshot_path}\\{metadata_file}.csv", f"{snapshot_path}\\{metadata_file}.json"
+
+    def get_table_state(self, metadata_file: str) -> dict:
+        """Row count and last modified timestamp of the metadata table."""
+        row = self.session.sql(f"""
+            SELECT COUNT(*) AS ROW_COUNT, TO_VARCHAR(MAX(LAST_MODIFIED), 'YYYY-MM-DD HH24:MI:SS.FF9 TZHTZM') AS LAST_MODIFIED
+            FROM RAVEN.METADATA_{metadata_file}
+        """).collect()[0]
+        return {"row_count": row["ROW_COUNT"], "last_modified": row["LAST_MODIFIED"]}
+
+    def snapshot_is_current(self, metadata_file: str) -> bool:
+        """The snapshot can be used when it exists and the table was not changed after the last merge."""
+        csv_snapshot, json_snapshot = self.snapshot_paths(metadata_file)
+        if not (os.path.exists(csv_snapshot) and os.path.exists(json_snapshot)):
+            return False
+        with open(json_snapshot) as f: snapshot_state = json.load(f)
+        return snapshot_state == self.get_table_state(metadata_file)
+
+    def save_snapshot(self, metadata_file: str):
+        csv_snapshot, json_snapshot = self.snapshot_paths(metadata_file)
+        os.makedirs(csv_snapshot.rsplit("\\", 1)[0], exist_ok=True)
+        # Raw copy of the seed, so the next comparison reads both files the same way
+        shutil.copyfile(f"{self.seed_path}\\{metadata_file}.csv", csv_snapshot)
+        with open(json_snapshot, "w") as f: json.dump(self.get_table_state(metadata_file), f)
@@ -0,0 +1,127 @@
+"""
+Validation rules for the metadata seeds.
+
+Each rule receives the seeds (dict of DataFrames, key is the CSV name without extension) and the catalog
+(file formats and stages of the database) and returns a DataFrame with the rows that break the rule.
+Rules are registered with the decorator register_rule and all of them are executed by validate_seeds,
+so every violation is reported at once. Rules with severity WARNING are reported but do not fail the validation.
+"""
+import pandas as pd
+
+RULES = {}
+
+# Values of STAGE_ME_PARAMETERS.LOAD_STRATEGY (see RAVEN.PY_STAGE_ME)
+LOAD_STRATEGIES = ["DELETE_INSERT", "COB_REPLACE"]
+
+
+def register_rule(name: str, severity: str = "ERROR"):
+    """Adds the function to the rule registry."""
+    def decorator(rule):
+        RULES[name] = {"rule": rule, "severity": severity}
+        return rule
+    return decorator
+
+
+def as_text(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Values of the seed columns as text, to compare seeds read with different types: missing values are empty and
+    integral floats have no decimals (a numeric column with empty values is read as float, 1 and 1.0 are the same value).
+    """
+    columns = {}
+    for name, values in df.items():
+        text = values.astype(str)
+        if pd.api.types.is_float_dtype(values):
+            integral = values.notna() & (values % 1 == 0) & (values.abs() < 2**63)
+            text[integral] = values[integral].astype("int64").astype(str)
+        columns[name] = text.where(values.notna(), "")
+    return pd.DataFrame(columns, index=df.index)
+
+
+def key_not_in(df: pd.DataFrame, columns: list, df_reference: pd.DataFrame) -> pd.Series:
+    """Boolean mask of the rows of df whose key columns are not present in df_reference."""
+    reference = pd.MultiIndex.from_frame(as_text(df_reference[columns]))
+    return ~pd.MultiIndex.from_frame(as_text(df[columns])).isin(reference)
+
+
+@register_rule("DUPLICATE_PRIMARY_KEY")
+def duplicate_primary_key(seeds: dict, catalog: dict) -> pd.DataFrame:
+    unique_keys = [
+        ("SOURCE_FILE", ["SOURCE_SYSTEM_CODE", "SOURCE_FEED_CODE"]),
+        ("SOURCE_FIELD", ["SOURCE_SYSTEM_CODE", "SOURCE_FEED_CODE", "SOURCE_FIELD_NAME"]),
+        ("SOURCE_FIELD", ["SOURCE_SYSTEM_CODE", "SOURCE_FEED_CODE", "TARGET_FIELD_NAME"]),
+        ("STAGE_ME_PARAMETERS", ["DATASET_NAME"])
+    ]
+    violations = []
+    for seed_name, columns in unique_keys:
+        if seed_name not in seeds:
+            continue
+        df = seeds[seed_name]
+        df_key = as_text(df[columns]).apply(lambda x: x.str.strip())
+        df_dup = df[columns][df_key.duplicated(keep=False)].copy()
+        df_dup["SEED"] = seed_name
+        df_dup["KEY"] = ",".join(columns)
+        violations.append(df_dup)
+    return pd.concat(violations, ignore_index=True) if violations else pd.DataFrame()
+
+
+@register_rule("FILE_FORMAT_NOT_FOUND")
+def file_format_not_found(seeds: dict, catalog: dict) -> pd.DataFrame:
+    df = seeds["SOURCE_FILE"]
+    return df[~df["FILE_FORMAT"].isin(catalog["file_formats"])][["SOURCE_SYSTEM_CODE", "SOURCE_FEED_CODE", "FILE_FORMAT"]]
+
+
+@register_rule("STAGE_NOT_FOUND")
+def stage_not_found(seeds: dict, catalog: dict) -> pd.DataFrame:
+    # STAGE_NAME can be NULL only when the source file is disabled
+    df = seeds["SOURCE_FILE"]
+    mask = ~df["STAGE_NAME"].isin(catalog["stages"]) & (df["STAGE_NAME"].notna() | df["IS_ENABLED"].astype(bool))
+    return df[mask][["SOURCE_SYSTEM_CODE", "SOURCE_FEED_CODE", "STAGE_NAME"]]
+
+
+@register_rule("SOURCE_FILE_NOT_FOUND")
+def source_file_not_found(seeds: dict, catalog: dict) -> pd.DataFrame:
+    # Enabled datasets must point to an existing source file
+    columns = ["SOURCE_SYSTEM_CODE", "SOURCE_FEED_CODE"]
+    df = seeds["STAGE_ME_PARAMETERS"]
+    mask = key_not_in(df, columns, seeds["SOURCE_FILE"]) & df["IS_ENABLED"].astype(bool)
+    return df[mask][["DATASET_NAME"] + columns]
+
+
+@register_rule("INVALID_LOAD_STRATEGY")
+def invalid_load_strategy(seeds: dict, catalog: dict) -> pd.DataFrame:
+    # Empty value uses the default strategy (DELETE_INSERT)
+    df = seeds["STAGE_ME_PARAMETERS"]
+    load_strategy = df["LOAD_STRATEGY"].fillna("").astype(str).str.strip().str.upper()
+    return df[~load_strategy.isin(LOAD_STRATEGIES + [""])][["DATASET_NAME", "LOAD_STRATEGY"]]
+
+
+@register_rule("ORPHAN_METADATA_ROWS", severity="WARNING")
+def orphan_metadata_rows(seeds: dict, catalog: dict) -> pd.DataFrame:
+    # Fields and disabled datasets without source file are never used
+    columns = ["SOURCE_SYSTEM_CODE", "SOURCE_FEED_CODE"]
+    violations = []
+    for seed_name in ["SOURCE_FIELD", "STAGE_ME_PARAMETERS"]:
+        df = seeds[seed_name]
+        mask = key_not_in(df, columns, seeds["SOURCE_FILE"])
+        if seed_name == "STAGE_ME_PARAMETERS":
+            mask = mask & ~df["IS_ENABLED"].astype(bool)
+        df_missing = df[mask][columns].drop_duplicates()
+        df_missing["SEED"] = seed_name
+        violations.append(df_missing)
+    return pd.concat(violations, ignore_index=True)
+
+
+def validate_seeds(seeds: dict, catalog: dict) -> dict:
+    """
+    Runs every registered rule.
+
+    Returns:
+        dict: Severity (ERROR, WARNING) as key and dict with rule name as key and list of rows (dict) breaking 
+              the rule as value. Only rules with violations are returned.
+    """
+    report = {"ERROR": {}, "WARNING": {}}
+    for name, registered in RULES.items():
+        df_violations = registered["rule"](seeds, catalog)
+        if df_violations.shape[0] > 0:
+            report[registered["severity"]][name] = df_violations.astype(object).where(df_violations.notna(), None).to_dict("records")
+    return report
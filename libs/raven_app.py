@@ -52,6 +52,13 @@ class RavenTargetDB:
         params_dict["fin_market"] = config[self.app_name.upper()]['FINANCIAL_MARKET']
         params_dict["country"] = config[self.app_name.upper()]['COUNTRY']
         params_dict["subdiv"] = config[self.app_name.upper()]['SUBDIVISION']
+        # Markets of RAVEN.METADATA_CALENDAR: the market of the app first, then the optional CALENDAR_MARKETS
+        params_dict["calendar_markets"] = [{
+            "holiday_type": market['HOLIDAY_TYPE'],
+            "fin_market": market.get('FINANCIAL_MARKET'),
+            "country": market.get('COUNTRY'),
+            "subdiv": market.get('SUBDIVISION')
+            } for market in [config[self.app_name.upper()]] + config[self.app_name.upper()].get('CALENDAR_MARKETS', [])]
         params_dict["user_name"] = config[self.app_name.upper()]['USER_NAME']\
             .format(self.environment_letter,self.app_name)        
         params_dict["conn_type"] = config[self.app_name.upper()]['CONNECTION_TYPE']
@@ -1,4 +1,12 @@
+import hashlib
 from pathlib import Path
 
 def get_project_root() -> Path:
     return str(Path(__file__).parent.parent)
+
+def file_sha256(file_path: str) -> str:
+    sha256 = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
@@ -21,6 +21,8 @@ USING (
 		,NVL(src.ALLOW_INFER_SCHEMA, TRUE) as ALLOW_INFER_SCHEMA
 		,IFF(src.FILE_PATH IS NULL, 'DISABLE', 'UPDATE') AS ACTION_UPDATE
 		,ARRAY_EXCEPT(SPLIT(src.TAGS,'#'),['']) AS TAGS
+		,NVL(UPPER(NULLIF(TRIM(src.LOAD_STRATEGY),'')), 'DELETE_INSERT') AS LOAD_STRATEGY
+		,NVL(src.CLUSTER_BY_COBID, FALSE) AS CLUSTER_BY_COBID
 	FROM RAVEN.TEMP_METADATA_SRC_STAGE_ME_PARAMETERS src
 	FULL OUTER JOIN RAVEN.METADATA_STAGE_ME_PARAMETERS tgt ON src.DATASET_NAME COLLATE 'utf8' = tgt.DATASET_NAME
 ) AS src
@@ -45,6 +47,8 @@ THEN UPDATE SET
 	tgt.WAREHOUSE_SIZE=src.WAREHOUSE_SIZE,
 	tgt.ALLOW_INFER_SCHEMA=src.ALLOW_INFER_SCHEMA,
 	tgt.TAGS=src.TAGS,
+	tgt.LOAD_STRATEGY=src.LOAD_STRATEGY,
+	tgt.CLUSTER_BY_COBID=src.CLUSTER_BY_COBID,
 	tgt.LAST_MODIFIED=CURRENT_TIMESTAMP(),
 	tgt.FIRST_TIME_INSERTED=nvl(tgt.FIRST_TIME_INSERTED,CURRENT_TIMESTAMP())
 WHEN MATCHED AND ACTION_UPDATE = 'DISABLE'
@@ -70,6 +74,8 @@ THEN INSERT
 	WAREHOUSE_SIZE,
 	ALLOW_INFER_SCHEMA,
 	TAGS,
+	LOAD_STRATEGY,
+	CLUSTER_BY_COBID,
 	LAST_MODIFIED,
 	FIRST_TIME_INSERTED
 	)
@@ -93,6 +99,8 @@ THEN INSERT
 	src.WAREHOUSE_SIZE,
 	src.ALLOW_INFER_SCHEMA,
 	src.TAGS,
+	src.LOAD_STRATEGY,
+	src.CLUSTER_BY_COBID,
 	CURRENT_TIMESTAMP(),
 	CURRENT_TIMESTAMP()
 	)
@@ -5,8 +5,13 @@ USING (
     ,CAST(IS_BANK_HOLIDAY AS BOOLEAN)       AS IS_BANK_HOLIDAY
     ,date(NEXT_BUSINESS_DAY,'YYYY-MM-DD')   AS NEXT_BUSINESS_DAY
     ,CAST(COBID AS INT)                     AS COBID
-FROM RAVEN.TEMP_METADATA_SRC_CALENDAR ) AS src
-ON (tgt.COBID=src.COBID)
+    ,MARKET                                 AS MARKET
+    ,CAST(IS_PRIMARY_MARKET AS BOOLEAN)     AS IS_PRIMARY_MARKET
+FROM RAVEN.TEMP_METADATA_DELTA_CALENDAR ) AS src
+ON (
+    tgt.COBID=src.COBID
+AND (tgt.MARKET=src.MARKET OR (tgt.MARKET='' AND src.IS_PRIMARY_MARKET))
+)
 WHEN MATCHED
 THEN UPDATE SET
  tgt.MY_DATE=src.MY_DATE
@@ -20,6 +25,8 @@ THEN UPDATE SET
 ,tgt.DAY_OF_YEAR=DAYOFYEAR(src.MY_DATE)
 ,tgt.IS_BANK_HOLIDAY=src.IS_BANK_HOLIDAY
 ,tgt.NEXT_BUSINESS_DAY=src.NEXT_BUSINESS_DAY
+,tgt.MARKET=src.MARKET
+,tgt.IS_PRIMARY_MARKET=src.IS_PRIMARY_MARKET
 ,tgt.LAST_MODIFIED=CURRENT_TIMESTAMP()
 ,tgt.FIRST_TIME_INSERTED=nvl(tgt.FIRST_TIME_INSERTED,CURRENT_TIMESTAMP())
 WHEN NOT MATCHED
@@ -36,6 +43,8 @@ WEEK_OF_YEAR,
 DAY_OF_YEAR, 
 IS_BANK_HOLIDAY, 
 NEXT_BUSINESS_DAY, 
+MARKET,
+IS_PRIMARY_MARKET,
 LAST_MODIFIED,
 FIRST_TIME_INSERTED)
 VALUES (
@@ -51,6 +60,8 @@ VALUES (
 ,DAYOFYEAR(src.MY_DATE)
 ,src.IS_BANK_HOLIDAY
 ,src.NEXT_BUSINESS_DAY
+,src.MARKET
+,src.IS_PRIMARY_MARKET
 ,CURRENT_TIMESTAMP()
 ,CURRENT_TIMESTAMP()
 );
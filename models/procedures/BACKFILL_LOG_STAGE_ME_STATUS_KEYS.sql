@@ -0,0 +1,54 @@
+/**
+ * Fills FILE_KEY, CONTAINER_NAME and FAILURE_REASON of the rows of RAVEN.LOG_STAGE_ME_STATUS logged before the columns existed.
+ *
+ * The staging procedures write the columns with each event (see models/shared/stage_me_log.py). This procedure applies
+ * the same rules in SQL, the FAILURE_REASON patterns are read from the module so both stay the same.
+ * Only rows with FILE_KEY NULL are updated: after the first run it does not change any row.
+ * Returns the number of rows updated.
+ */
+CREATE OR REPLACE PROCEDURE RAVEN.BACKFILL_LOG_STAGE_ME_STATUS_KEYS()
+RETURNS VARIANT
+LANGUAGE PYTHON
+RUNTIME_VERSION = '3.8'
+PACKAGES = ('snowflake-snowpark-python')
+IMPORTS = ('@RAVEN.INTSTAGE_RAVEN_FILES/models/shared/stage_me_log.py')
+HANDLER = 'run'
+EXECUTE AS caller
+AS
+$$
+
+import sys
+from snowflake.snowpark.exceptions import SnowparkSQLException
+from stage_me_log import FAILURE_REASONS
+
+def failure_reason_sql(exception_column):
+    """
+    CASE expression of the FAILURE_REASON of a failed row (same rules as stage_me_log.failure_reason)
+
+    exception_column: SQL expression of the exception
+    """
+    cases = " ".join([f"WHEN REGEXP_INSTR({exception_column}, '{pattern.pattern}', 1, 1, 0, 's') > 0 THEN '{reason}'"
+                      for reason, pattern in FAILURE_REASONS])
+    return f"CASE {cases} ELSE 'OTHER' END"
+
+def run(session):
+    try:
+        exception_column = "NVL(PROCESS_RESULT:\"exception\"::VARCHAR, '')"
+        update_result = session.sql(f""" UPDATE RAVEN.LOG_STAGE_ME_STATUS
+                                            SET FILE_KEY = TRIM(REGEXP_REPLACE(PROCESS_PARAMETERS:"file_stage_me"::VARCHAR,'/+','/'),'/'),
+                                                CONTAINER_NAME = PROCESS_PARAMETERS:"container_name"::VARCHAR,
+                                                FAILURE_REASON = IFF(PROCESS_STATUS = 'FAILED', {failure_reason_sql(exception_column)}, NULL)
+                                          WHERE FILE_KEY IS NULL
+                                            AND PROCESS_PARAMETERS:"file_stage_me" IS NOT NULL
+                                     """).collect()[0]
+
+        return {"rows_updated": update_result["number of rows updated"]}
+
+    except SnowparkSQLException as e:
+        raise e.message
+    except:
+        exc_type, exc_value, exc_traceback = sys.exc_info()
+        raise exc_value
+
+$$
+;
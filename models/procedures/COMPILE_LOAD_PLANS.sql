@@ -0,0 +1,130 @@
+/**
+ * Compiles the load plan of every dataset into RAVEN.METADATA_LOAD_PLAN.
+ *
+ * The plan keeps the result of RAVEN.VW_METADATA_SOURCE_FILE_AND_FIELD_CONCAT (SOURCE_FILE_AND_FIELD), the target column list,
+ * the source transform list, the CREATE column list and the COPY template, so the staging procedures do not evaluate the view chain.
+ * METADATA_VERSION is the hash of the plan: a new row is inserted only when the plan changes and the previous version is kept with IS_CURRENT = FALSE.
+ *
+ * COPY template placeholders, replaced by the staging procedures:
+ *   |:DATABASE_TARGET:|        Database of the staging table
+ *   |:PATTERN_FILE:|           Folder and file name pattern
+ *   |:STAGING_SCOPE_FIELDS:|   DEPARTMENT_CODE, ENTITY_CODE, MARKET, REGION object
+ *   |:RAVEN_COBID:|            COB of the files: literal or lookup of the listed files, RAVEN.FN_FIND_COB for Snowpipe
+ */
+CREATE OR REPLACE PROCEDURE RAVEN.COMPILE_LOAD_PLANS()
+RETURNS VARIANT
+LANGUAGE PYTHON
+RUNTIME_VERSION = '3.8'
+PACKAGES = ('snowflake-snowpark-python')
+IMPORTS = ('@RAVEN.INTSTAGE_RAVEN_FILES/models/shared/copy_cob.py')
+HANDLER = 'run'
+EXECUTE AS caller
+AS
+$$
+
+import sys
+import json
+import hashlib
+from copy_cob import COB_PLACEHOLDER
+
+# Raven metadata fields, same order as PY_STAGE_ME
+TARGET_COLUMNS_RAVEN = "RAVEN_COBID,RAVEN_STAGE_SCOPE_FIELDS,RAVEN_FILENAME,RAVEN_FILE_ROW_NUMBER,RAVEN_STAGE_TIMESTAMP,RAVEN_DATASET_NAME"
+
+def compile_plan(dataset_name, src_file_field):
+    """
+    Builds the load plan of one dataset
+
+    return Dictionary with the plan columns
+
+    dataset_name: RAVEN.METADATA_STAGE_ME_PARAMETERS Primary Key
+    src_file_field: Row of RAVEN.VW_METADATA_SOURCE_FILE_AND_FIELD_CONCAT as dictionary
+    """
+    list_column_name_target = [c for c in src_file_field.get("LIST_COLUMN_NAME_TARGET", []) if c]
+    list_source_transform = [c for c in src_file_field.get("LIST_COLUMN_POSITION_SOURCE_TRANSFORM", []) if c]
+    list_create_column = [c for c in src_file_field.get("LIST_CREATE_COLUMN_NAME_TARGET", []) if c]
+    list_extra_field = [c for c in src_file_field.get("LIST_EXTRA_FIELD_DERIVED_EXPRESSION", []) if c]
+    list_extra_expression = [c for c in src_file_field.get("LIST_EXTRA_DERIVED_EXPRESSION", []) if c]
+
+    skip_row_on_error = int(src_file_field.get("SKIP_ROW_ON_ERROR", 0))
+    on_error = f"on_error = 'skip_file_{str(skip_row_on_error)}'" if skip_row_on_error > 0 else ""
+
+    # RAVEN_COBID is resolved by PY_STAGE_ME from the listed files (models/shared/copy_cob.py)
+    source_columns_raven = f"{COB_PLACEHOLDER} AS RAVEN_COBID,|:STAGING_SCOPE_FIELDS:|::OBJECT AS RAVEN_STAGE_SCOPE_FIELDS,metadata$filename AS RAVEN_FILENAME,metadata$file_row_number AS RAVEN_FILE_ROW_NUMBER,current_timestamp AS RAVEN_STAGE_TIMESTAMP,'{dataset_name}' AS RAVEN_DATASET_NAME"
+
+    target_columns = ",".join(filter(None, [",".join(list_column_name_target), TARGET_COLUMNS_RAVEN, ",".join(list_extra_field)]))
+    source_columns = ",".join(filter(None, [",".join(list_source_transform), source_columns_raven, ",".join(list_extra_expression)]))
+
+    ff_and_pattern = f" (file_format => '{src_file_field['FILE_FORMAT']}', pattern => '.*|:PATTERN_FILE:|') "
+    cmd_select = f" SELECT {source_columns} FROM @{src_file_field['STAGE_NAME']} {ff_and_pattern} "
+    copy_template = f" COPY INTO |:DATABASE_TARGET:|.{src_file_field['DESTINATION_FULL_TABLE_NAME']} ({target_columns}) FROM ({cmd_select}) {on_error}"
+
+    plan = {
+        "DATASET_NAME": dataset_name,
+        "SOURCE_SYSTEM_CODE": src_file_field["SOURCE_SYSTEM_CODE"],
+        "SOURCE_FEED_CODE": src_file_field["SOURCE_FEED_CODE"],
+        "STAGE_NAME": src_file_field.get("STAGE_NAME"),
+        "SOURCE_FILE_NAME_PATTERN": src_file_field.get("SOURCE_FILE_NAME_PATTERN"),
+        "SOURCE_FILE_AND_FIELD": src_file_field,
+        "TARGET_COLUMN_LIST": ",".join(list_column_name_target),
+        "SOURCE_TRANSFORM_LIST": ",".join(list_source_transform),
+        "CREATE_COLUMN_LIST": ",".join(list_create_column),
+        "COPY_TEMPLATE": copy_template
+    }
+    plan["METADATA_VERSION"] = hashlib.sha256(json.dumps(plan, sort_keys=True, default=str).encode("utf8")).hexdigest()
+    return plan
+
+def run(session):
+    try:
+        # Source file and field configuration, one row per source file
+        sf_concat = session.sql("""
+            SELECT SOURCE_SYSTEM_CODE, SOURCE_FEED_CODE, TO_JSON(OBJECT_CONSTRUCT(*)) AS SRC
+            FROM RAVEN.VW_METADATA_SOURCE_FILE_AND_FIELD_CONCAT
+        """).collect()
+        dct_src = {(r["SOURCE_SYSTEM_CODE"], r["SOURCE_FEED_CODE"]): json.loads(r["SRC"]) for r in sf_concat}
+
+        sf_parameters = session.table("RAVEN.METADATA_STAGE_ME_PARAMETERS") \
+            .select("DATASET_NAME", "SOURCE_SYSTEM_CODE", "SOURCE_FEED_CODE") \
+            .collect()
+
+        plans = [compile_plan(r["DATASET_NAME"], dct_src[(r["SOURCE_SYSTEM_CODE"], r["SOURCE_FEED_CODE"])])
+                 for r in sf_parameters if (r["SOURCE_SYSTEM_CODE"], r["SOURCE_FEED_CODE"]) in dct_src]
+
+        if plans:
+            rows = [dict(p, SOURCE_FILE_AND_FIELD=json.dumps(p["SOURCE_FILE_AND_FIELD"])) for p in plans]
+            session.create_dataframe(rows).write.save_as_table("RAVEN.TEMP_METADATA_LOAD_PLAN", mode="overwrite", table_type="temporary")
+        else:
+            session.sql("CREATE OR REPLACE TEMPORARY TABLE RAVEN.TEMP_METADATA_LOAD_PLAN (DATASET_NAME VARCHAR, METADATA_VERSION VARCHAR)").collect()
+
+        # New versions
+        merge_result = session.sql("""
+            MERGE INTO RAVEN.METADATA_LOAD_PLAN AS tgt
+            USING RAVEN.TEMP_METADATA_LOAD_PLAN AS src
+            ON tgt.DATASET_NAME = src.DATASET_NAME COLLATE 'utf8' AND tgt.METADATA_VERSION = src.METADATA_VERSION
+            WHEN MATCHED AND tgt.IS_CURRENT = FALSE
+            THEN UPDATE SET tgt.IS_CURRENT = TRUE, tgt.COMPILED_TIMESTAMP = CURRENT_TIMESTAMP()
+            WHEN NOT MATCHED
+            THEN INSERT (DATASET_NAME, METADATA_VERSION, IS_CURRENT, SOURCE_SYSTEM_CODE, SOURCE_FEED_CODE, STAGE_NAME, SOURCE_FILE_NAME_PATTERN,
+                         SOURCE_FILE_AND_FIELD, TARGET_COLUMN_LIST, SOURCE_TRANSFORM_LIST, CREATE_COLUMN_LIST, COPY_TEMPLATE, COMPILED_TIMESTAMP)
+            VALUES (src.DATASET_NAME, src.METADATA_VERSION, TRUE, src.SOURCE_SYSTEM_CODE, src.SOURCE_FEED_CODE, src.STAGE_NAME, src.SOURCE_FILE_NAME_PATTERN,
+                    PARSE_JSON(src.SOURCE_FILE_AND_FIELD), src.TARGET_COLUMN_LIST, src.SOURCE_TRANSFORM_LIST, src.CREATE_COLUMN_LIST, src.COPY_TEMPLATE, CURRENT_TIMESTAMP())
+        """).collect()[0].as_dict()
+
+        # Previous versions and removed datasets
+        update_result = session.sql("""
+            UPDATE RAVEN.METADATA_LOAD_PLAN
+            SET IS_CURRENT = FALSE
+            WHERE IS_CURRENT = TRUE
+              AND (DATASET_NAME, METADATA_VERSION) NOT IN (SELECT DATASET_NAME COLLATE 'utf8', METADATA_VERSION FROM RAVEN.TEMP_METADATA_LOAD_PLAN)
+        """).collect()[0].as_dict()
+
+        # Resolve the stage parameters of the changed datasets
+        refresh_result = session.call("RAVEN.REFRESH_STAGE_ME_PARAMETERS_COB")
+
+        return {"plans": len(plans), "merge_result": merge_result, "update_result": update_result, "refresh_result": refresh_result}
+
+    except:
+        exc_type, exc_value, exc_traceback = sys.exc_info()
+        raise exc_type(exc_value).with_traceback(exc_traceback)
+
+$$
+;
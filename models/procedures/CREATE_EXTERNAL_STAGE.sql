@@ -3,6 +3,7 @@ RETURNS VARCHAR(16777216)
 LANGUAGE PYTHON
 RUNTIME_VERSION = '3.8'
 PACKAGES = ('snowflake-snowpark-python')
+IMPORTS = ('@RAVEN.INTSTAGE_RAVEN_FILES/models/shared/catalog_cache.py')
 HANDLER = 'run'
 EXECUTE AS caller
 AS
@@ -11,6 +12,7 @@ $$
 import pandas as pd
 import sys
 from snowflake.snowpark.exceptions import SnowparkSQLException
+from catalog_cache import CatalogCache
 
 def run(session,schema_destination,env_version_number):
     try:
@@ -22,6 +24,7 @@ def run(session,schema_destination,env_version_number):
                                     IFNULL(TRY_TO_NUMBER(SPLIT_PART(current_database(),'_', 3)),1) AS DB_VERSION 
                         """
         environment = session.sql(environment_sql).collect()[0]
+        catalog_cache = CatalogCache(session)
 
         curr_db = environment["CURRENT_DB"]
         env = environment["ENVIRONMENT"]
@@ -70,11 +73,11 @@ def run(session,schema_destination,env_version_number):
                 dataset_name_concat = "_" + dataset_name if dataset_name != datalake_owner else ""
                 stage_name = f"EXTSTAGE_AZUREDL_{datalake_owner}{dataset_name_concat}"
                 
-                # Check if stage exists
-                stage_check = session.sql(f"SHOW STAGES LIKE '{stage_name}' IN SCHEMA {schema_destination}").collect()
+                # Check if stage exists (SHOW STAGES once per schema, stage names are unique in the loop)
+                stage_check = catalog_cache.stage(stage_name, schema_destination)
 
                 sql_stage_instruction = ""
-                if len(stage_check) == 0:
+                if not stage_check:
                     sql_stage_instruction = f"CREATE STAGE {schema_destination}.{stage_name}"
                 else:
                     sql_stage_instruction = f"ALTER STAGE {schema_destination}.{stage_name} SET"
@@ -83,7 +86,8 @@ def run(session,schema_destination,env_version_number):
 
                 session.sql(sql_stage).collect()
                 count_stages +=1
-        return f"Number of stages created: {str(count_stages)}"
+        cache_stats = catalog_cache.stats()
+        return f"Number of stages created: {str(count_stages)} (catalog cache hits: {cache_stats['hits']}, misses: {cache_stats['misses']})"
     except SnowparkSQLException as e:
         raise e.message
     except:
@@ -1,114 +1,138 @@
-CREATE OR REPLACE PROCEDURE RAVEN.CSV_METADATA_GENERATOR(STAGE_NAME STRING, FULL_FILE_PATH STRING)
+/**
+ * Generates the RAVEN.METADATA_SOURCE_FIELD rows of a CSV feed from its files.
+ *
+ * Parameters:
+ * - STAGE_NAME: Stage of the files
+ * - FULL_FILE_PATH: Path of the file, or regular expression of the paths of several files with the same header
+ * - SOURCE_SYSTEM_CODE, SOURCE_FEED_CODE: Keys of the feed written in the rows
+ * - DATE_INPUT_FORMAT, TIMESTAMP_INPUT_FORMAT: Formats of the feed (RAVEN.METADATA_SOURCE_FILE), values matching them are DATE and DATETIME
+ * - MAX_SAMPLE_ROWS: Row budget of the sample. The rows are sampled uniformly across all the files (models/shared/type_inference.py)
+ *
+ * The delimiter is detected with csv.Sniffer on the beginning of the first file.
+ * When the files have no rows (header only), the header columns of the first file are returned as VARCHAR.
+ * Returns the rows in the columns of metadata/seeds/<project>/SOURCE_FIELD.csv, ready to append to the seed.
+ */
+CREATE OR REPLACE PROCEDURE RAVEN.CSV_METADATA_GENERATOR(
+    STAGE_NAME STRING,
+    FULL_FILE_PATH STRING,
+    SOURCE_SYSTEM_CODE STRING DEFAULT NULL,
+    SOURCE_FEED_CODE STRING DEFAULT NULL,
+    DATE_INPUT_FORMAT STRING DEFAULT 'DD/MM/YYYY',
+    TIMESTAMP_INPUT_FORMAT STRING DEFAULT 'DD/MM/YYYY HH24:MI:SS.FF3',
+    MAX_SAMPLE_ROWS NUMBER DEFAULT 100000
+)
 RETURNS TABLE ()
 LANGUAGE PYTHON
 RUNTIME_VERSION = '3.8'
 PACKAGES = ('snowflake-snowpark-python','pandas','numpy')
+IMPORTS = ('@RAVEN.INTSTAGE_RAVEN_FILES/models/shared/catalog_cache.py','@RAVEN.INTSTAGE_RAVEN_FILES/models/shared/header_probe.py',
+           '@RAVEN.INTSTAGE_RAVEN_FILES/models/shared/type_inference.py')
 HANDLER = 'run'
 EXECUTE AS caller
 AS
 $$
 
-import pandas as pd
-import numpy as np
+import sys
+import gzip
 import io
-from snowflake.snowpark.types import StructType, StructField, StringType
+import pandas as pd
+from snowflake.snowpark.files import SnowflakeFile
 from snowflake.snowpark.functions import col
 from snowflake.snowpark.exceptions import SnowparkSQLException
+from catalog_cache import CatalogCache
+from header_probe import GZIP_MAGIC, probe_text, stage_file_path
+from type_inference import profile_columns, reservoir_sample, sniff_delimiter
+
+# Bytes read from the first file to detect the delimiter
+SNIFF_BYTES = 65536
+
+# Rows read at a time from each file
+CHUNK_ROWS = 100000
+
+# Columns of the SOURCE_FIELD seed
+SOURCE_FIELD_COLUMNS = [
+    'SOURCE_SYSTEM_CODE','SOURCE_FEED_CODE','SOURCE_FIELD_NAME','TARGET_FIELD_NAME','FIELD_ORDINAL','DATA_TYPE_NAME',
+    'DATA_TYPE_LENGTH','DATA_TYPE_PRECISION','DATA_TYPE_SCALE','IS_IN_SOURCE','IS_IN_TARGET','IS_DELETED','DERIVED_EXPRESSION'
+]
+
+def list_files(session,stage_name,full_file_path):
+    """
+    @<stage>/<path> of the files: the file itself, else the files matching FULL_FILE_PATH as a regular expression
+    """
+    stage_url = CatalogCache(session).stage_url(stage_name)
+    listed = session.sql(f"LIST @{stage_name} PATTERN = '.*{full_file_path}'").collect()
+    files = [stage_file_path(stage_name, r["name"], stage_url) for r in listed]
+    if not files:
+        raise Exception(f"File not found: @{stage_name}/{full_file_path}")
+    return sorted(files)
+
+def read_chunks(stage_files,delimiter):
+    """
+    Chunks of CHUNK_ROWS rows of each file as strings (gzip files are decompressed, the BOM is removed).
+    Empty files are skipped.
+    """
+    for stage_file in stage_files:
+        with SnowflakeFile.open(stage_file, "rb", require_scoped_url=False) as f:
+            raw = io.BufferedReader(f)
+            if raw.peek(len(GZIP_MAGIC)).startswith(GZIP_MAGIC):
+                raw = gzip.GzipFile(fileobj=raw)
+            text = io.TextIOWrapper(raw, encoding="utf-8-sig", errors="replace", newline="")
+            try:
+                for chunk in pd.read_csv(text, sep=delimiter, dtype=str, keep_default_na=False, chunksize=CHUNK_ROWS,
+                                         engine="python" if len(delimiter) > 1 else "c"):
+                    yield chunk
+            except pd.errors.EmptyDataError:
+                continue
+
+def header_columns(text,delimiter):
+    """
+    Columns of the header line of the first file, for files without rows
+    """
+    header = text.lstrip("\ufeff").splitlines()[0] if text.strip() else ""
+    if not header.strip():
+        raise Exception("File has no header")
+    return list(pd.read_csv(io.StringIO(header), sep=delimiter, dtype=str, nrows=0,
+                            engine="python" if len(delimiter) > 1 else "c").columns)
 
-def buffer_file(session,stage_name,full_file_path):
-        
-    # Create a Schema that has only one String column 
-    schema = StructType([StructField("all", StringType())])
-            
-    # Read the CSV file from Snowflake into a DataFrame
-    result = session.read.option('field_delimiter', '¬')\
-        .schema(schema)\
-        .csv(f'@{stage_name}/{full_file_path}')\
-        .limit(100)\
-        .collect()
-
-    #Read result row objects to strings
-    csv_data = [row[0] for row in result]
-
-    # Find delimiter
-    delimiters = [',','|',';','\t']
-    header = csv_data[0]
-    count_delimiter = {}
-    for d in delimiters:
-        count_char = header.count(d)
-        count_delimiter[d] = count_char
-        
-    # Get the key with max value        
-    delimiter = max(count_delimiter, key=count_delimiter.get)
-        
-    # Create the buffer object
-    buffer = io.StringIO()
-        
-    # Write the strings to the buffer
-    for s in csv_data:
-        buffer.write(s+'\n')      
-    
-    # Reset the buffer's position to the beginning
-    buffer.seek(0)
-    return buffer, delimiter
-    
-def run(session,stage_name,full_file_path):
+def run(session,stage_name,full_file_path,source_system_code,source_feed_code,date_input_format,timestamp_input_format,max_sample_rows):
     try:
-        # Put the first 100 rows in a buffer and delimiter
-        buffer, delimiter = buffer_file(session,stage_name,full_file_path)
-
-        # Read from the buffer
-        df = pd.read_csv(buffer, delimiter=delimiter, encoding = 'utf-8')
-
-        # Field type mapping
-        df_type_mapping = pd.DataFrame(
-            {
-                'TYPE': ['string','integer', 'floating'],
-                'DATA_TYPE_NAME': ['VARCHAR','NUMERIC','NUMERIC'],
-                'DATA_TYPE_LENGTH': [1000,0,0],
-                'DATA_TYPE_PRECISION':[0,38,38],
-                'DATA_TYPE_SCALE':[0,0,18]
-            },
-            index=[0, 1, 2]
-        )
-
-        # Schema
-        infer_type = lambda x: pd.api.types.infer_dtype(x, skipna=True)
-        df.apply(infer_type, axis=0)
-
-        # DataFrame with column names & new types
-        df_type = pd.DataFrame(df.apply(pd.api.types.infer_dtype, axis=0)).reset_index().rename(columns={'index': 'SOURCE_FIELD_NAME', 0: 'TYPE'})
+        stage_files = list_files(session,stage_name,full_file_path)
+
+        # Delimiter of the first file
+        text, truncated = probe_text(stage_files[0], SNIFF_BYTES)
+        delimiter = sniff_delimiter(text[:text.rfind("\n") + 1] if truncated else text)
+
+        # Uniform sample of the rows of all the files, fixed seed so the same files give the same metadata
+        df_sample = reservoir_sample(read_chunks(stage_files,delimiter), int(max_sample_rows), seed=0)
+
+        # Header only files: no row is sampled, the header columns are profiled as VARCHAR
+        if df_sample.columns.empty:
+            df_sample = pd.DataFrame(columns=header_columns(text,delimiter), dtype=object)
+
+        # Types of the columns
+        df_type = pd.DataFrame(profile_columns(df_sample, date_input_format, timestamp_input_format))
 
         # Add destination field name
         df_type['TARGET_FIELD_NAME'] = df_type['SOURCE_FIELD_NAME']\
-            .str.replace('[\W]', '')\
-            .str.replace('(?<!^)([A-Z])', r'_\1')\
+            .str.replace(r'[\W]', '', regex=True)\
+            .str.replace(r'(?<=[a-z0-9])(?=[A-Z])|(?<=[A-Z])(?=[A-Z][a-z])', '_', regex=True)\
             .str.upper()
 
-        # Add field position
-        df_type['FIELD_ORDINAL'] = df_type.index +1
-
-        # Mapping field type and drop TYPE column
-        df_type = pd.merge(df_type, df_type_mapping, how="inner", on=["TYPE"])
-        df_type.drop('TYPE', axis=1, inplace=True)
-
-        # Add default values
-        df_type[
-            [
-                'IS_IN_SOURCE',
-                'IS_IN_TARGET',
-                'IS_DELETED',
-                'DERIVED_EXPRESSION'
-            ]
-        ] = pd.DataFrame([['TRUE', 'TRUE', 'FALSE', np.nan]], index=df_type.index)
-        
+        # Add feed and default values
+        df_type['SOURCE_SYSTEM_CODE'] = source_system_code
+        df_type['SOURCE_FEED_CODE'] = source_feed_code
+        df_type['IS_IN_SOURCE'] = 'TRUE'
+        df_type['IS_IN_TARGET'] = 'TRUE'
+        df_type['IS_DELETED'] = 'FALSE'
+        df_type['DERIVED_EXPRESSION'] = None
+
         #Return a dataframe
-        return session.create_dataframe(df_type).sort(col('FIELD_ORDINAL'))
-    
+        return session.create_dataframe(df_type[SOURCE_FIELD_COLUMNS]).sort(col('FIELD_ORDINAL'))
+
     except SnowparkSQLException as e:
         raise e.message
     except:
         exc_type, exc_value, exc_traceback = sys.exc_info()
         raise exc_value
 
-$$        
+$$
@@ -1,58 +1,202 @@
+/**
+ * Lists the files of the stage folders configured in RAVEN.METADATA_STAGE_ME_PARAMETERS_COB and saves them in RAVEN.LOG_EXTERNAL_FILE
+ * (one row per file, key STAGE_NAME and FILE_PATH).
+ *
+ * @param STAGE - Filter of the stage name (LIKE '%<STAGE>%'). Empty string for all stages.
+ * @param COBID_START - First COB of the folders to list.
+ * @param COBID_END - Last COB of the folders to list.
+ *
+ * Each folder prefix of a stage is listed once (folders inside another listed folder are not listed again) and the files
+ * are bucketed to the (COB, folder pattern, extension) rows locally with precompiled regular expressions.
+ * The listing is compared with the saved files and only the differences are merged: new files, files with other md5, size or
+ * last modified, files not listed anymore (IS_DELETED) and files whose LAST_SEEN_TIMESTAMP is older than SEEN_REFRESH_HOURS.
+ * Returns the number of patterns and, per stage, the number of LIST commands, files, listing time, bytes of listing data
+ * and the number of files merged by change type.
+ */
 CREATE OR REPLACE PROCEDURE RAVEN.LIST_STORAGE_SPACES(
     "STAGE" STRING,
-    "COBID_START" INT, 
+    "COBID_START" INT,
     "COBID_END" INT )
 RETURNS VARCHAR(16777216)
 LANGUAGE PYTHON
 RUNTIME_VERSION = '3.8'
 PACKAGES = ('snowflake-snowpark-python')
+IMPORTS = ('@RAVEN.INTSTAGE_RAVEN_FILES/models/shared/catalog_cache.py')
 HANDLER = 'run'
 EXECUTE AS caller
 AS
 $$
 
+import sys
+import re
+import json
+import time
+from datetime import datetime
 from snowflake.snowpark.functions import col, lit, when_matched, when_not_matched
-from snowflake.snowpark.types import *
+from snowflake.snowpark.types import StructField, StructType, StringType, LongType, TimestampType
 from snowflake.snowpark.exceptions import SnowparkSQLException
+from catalog_cache import CatalogCache
 
-def list_blob(session,stage_name,pattern):
-# List file(s) in the datalake according to pattern used to copy
-    cmd_list_file = f"LIST @{stage_name} pattern = '{pattern}'"
-    sf_blob_list = session.sql(cmd_list_file).collect()
-    return sf_blob_list
+# Unchanged files update LAST_SEEN_TIMESTAMP only when it is older than SEEN_REFRESH_HOURS
+SEEN_REFRESH_HOURS = 24
 
-def merge_log(session,insert_list):
-    target = session.table("RAVEN.LOG_LIST_EXTERNAL_FILE")     
-    source = session.create_dataframe([insert_list])
+def list_prefixes(folders):
+    """
+    Folders to list: a folder inside another folder of the list is covered by the listing of the parent folder
 
-    target.merge(source, 
-        (target["RAVEN_COBID"] == source["RAVEN_COBID"]) &
-        (target["STAGE_NAME"] == source["STAGE_NAME"]) &
-        (target["FOLDER_PATTERN"] == source["FOLDER_PATH_COB"]) &
-        (target["FILE_EXTENSION"] == source["FILE_EXTENSION"]) &
-        (target["FLAG_LAST_VERSION"] == lit(True))
-        ,
-        [when_matched().update({
-            "FLAG_LAST_VERSION" : lit(False)
-            })
-        ])
-    
-    target.merge(source, 
-        (target["RAVEN_COBID"] == source["RAVEN_COBID"]) &
+    return Sorted list of folders
+
+    folders: Folders of one stage, without "/" at the beginning and with "/" at the end
+    """
+    prefixes = []
+    for folder in sorted(set(folders)):
+        if not prefixes or not folder.startswith(prefixes[-1]):
+            prefixes.append(folder)
+    return prefixes
+
+def relative_path(file_url,stage_url):
+    """
+    Path of the listed file inside the stage
+
+    file_url: Name returned by LIST (URL of the file for external stages, <stage>/<path> for internal stages)
+    stage_url: URL of the stage, empty for internal stages
+    """
+    if stage_url and file_url.startswith(stage_url):
+        return file_url[len(stage_url):].lstrip("/")
+    return file_url.split("/", 1)[-1]
+
+def parse_last_modified(last_modified):
+    """
+    last_modified returned by LIST ("Mon, 26 Jun 2023 17:45:35 GMT") as datetime
+    """
+    return datetime.strptime(last_modified, "%a, %d %b %Y %H:%M:%S GMT")
+
+def get_saved_files(session,stage_names,cobid_start,cobid_end,start_timestamp):
+    """
+    Files saved in RAVEN.LOG_EXTERNAL_FILE for the stages and COBs
+
+    return Dictionary, key (STAGE_NAME, FILE_PATH)
+
+    session: session connection
+    stage_names (List): Stages listed
+    start_timestamp: Timestamp of the run, used to flag the files not seen for more than SEEN_REFRESH_HOURS
+    """
+    if not stage_names:
+        return {}
+    stages_in = ",".join([f"'{s}'" for s in stage_names])
+    saved_files = session.sql(f""" SELECT STAGE_NAME, FILE_PATH, RAVEN_COBID, FOLDER_PATTERN, FILE_EXTENSION,
+                                          FILE_MD5, FILE_SIZE, LAST_MODIFIED, IS_DELETED,
+                                          NVL(LAST_SEEN_TIMESTAMP::TIMESTAMP_NTZ < DATEADD(HOUR, -{SEEN_REFRESH_HOURS}, '{start_timestamp}'::TIMESTAMP_NTZ), TRUE) SEEN_EXPIRED
+                                     FROM RAVEN.LOG_EXTERNAL_FILE
+                                    WHERE RAVEN_COBID BETWEEN {cobid_start} AND {cobid_end}
+                                      AND STAGE_NAME IN ({stages_in})
+                               """).collect()
+    return {(r["STAGE_NAME"], r["FILE_PATH"]): r.as_dict() for r in saved_files}
+
+def file_changes(listed_files,saved_files,listed_patterns):
+    """
+    Compares the listing with the saved files
+
+    return List of listed/saved file dictionaries with the key CHANGE_TYPE (NEW, CHANGED, SEEN, DELETED).
+           Unchanged files seen less than SEEN_REFRESH_HOURS ago are not returned.
+
+    listed_files (Dict): Files of the listing, key (STAGE_NAME, FILE_PATH)
+    saved_files (Dict): Files of RAVEN.LOG_EXTERNAL_FILE, key (STAGE_NAME, FILE_PATH)
+    listed_patterns (Set): (STAGE_NAME, RAVEN_COBID, FOLDER_PATTERN, FILE_EXTENSION) listed in the run. Saved files of
+                           other patterns are not flagged as deleted
+    """
+    changes = []
+    for key, file in listed_files.items():
+        saved = saved_files.get(key)
+        if saved is None:
+            change_type = "NEW"
+        elif saved["IS_DELETED"] or (saved["FILE_MD5"], saved["FILE_SIZE"], saved["LAST_MODIFIED"]) != (file["FILE_MD5"], file["FILE_SIZE"], file["LAST_MODIFIED"]):
+            change_type = "CHANGED"
+        elif saved["SEEN_EXPIRED"]:
+            change_type = "SEEN"
+        else:
+            continue
+        changes.append(dict(file, CHANGE_TYPE=change_type))
+
+    for key, saved in saved_files.items():
+        pattern = (saved["STAGE_NAME"], saved["RAVEN_COBID"], saved["FOLDER_PATTERN"], saved["FILE_EXTENSION"])
+        if key not in listed_files and not saved["IS_DELETED"] and pattern in listed_patterns:
+            changes.append(dict(saved, FILE_NAME=None, FILE_URL=None, STAGE_URL=None, CHANGE_TYPE="DELETED"))
+    return changes
+
+def save_changes(session,changes,start_timestamp):
+    """
+    Merges the changed files in RAVEN.LOG_EXTERNAL_FILE with one MERGE
+
+    session: session connection
+    changes (List): Output of file_changes
+    start_timestamp: Timestamp of the run (FIRST_SEEN, LAST_SEEN and LAST_CHANGED timestamps)
+    """
+    if not changes:
+        return
+
+    schema = StructType([
+        StructField("STAGE_NAME", StringType()),
+        StructField("FILE_PATH", StringType()),
+        StructField("FILE_NAME", StringType()),
+        StructField("FILE_URL", StringType()),
+        StructField("STAGE_URL", StringType()),
+        StructField("RAVEN_COBID", LongType()),
+        StructField("FOLDER_PATTERN", StringType()),
+        StructField("FILE_EXTENSION", StringType()),
+        StructField("FILE_MD5", StringType()),
+        StructField("FILE_SIZE", LongType()),
+        StructField("LAST_MODIFIED", TimestampType()),
+        StructField("CHANGE_TYPE", StringType())
+    ])
+    session.create_dataframe([[r[f.name] for f in schema.fields] for r in changes], schema=schema) \
+        .write.mode("overwrite").save_as_table("RAVEN.TEMP_LIST_EXTERNAL_FILE", table_type="temporary")
+    source = session.table("RAVEN.TEMP_LIST_EXTERNAL_FILE")
+    process_timestamp = lit(start_timestamp)
+
+    target = session.table("RAVEN.LOG_EXTERNAL_FILE")
+    target.merge(source,
         (target["STAGE_NAME"] == source["STAGE_NAME"]) &
-        (target["FOLDER_PATTERN"] == source["FOLDER_PATH_COB"]) &
-        (target["FILE_EXTENSION"] == source["FILE_EXTENSION"]) &
-        (target["FLAG_LAST_VERSION"] == lit(True))
+        (target["FILE_PATH"] == source["FILE_PATH"])
         ,
-        [when_not_matched().insert({
+        [when_matched(source["CHANGE_TYPE"] == lit("SEEN")).update({
+            "LAST_SEEN_TIMESTAMP" : process_timestamp
+            }),
+        when_matched(source["CHANGE_TYPE"] == lit("DELETED")).update({
+            "IS_DELETED" : lit(True),
+            "LAST_CHANGED_TIMESTAMP" : process_timestamp
+            }),
+        when_matched().update({
+            "FILE_NAME" : source["FILE_NAME"],
+            "FILE_URL" : source["FILE_URL"],
+            "STAGE_URL" : source["STAGE_URL"],
             "RAVEN_COBID" : source["RAVEN_COBID"],
+            "FOLDER_PATTERN" : source["FOLDER_PATTERN"],
+            "FILE_EXTENSION" : source["FILE_EXTENSION"],
+            "FILE_MD5" : source["FILE_MD5"],
+            "FILE_SIZE" : source["FILE_SIZE"],
+            "LAST_MODIFIED" : source["LAST_MODIFIED"],
+            "LAST_SEEN_TIMESTAMP" : process_timestamp,
+            "LAST_CHANGED_TIMESTAMP" : process_timestamp,
+            "IS_DELETED" : lit(False)
+            }),
+        when_not_matched().insert({
             "STAGE_NAME" : source["STAGE_NAME"],
+            "FILE_PATH" : source["FILE_PATH"],
+            "FILE_NAME" : source["FILE_NAME"],
+            "FILE_URL" : source["FILE_URL"],
             "STAGE_URL" : source["STAGE_URL"],
-            "FOLDER_PATTERN" : source["FOLDER_PATH_COB"],
+            "RAVEN_COBID" : source["RAVEN_COBID"],
+            "FOLDER_PATTERN" : source["FOLDER_PATTERN"],
             "FILE_EXTENSION" : source["FILE_EXTENSION"],
-            "FILE_LIST" : source["FILE_LIST"],
-            "PROCESS_TIMESTAMP" : source["PROCESS_TIMESTAMP"],
-            "FLAG_LAST_VERSION" : source["FLAG_LAST_VERSION"]})
+            "FILE_MD5" : source["FILE_MD5"],
+            "FILE_SIZE" : source["FILE_SIZE"],
+            "LAST_MODIFIED" : source["LAST_MODIFIED"],
+            "FIRST_SEEN_TIMESTAMP" : process_timestamp,
+            "LAST_SEEN_TIMESTAMP" : process_timestamp,
+            "LAST_CHANGED_TIMESTAMP" : process_timestamp,
+            "IS_DELETED" : lit(False)
+            })
         ])
 
 
@@ -61,52 +205,82 @@ def run (session, stage, cobid_start, cobid_end):
         # Current timestamp
         sf_config = session.sql("SELECT sysdate() AS CURRENT_TIMESTAMP").collect()[0]
         start_timestamp = sf_config["CURRENT_TIMESTAMP"]
+        catalog_cache = CatalogCache(session)
 
         # Get the list of fold patterns
         sf_staged_files = session\
-            .table("RAVEN.VW_METADATA_STAGE_ME_PARAMETERS_COB") \
+            .table("RAVEN.METADATA_STAGE_ME_PARAMETERS_COB") \
             .filter(col("RAVEN_COBID").between(cobid_start, cobid_end)) \
             .filter(f"STAGE_NAME LIKE '%{stage}%'") \
             .select("RAVEN_COBID","STAGE_NAME","FOLDER_PATH_COB","FILE_EXTENSION") \
-            .sort(col("RAVEN_COBID").desc()) \
-            .distinct()
-
-        # Get the external/internal file list
-        count_storage_pattern = 0
-        for row in sf_staged_files.collect():
-            cobid = row["RAVEN_COBID"]
-            stage_name = row["STAGE_NAME"]
+            .distinct() \
+            .collect()
+
+        # Patterns by stage
+        stage_patterns = {}
+        for row in sf_staged_files:
             folder_path_cob = row["FOLDER_PATH_COB"]
-            file_extension = row["FILE_EXTENSION"]
             folder = (folder_path_cob[1:] if folder_path_cob.startswith('/') else folder_path_cob)
-            pattern = folder + ".*." +file_extension
-
-            # Get STAGE URL
-            stage_desc = session.sql("DESC STAGE " + stage_name) \
-                .filter(col('"property"') == "URL") \
-                .select('"property_value"') \
-                .collect()[0][0]
-            stage_url = stage_desc.translate({ord(i): None for i in '[]"'})
-
-            # List file in stage
-            blob_list = list_blob(session,stage_name,pattern)
-            file_list =  [r.as_dict() for r in blob_list]
-
-            insert_list = {
-                    "RAVEN_COBID" : cobid,
-                    "STAGE_NAME" : stage_name,
-                    "STAGE_URL" : stage_url,
-                    "FOLDER_PATH_COB" : folder,
-                    "FILE_EXTENSION" : file_extension,
-                    "FILE_LIST" : file_list,
-                    "PROCESS_TIMESTAMP" : start_timestamp,
-                    "FLAG_LAST_VERSION" : True
-                }
-            merge_log(session,insert_list)
-            count_storage_pattern +=1
-        
-        return f"{count_storage_pattern} storage pattern folders were listed"
-        
+            stage_patterns.setdefault(row["STAGE_NAME"], []).append({
+                "RAVEN_COBID": row["RAVEN_COBID"],
+                "FOLDER": folder,
+                "FILE_EXTENSION": row["FILE_EXTENSION"],
+                "REGEX": re.compile(folder + ".*." + row["FILE_EXTENSION"])})
+
+        listed_files = {}
+        listed_patterns = set()
+        stage_stats = {}
+        for stage_name, patterns in stage_patterns.items():
+            # Get STAGE URL (SHOW STAGES once per schema instead of DESC STAGE per row)
+            stage_url = catalog_cache.stage_url(stage_name)
+            stats = {"list_commands": 0, "files_listed": 0, "files_matched": 0, "listing_seconds": 0.0, "listing_bytes": 0}
+            listed_patterns.update([(stage_name, p["RAVEN_COBID"], p["FOLDER"], p["FILE_EXTENSION"]) for p in patterns])
+
+            # List each folder prefix once and bucket the files to the patterns of the prefix
+            for prefix in list_prefixes([p["FOLDER"] for p in patterns]):
+                prefix_patterns = [p for p in patterns if p["FOLDER"].startswith(prefix)]
+
+                list_start = time.time()
+                file_list = [r.as_dict() for r in session.sql(f"LIST @{stage_name}/{prefix}").collect()]
+                stats["listing_seconds"] += time.time() - list_start
+                stats["list_commands"] += 1
+                stats["files_listed"] += len(file_list)
+                stats["listing_bytes"] += len(json.dumps(file_list, default=str))
+
+                for file in file_list:
+                    path = relative_path(file["name"], stage_url)
+                    # A file matching several patterns is saved with the first one (one row per file)
+                    p = next((p for p in prefix_patterns if p["REGEX"].fullmatch(path)), None)
+                    if p is None or (stage_name, path) in listed_files:
+                        continue
+                    listed_files[(stage_name, path)] = {
+                        "STAGE_NAME": stage_name,
+                        "FILE_PATH": path,
+                        "FILE_NAME": path.split("/")[-1],
+                        "FILE_URL": file["name"],
+                        "STAGE_URL": stage_url,
+                        "RAVEN_COBID": p["RAVEN_COBID"],
+                        "FOLDER_PATTERN": p["FOLDER"],
+                        "FILE_EXTENSION": p["FILE_EXTENSION"],
+                        "FILE_MD5": file["md5"],
+                        "FILE_SIZE": file["size"],
+                        "LAST_MODIFIED": parse_last_modified(file["last_modified"])}
+                    stats["files_matched"] += 1
+
+            stats["listing_seconds"] = round(stats["listing_seconds"], 3)
+            stage_stats[stage_name] = stats
+
+        # Merge only the differences with the saved files
+        saved_files = get_saved_files(session,list(stage_patterns.keys()),cobid_start,cobid_end,start_timestamp)
+        changes = file_changes(listed_files,saved_files,listed_patterns)
+        save_changes(session,changes,start_timestamp)
+
+        for stage_name, stats in stage_stats.items():
+            stats["files_merged"] = {change_type: len([c for c in changes if c["STAGE_NAME"] == stage_name and c["CHANGE_TYPE"] == change_type])
+                                     for change_type in ["NEW", "CHANGED", "SEEN", "DELETED"]}
+
+        return json.dumps({"storage_patterns": len(listed_patterns), "stages": stage_stats, "catalog_cache": catalog_cache.stats()})
+
     except SnowparkSQLException as e:
         raise e.message
     except:
@@ -23,6 +23,8 @@ RETURNS VARCHAR(16777216)
 LANGUAGE PYTHON
 RUNTIME_VERSION = '3.8'
 PACKAGES = ('snowflake-snowpark-python')
+IMPORTS = ('@RAVEN.INTSTAGE_RAVEN_FILES/models/shared/catalog_cache.py','@RAVEN.INTSTAGE_RAVEN_FILES/models/shared/stage_me_log.py','@RAVEN.INTSTAGE_RAVEN_FILES/models/shared/header_probe.py',
+           '@RAVEN.INTSTAGE_RAVEN_FILES/models/shared/copy_cob.py')
 HANDLER = 'run'
 EXECUTE AS caller
 AS
@@ -32,9 +34,18 @@ import json
 import random
 import sys
 import re
+import time
 from collections import Counter
-from snowflake.snowpark.functions import col, sql_expr, parse_json, concat_ws, lit, when_matched, when_not_matched
+from snowflake.snowpark.functions import col, sql_expr, parse_json, concat_ws, lit, current_timestamp
 from snowflake.snowpark.types import *
+from catalog_cache import CatalogCache
+from stage_me_log import log_keys
+from header_probe import HeaderMappingCache, decode_query_header, header_hash, probe_header, stage_file_path, strip_bom
+from copy_cob import COB_PLACEHOLDER, FIND_COB_EXPRESSION, cob_expression
+
+# Maximum number of datasets loaded at the same time (asynchronous queries) and wait between status checks
+MAX_CONCURRENT_LOADS = 4
+POLL_INTERVAL_SECONDS = 0.5
 
 def list_blob(session,stage_name,pattern):
     """
@@ -63,61 +74,26 @@ def is_cob(value):
     """
     return value if not str.isdigit(value) else ".*"
 
-def get_warehouse_name(session,size,database_name):
-    """
-    Base on the size and database name, finds the warehouse name
-
-    return Warehouse Name
-
-    session: session connection
-    size: Value configured in the metadata STAGE_ME_PARAMETERS. If empty, the default value it is XS
-    database_name: database destination for the file
-    """
-    # Get first and second part of the database name
-    arr_db_name = database_name.split("_")
-    wh_like = arr_db_name[0] + "%" + arr_db_name[1]
-
-    # Show warehouses that matches with database name
-    cmd_list_wh = f"SHOW WAREHOUSES LIKE '%{wh_like}_%'"
-    sf_show_wh = session.sql(cmd_list_wh)
-
-    # Filter by size from metadata value
-    size = size if size else 'X-Small'
-    sf_list_wh = sf_show_wh.filter(col('"size"') == size)
-
-    # If does not retunr anything, use current connect WH
-    if len(sf_list_wh.collect()) == 0:
-        sf_list_wh = sf_show_wh.filter(col('"is_current"') == 'Y')
-
-    wh_name = sf_list_wh.select(col('"name"')).collect()[0][0]
-
-    return wh_name
-
-def create_table(session,db_target,table_name,list_column_name_target,list_create_column_name_target):
+def create_table(session,catalog_cache,table_name,list_column_name_target,list_create_column_name_target,cluster_by_cobid=False):
     """
     Base on the size and database name, finds the warehouse name
 
     return Message from the command Create or Alter table
 
     session: session connection
-    db_target: database destination for the file
+    catalog_cache: CatalogCache of the call, the columns of the database target are fetched once
     table_name: Name of the table configured in SOURCE_FILE. If the schema desti
     list_column_name_target: List of column names
     list_create_column_name_target: List of column names with data type
+    cluster_by_cobid: If True, the new table is clustered by RAVEN_COBID
     """
 
     # Get the column names if the table exists
-    cmd_table_check = f""" SELECT listagg('"'||UPPER(COLUMN_NAME)||'"', ',') within group (order by ORDINAL_POSITION ASC) LIST_COLUMN_NAME
-                             FROM {db_target}.INFORMATION_SCHEMA."COLUMNS"
-                            WHERE UPPER(CONCAT_WS('.',TABLE_CATALOG,TABLE_SCHEMA,TABLE_NAME)) = UPPER('{table_name}')
-                         GROUP BY TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME
-                        """
-    table_check = session.sql(cmd_table_check).collect()
+    list_column_name_original = catalog_cache.table_columns(table_name)
 
     return_msg = ""
     # If there is a return from INFORMATION_SCHEMA, goes to the next step to check if it is necessary altering the table
-    if len(table_check) > 0:
-        list_column_name_original = (table_check[0]["LIST_COLUMN_NAME"]).split(",")
+    if len(list_column_name_original) > 0:
         # Check for new columns
         new_columns = [item.upper() for item in list_column_name_target if item not in list_column_name_original]
 
@@ -140,42 +116,149 @@ def create_table(session,db_target,table_name,list_column_name_target,list_creat
                             RAVEN_FILE_ROW_NUMBER INT, 
                             RAVEN_STAGE_TIMESTAMP TIMESTAMP, 
                             RAVEN_DATASET_NAME VARCHAR(500) )"""
+        if cluster_by_cobid:
+            cmd_create_table += " CLUSTER BY (RAVEN_COBID)"
 
         sf_table_create = session.sql(cmd_create_table).collect()[0]
         return_msg = sf_table_create.as_dict()
+        catalog_cache.invalidate("COLUMNS")
         
     return return_msg
 
-def merge_log(session,insert_log):
+def run_loads(session,loads,max_concurrent):
     """
-    Insert or Update log table RAVEN.LOG_STAGE_ME_STATUS
+    Runs the load steps of the datasets as asynchronous queries (collect_nowait), at most max_concurrent datasets at the same time.
+    The steps of one dataset run in order (DELETE before COPY): the next step is submitted when the previous one is done.
 
     session: session connection
+    loads (List): One dictionary per dataset with WAREHOUSE_NAME and STEPS (list of (step name, SQL command)).
+                  The rows returned by each step are saved in RESULTS (step name as key) and a failure in EXCEPTION
+    max_concurrent: Maximum number of datasets running at the same time
+    """
+    def submit_next_step(load):
+        step_name, cmd = load["STEPS"].pop(0)
+        # The query runs in the warehouse of the session when it is submitted
+        if load["WAREHOUSE_NAME"]:
+            session.sql(f"USE WAREHOUSE {load['WAREHOUSE_NAME']}").collect()
+        load["JOB"] = (step_name, session.sql(cmd).collect_nowait())
+
+    pending = [load for load in loads if load["STEPS"]]
+    running = []
+    while pending or running:
+        # Start datasets up to the concurrency limit
+        while pending and len(running) < max_concurrent:
+            load = pending.pop(0)
+            try:
+                submit_next_step(load)
+                running.append(load)
+            except Exception as e:
+                load["EXCEPTION"] = e
+
+        # Only one dataset left: wait for its result, no need to check the status
+        done = running if len(running) == 1 and not pending else [load for load in running if load["JOB"][1].is_done()]
+        if not done:
+            time.sleep(POLL_INTERVAL_SECONDS)
+            continue
+
+        for load in list(done):
+            step_name, job = load["JOB"]
+            try:
+                load["RESULTS"][step_name] = [r.as_dict() for r in job.result()]
+                if load["STEPS"]:
+                    submit_next_step(load)
+                    continue
+            except Exception as e:
+                load["EXCEPTION"] = e
+            running.remove(load)
+
+def replace_cob_slice(session,cmd_delete,target_table,shadow_table):
+    """
+    Load strategy COB_REPLACE: the files were copied into a transient shadow table, the COB slice of the target table
+    is replaced (DELETE + INSERT) in one transaction, so readers never see the COB without rows
+
+    return DELETE result and INSERT result
+
+    session: session connection
+    cmd_delete: DELETE command of the COB slice in the target table
+    target_table: Staging table
+    shadow_table: Table with the rows copied from the files
+    """
+    session.sql("BEGIN TRANSACTION").collect()
+    try:
+        delete_result = [r.as_dict() for r in session.sql(cmd_delete).collect()]
+        insert_result = [r.as_dict() for r in session.sql(f"INSERT INTO {target_table} SELECT * FROM {shadow_table}").collect()]
+        session.sql("COMMIT").collect()
+    except:
+        session.sql("ROLLBACK").collect()
+        raise
+
+    return delete_result, insert_result
+
+def append_log(log_events,insert_log):
+    """
+    Buffers a status event of the log. The events are written by flush_log in RAVEN.LOG_STAGE_ME_STATUS_EVENT
+    and the latest event of each ID is merged in RAVEN.LOG_STAGE_ME_STATUS by TASK_MERGE_LOG_STAGE_ME_STATUS
+
+    log_events (List): Buffer of events of the call
     insert_log (Dictionary): Detail about the COPY process 
     """
-    target = session.table("RAVEN.LOG_STAGE_ME_STATUS")
-    source = session.create_dataframe([insert_log])
-
-    target.merge(source, target["ID"] == source["ID"],
-        [when_matched().update({
-            "DATASET_NAME" : source["DATASET_NAME"],
-            "PROCESS_PARAMETERS" : source["PROCESS_PARAMETERS"],
-            "PROCESS_RESULT" : source["PROCESS_RESULT"],
-            "PROCESS_STATUS" : source["PROCESS_STATUS"],
-            "START_TIMESTAMP" : source["START_TIMESTAMP"],
-            "END_TIMESTAMP" : source["END_TIMESTAMP"],
-            "BLOB_FILE" : source["BLOB_FILE"]}), 
-        when_not_matched().insert({
-            "ID" : source["ID"],
-            "RAVEN_COBID" : source["RAVEN_COBID"],
-            "DATASET_NAME" : source["DATASET_NAME"],
-            "PROCESS_PARAMETERS" : source["PROCESS_PARAMETERS"],
-            "PROCESS_RESULT" : source["PROCESS_RESULT"],
-            "PROCESS_STATUS" : source["PROCESS_STATUS"],
-            "START_TIMESTAMP" : source["START_TIMESTAMP"],
-            "END_TIMESTAMP" : source["END_TIMESTAMP"],
-            "BLOB_FILE" : source["BLOB_FILE"]})
-        ])
+    log_events.append({
+        "ID" : insert_log["ID"],
+        "RAVEN_COBID" : int(insert_log["RAVEN_COBID"]),
+        "DATASET_NAME" : insert_log["DATASET_NAME"],
+        "PROCESS_PARAMETERS" : json.dumps(insert_log["PROCESS_PARAMETERS"], default=str),
+        "PROCESS_RESULT" : json.dumps(insert_log["PROCESS_RESULT"], default=str),
+        "PROCESS_STATUS" : insert_log["PROCESS_STATUS"],
+        "START_TIMESTAMP" : insert_log["START_TIMESTAMP"],
+        "END_TIMESTAMP" : insert_log["END_TIMESTAMP"],
+        "BLOB_FILE" : json.dumps(insert_log["BLOB_FILE"], default=str),
+        "EVENT_SEQUENCE" : len(log_events),
+        **log_keys(insert_log["PROCESS_PARAMETERS"], insert_log["PROCESS_STATUS"], insert_log["PROCESS_RESULT"])
+    })
+
+def flush_log(session,log_events):
+    """
+    Inserts the buffered events in the append-only table RAVEN.LOG_STAGE_ME_STATUS_EVENT with one INSERT
+
+    session: session connection
+    log_events (List): Buffer of events of the call. It is cleared after the insert
+    """
+    if not log_events:
+        return
+
+    schema = StructType([
+        StructField("ID", LongType()),
+        StructField("RAVEN_COBID", LongType()),
+        StructField("DATASET_NAME", StringType()),
+        StructField("PROCESS_PARAMETERS", StringType()),
+        StructField("PROCESS_RESULT", StringType()),
+        StructField("PROCESS_STATUS", StringType()),
+        StructField("START_TIMESTAMP", TimestampType()),
+        StructField("END_TIMESTAMP", TimestampType()),
+        StructField("BLOB_FILE", StringType()),
+        StructField("EVENT_SEQUENCE", LongType()),
+        StructField("FILE_KEY", StringType()),
+        StructField("CONTAINER_NAME", StringType()),
+        StructField("FAILURE_REASON", StringType())
+    ])
+    session.create_dataframe([[e[f.name] for f in schema.fields] for e in log_events], schema=schema) \
+        .select(
+            col("ID"),
+            col("RAVEN_COBID"),
+            col("DATASET_NAME"),
+            parse_json(col("PROCESS_PARAMETERS")).alias("PROCESS_PARAMETERS"),
+            parse_json(col("PROCESS_RESULT")).alias("PROCESS_RESULT"),
+            col("PROCESS_STATUS"),
+            col("START_TIMESTAMP"),
+            col("END_TIMESTAMP"),
+            parse_json(col("BLOB_FILE")).alias("BLOB_FILE"),
+            col("EVENT_SEQUENCE"),
+            current_timestamp().alias("EVENT_TIMESTAMP"),
+            col("FILE_KEY"),
+            col("CONTAINER_NAME"),
+            col("FAILURE_REASON")) \
+        .write.mode("append").save_as_table("RAVEN.LOG_STAGE_ME_STATUS_EVENT")
+    log_events.clear()
 
 def csv_mapping_file(list_csv_header,src_file_filed):
     csv_mapping_target_columns = []
@@ -190,8 +273,13 @@ def csv_mapping_file(list_csv_header,src_file_filed):
     datetime_format = src_file_filed["TIMESTAMP_INPUT_FORMAT"]
     date_format = src_file_filed["DATE_INPUT_FORMAT"]
 
+    # Positions of each header field name, built once instead of scanning the header for every metadata field
+    header_positions = {}
+    for index, item in enumerate(list_csv_header):
+        header_positions.setdefault(item.replace('"',"").strip().upper(), []).append(index)
+
     for idx, field in enumerate(list_column_name_source): # loop for all fields listed in the metadata
-        col_pos =[index for (index, item) in enumerate(list_csv_header) if item.replace('"',"").strip().upper() == field.strip().upper()] # Find the field position on the header
+        col_pos = header_positions.get(field.strip().upper(), []) # Find the field position on the header
         
         if len(col_pos) == 1: # Can only find one field that matches: source metadata field name == header field name
             col_pos = col_pos[0]
@@ -220,18 +308,6 @@ def generate_log_id(start_timestamp,cobid,file_name,folder_path):
     log_id = hash( (start_timestamp,cobid,file_name,folder_path,random_num) )
     return log_id
 
-def remove_bom_char(text_value):
-    """
-    Remove any BOM character from a string
-    It works for: UTF-8[a], UTF-16 (BE), UTF-16 (LE)
-
-    return Strging without BOM characters
-
-    text_value: String with that contains BOM characters
-    """
-    return text_value.replace("ï»¿","").replace("þÿ","").replace("ÿþ","")
-
-
 def run(session, file_name, folder_path, container, event_trigger, flag_create_table, flag_create_pipe, flag_create_csv_mapping, database_target):
     # Main function
     """ 
@@ -248,6 +324,10 @@ def run(session, file_name, folder_path, container, event_trigger, flag_create_t
     """
     process_parameters = {}
     insert_log = {}
+    log_events = []
+    loads = []
+    catalog_cache = CatalogCache(session)
+    header_cache = HeaderMappingCache(session)
     process_result = {}
     log_id = -1
     return_result = {}
@@ -301,15 +381,19 @@ def run(session, file_name, folder_path, container, event_trigger, flag_create_t
         ###################################################### END: Prepare and Validate basic values ######################################################
 
         
-        # Check if the file has metadata
-        sf_smp_cob = session.table("RAVEN.VW_METADATA_STAGE_ME_PARAMETERS_COB")
-        sf_smp_cob = sf_smp_cob \
-            .filter(f"""IS_ENABLED = TRUE 
-                    AND RAVEN_COBID = {cobid}
-                    AND UPPER('{file_name}') LIKE ARRAY_TO_STRING(SPLIT(UPPER(FILE_NAME_COB),'*'),'%')
-                    AND UPPER('/{source_folder}/') LIKE UPPER(FOLDER_PATH_COB||'%')
-                    AND IFNULL(NULLIF(CONTAINER_NAME,''), 'NO CONTAINER') = IFNULL(NULLIF('{container_name}',''),'NO CONTAINER')
-                    """).collect()
+        # Check if the file has metadata (file resolution index)
+        file_list = json.dumps([{"CONTAINER_NAME": container_name, "FILE_PATH": full_file_path}]).replace("'", "''")
+        sf_resolved = session.sql(f"""SELECT DISTINCT DATASET_NAME 
+                                       FROM TABLE(RAVEN.FN_RESOLVE_FILE_DATASETS(PARSE_JSON('{file_list}')::ARRAY)) 
+                                      WHERE DATASET_NAME IS NOT NULL""").collect()
+        resolved_datasets = [r["DATASET_NAME"] for r in sf_resolved]
+
+        sf_smp_cob = []
+        if resolved_datasets:
+            sf_smp_cob = session.table("RAVEN.VW_METADATA_STAGE_ME_PARAMETERS_COB") \
+                .filter(col("RAVEN_COBID") == cobid) \
+                .filter(col("DATASET_NAME").isin(resolved_datasets)) \
+                .collect()
 
         len_sf_smp_cob = len(sf_smp_cob)
 
@@ -329,14 +413,17 @@ def run(session, file_name, folder_path, container, event_trigger, flag_create_t
             msg_error_metadata = f"There is no metadata for the folder/file: {source_folder}/{file_name}"
             raise Exception(msg_error_metadata)
         
+        # Prepare the commands of each dataset, the DELETE/COPY run at the same time after the loop
         for sf_smp in sf_smp_cob:
         
             log_id = generate_log_id(start_timestamp,cobid,file_name,folder_path)
+            process_result = {"session_id": session_id}
 
             is_trigger_file = bool(sf_smp["IS_TRIGGER_FILE"])                   # If FALSE, read the file triggered direct, else read all files in the folder
             dataset_name = sf_smp["DATASET_NAME"]                               # RAVEN.METADATA_STAGE_ME_PARAMETERS Primary Key. It defines a unique file in data lake       
             file_name_pipe = sf_smp["SOURCE_FILE_NAME_PATTERN"]                 # File name pattern
             staging_scope_fields = json.loads(sf_smp["STAGING_SCOPE_FIELDS"])   # DEPARTMENT_CODE, ENTITY_CODE, MARKET, REGION
+            load_strategy = sf_smp["LOAD_STRATEGY"] or "DELETE_INSERT"          # DELETE_INSERT or COB_REPLACE
             
             # Insert Log
             insert_log = {
@@ -350,7 +437,7 @@ def run(session, file_name, folder_path, container, event_trigger, flag_create_t
                 "END_TIMESTAMP" : None,
                 "BLOB_FILE" : None
             }
-            merge_log(session,insert_log)
+            append_log(log_events,insert_log)
 
             # Table destination setup
             src_file_filed = json.loads(sf_smp["SOURCE_FILE_AND_FIELD"])
@@ -372,14 +459,9 @@ def run(session, file_name, folder_path, container, event_trigger, flag_create_t
             pattern_file = f"{source_folder}/{pattern_file_name}"
 
 
-            # Get file format information
-            sf_file_format_check = session.table("INFORMATION_SCHEMA.FILE_FORMATS")\
-                .filter(col("FILE_FORMAT_NAME") == file_format)\
-                .filter(col("FILE_FORMAT_SCHEMA") == "RAVEN")\
-                .collect()
-            if sf_file_format_check:
-                sf_file_format = sf_file_format_check[0]
-            else:
+            # Get file format information (all RAVEN file formats are fetched once per call)
+            sf_file_format = catalog_cache.file_format(file_format)
+            if not sf_file_format:
                 raise Exception(f"File Format not found: {file_format}")
 
             file_format_type = sf_file_format["FILE_FORMAT_TYPE"]
@@ -390,21 +472,42 @@ def run(session, file_name, folder_path, container, event_trigger, flag_create_t
             mapping_target_columns = []
             mapping_source_seq = []
             
+            blob_list = None
             if flag_create_csv_mapping == True and skip_header == 1 : # Create CSV mapping based on file header and metadata
-                # Select header
-                cmd_select_header = f"SELECT $1 AS HEADER FROM @{stage_name} (FILE_FORMAT => 'RAVEN.TEXT_FORMAT_NO_HEADER', pattern => '.*{pattern_file}') LIMIT 1"
-                header_return = session.sql(cmd_select_header).collect()
+                # Read the header from the first bytes of one file of the pattern. The query on the stage is the fallback
+                blob_list = list_blob(session,stage_name,pattern_file)
+                header = None
+                if blob_list:
+                    try:
+                        header = probe_header(stage_file_path(stage_name, blob_list[0]["name"], catalog_cache.stage_url(stage_name)))
+                        process_result["header_probe"] = "STREAM"
+                    except Exception as e:
+                        process_result["header_probe_exception"] = str(e)
+                if header is None:
+                    cmd_select_header = f"SELECT $1 AS HEADER FROM @{stage_name} (FILE_FORMAT => 'RAVEN.TEXT_FORMAT_NO_HEADER', pattern => '.*{pattern_file}') LIMIT 1"
+                    header_return = session.sql(cmd_select_header).collect()
+                    header = decode_query_header(header_return[0]["HEADER"]) if header_return else None
+                    process_result["header_probe"] = "QUERY"
 
                 # Find the field position and convert in date, time and other types
-                if header_return:
-                    header = header_return[0]["HEADER"]
-                    csv_header = remove_bom_char(header)
+                if header is not None:
+                    csv_header = strip_bom(header)
                     list_csv_header = csv_header.split(file_delimiter)
                     list_csv_header = [x.strip() for x in list_csv_header]
                     process_result["csv_header"] = csv_header
 
                     if list_column_name_target: # Check if there is field metadata
-                        mapping_source_columns, mapping_target_columns, mapping_source_seq = csv_mapping_file(list_csv_header,src_file_filed)
+                        # A header already seen with the same metadata version reuses its mapping
+                        metadata_version = sf_smp["METADATA_VERSION"]
+                        csv_header_hash = header_hash(csv_header, file_delimiter)
+                        mapping = header_cache.get(dataset_name, csv_header_hash, metadata_version) if metadata_version else None
+                        process_result["csv_mapping_cache"] = "HIT" if mapping else "MISS"
+                        if not mapping:
+                            mapping_source_columns, mapping_target_columns, mapping_source_seq = csv_mapping_file(list_csv_header,src_file_filed)
+                            mapping = {"source_columns": mapping_source_columns, "target_columns": mapping_target_columns, "source_seq": mapping_source_seq}
+                            if metadata_version:
+                                header_cache.put(dataset_name, csv_header_hash, metadata_version, csv_header, mapping)
+                        mapping_source_columns, mapping_target_columns, mapping_source_seq = mapping["source_columns"], mapping["target_columns"], mapping["source_seq"]
                     
                     else:
                         mapping_source_seq = ['$'+str(index+1) for (index,item) in enumerate(list_csv_header)]
@@ -423,7 +526,7 @@ def run(session, file_name, folder_path, container, event_trigger, flag_create_t
             
              # Create staging table
             if bool(flag_create_table): 
-                create_table_result = create_table(session,db_target,target_table,list_column_name_target,list_create_column_name_target)
+                create_table_result = create_table(session,catalog_cache,target_table,list_column_name_target,list_create_column_name_target,bool(sf_smp["CLUSTER_BY_COBID"]))
                 process_result["create_table_result"] = create_table_result
 
             # Remove COB from path, If Snowpipe
@@ -453,7 +556,7 @@ def run(session, file_name, folder_path, container, event_trigger, flag_create_t
 
             # Raven metadata fields
             target_columns_raven = "RAVEN_COBID,RAVEN_STAGE_SCOPE_FIELDS,RAVEN_FILENAME,RAVEN_FILE_ROW_NUMBER,RAVEN_STAGE_TIMESTAMP,RAVEN_DATASET_NAME"
-            source_columns_raven = f"RAVEN.FN_FIND_COB(metadata$filename) AS RAVEN_COBID,{staging_scope_fields}::OBJECT AS RAVEN_STAGE_SCOPE_FIELDS,metadata$filename AS RAVEN_FILENAME,metadata$file_row_number AS RAVEN_FILE_ROW_NUMBER,current_timestamp AS RAVEN_STAGE_TIMESTAMP,'{dataset_name}' AS RAVEN_DATASET_NAME"
+            source_columns_raven = f"{COB_PLACEHOLDER} AS RAVEN_COBID,{staging_scope_fields}::OBJECT AS RAVEN_STAGE_SCOPE_FIELDS,metadata$filename AS RAVEN_FILENAME,metadata$file_row_number AS RAVEN_FILE_ROW_NUMBER,current_timestamp AS RAVEN_STAGE_TIMESTAMP,'{dataset_name}' AS RAVEN_DATASET_NAME"
 
             # Join fields for target and sources
             target_columns = ",".join( filter(None,[target_columns_file, target_columns_raven, target_columns_expression]) )
@@ -471,30 +574,52 @@ def run(session, file_name, folder_path, container, event_trigger, flag_create_t
             
             # Create COPY command that can be used for Snowpipe and direct copy
             cmd_copy = f" COPY INTO {target_table} ({target_columns}) FROM ({cmd_select}) {on_error}"
+
+            # Fields from metadata: use the COPY compiled by RAVEN.COMPILE_LOAD_PLANS
+            copy_template = sf_smp["COPY_TEMPLATE"]
+            if not (flag_create_csv_mapping == True and skip_header == 1) and copy_template:
+                cmd_copy = copy_template \
+                    .replace("|:DATABASE_TARGET:|", db_target) \
+                    .replace("|:PATTERN_FILE:|", pattern_file) \
+                    .replace("|:STAGING_SCOPE_FIELDS:|", str(staging_scope_fields))
+            process_result["metadata_version"] = sf_smp["METADATA_VERSION"]
             
             # Set RAVEN schema
             session.sql("USE SCHEMA RAVEN").collect()
 
+            load = {"LOG_ID": log_id, "INSERT_LOG": insert_log, "PROCESS_RESULT": process_result, "TARGET_TABLE": target_table,
+                    "WAREHOUSE_NAME": None, "SHADOW_TABLE": None, "STEPS": [], "RESULTS": {}}
+
             if bool(flag_create_pipe) : # Create PIPE
+                # The files of a pipe are not known, the COB is found for each row
+                cmd_copy = cmd_copy.replace(COB_PLACEHOLDER, FIND_COB_EXPRESSION)
                 cmd = f"CREATE PIPE IF NOT EXISTS {dataset_name} AUTO_INGEST = TRUE INTEGRATION = '{env_database}_SNOWPIPE_RAPTOR' AS {cmd_copy}"
+                load["STEPS"] = [("copy", cmd)]
                 
                 ##~ Log Information ~##
                 process_result["cmd_pipe"] = cmd
 
             else: # Run COPY INTO command
                 # Get file details: last_modified, md5, name, size
-                blob_list = list_blob(session,stage_name,pattern_file)
+                blob_list = blob_list if blob_list is not None else list_blob(session,stage_name,pattern_file)
                 file_list =  [r.as_dict() for r in blob_list]
                 blob_file = {"FILE_LIST": file_list, "FILE_COUNT":len(file_list)}
                 insert_log["BLOB_FILE"] = blob_file
 
+                # COB of the listed files as a literal or a lookup on metadata$filename, instead of RAVEN.FN_FIND_COB on every row
+                stage_url = catalog_cache.stage_url(stage_name)
+                file_paths = [stage_file_path(stage_name, f["name"], stage_url).split("/", 1)[1] for f in file_list]
+                raven_cobid = cob_expression(file_paths, pattern_file)
+                cmd_copy = cmd_copy.replace(COB_PLACEHOLDER, raven_cobid)
+                process_result["raven_cobid_expression"] = "LITERAL" if raven_cobid.isdigit() else "LOOKUP" if raven_cobid.startswith("CASE") else "FN_FIND_COB"
+
                 # Copy command with FORCE = TRUE to allow load same file (re-run)
                 cmd = cmd_copy + " FORCE = TRUE " if bool(sf_smp["ALLOW_RELOAD"]) else ""
 
-                # Set Warehouse
+                # Warehouse used by the DELETE/COPY of the dataset
                 warehouse_size = sf_smp["WAREHOUSE_SIZE"]
-                warehouse_name = get_warehouse_name(session,warehouse_size,current_database)
-                session.sql(f"USE WAREHOUSE {warehouse_name}").collect()
+                warehouse_name = catalog_cache.warehouse_name(current_database,warehouse_size)
+                load["WAREHOUSE_NAME"] = warehouse_name
 
                 process_result["warehouse_size"] = warehouse_size
                 process_result["warehouse_name"] = warehouse_name
@@ -504,46 +629,91 @@ def run(session, file_name, folder_path, container, event_trigger, flag_create_t
 
                 delete_option = f"replace(RAVEN_FILENAME,'/','') = '{raven_file}'" if flag_delete_by_file_name else f"RAVEN_DATASET_NAME = '{dataset_name}'"
 
-                check_delete_result = session.table(target_table) \
-                    .filter(f"RAVEN_COBID = {cobid}") \
-                    .filter(delete_option) \
-                    .count()
-                
                 cmd_delete = f" DELETE FROM {target_table} WHERE RAVEN_COBID = {cobid} AND {delete_option}"
 
-                if check_delete_result > 0:
-                    delete_result = session.sql(cmd_delete).collect()   
-                    msg_delete_result = delete_result[0].as_dict()
+                if load_strategy == "COB_REPLACE": # COPY into a shadow table, the COB slice is replaced after the COPY (replace_cob_slice)
+                    shadow_table = f"{target_table}_SHADOW_{abs(log_id)}"
+                    load["SHADOW_TABLE"] = shadow_table
+                    load["CMD_DELETE"] = cmd_delete
+                    load["STEPS"] = [("create_shadow", f"CREATE TRANSIENT TABLE IF NOT EXISTS {shadow_table} LIKE {target_table}"),
+                                     ("copy", cmd.replace(f"COPY INTO {target_table} ", f"COPY INTO {shadow_table} ", 1))]
                 else:
-                    msg_delete_result = "{'number of rows deleted': 0}"
+                    load["STEPS"] = [("delete", cmd_delete), ("copy", cmd)]
 
                 ##~ Log Information ~##
+                process_result["load_strategy"] = load_strategy
                 process_result["cmd_delete"] = cmd_delete
                 process_result["cmd_copy"] = cmd
-                process_result["msg_delete_result"] = msg_delete_result
-                
-            # Execute copy command
-            copy_result = session.sql(cmd).collect()
-            msg_copy_result = [r.as_dict() for r in copy_result]
 
+            loads.append(load)
+
+        # Save the new header mappings and the cache hits before the loads
+        header_cache.flush()
+
+        # The RUNNING events are written before the loads, so RAVEN.VW_LOG_UNSTAGED_FILES excludes the loads in progress
+        flush_log(session,log_events)
+
+        # Execute the DELETE/COPY commands of all datasets
+        run_loads(session,loads,MAX_CONCURRENT_LOADS)
+
+        for load in loads:
+            if load["SHADOW_TABLE"]:
+                try:
+                    if "EXCEPTION" not in load:
+                        load["RESULTS"]["delete"], load["RESULTS"]["insert"] = replace_cob_slice(session,load["CMD_DELETE"],load["TARGET_TABLE"],load["SHADOW_TABLE"])
+                except Exception as e:
+                    load["EXCEPTION"] = e
+                finally:
+                    session.sql(f"DROP TABLE IF EXISTS {load['SHADOW_TABLE']}").collect()
+
+        end_timestamp = session.sql("SELECT sysdate() AS CURRENT_TIMESTAMP").collect()[0][0]
+        for load in loads:
+            insert_log = load["INSERT_LOG"]
+            process_result = load["PROCESS_RESULT"]
+            
             ##~ Log Information ~##
-            process_result["msg_copy_result"] = msg_copy_result
+            if "delete" in load["RESULTS"]:
+                process_result["msg_delete_result"] = load["RESULTS"]["delete"][0]
+            if "insert" in load["RESULTS"]:
+                process_result["msg_insert_result"] = load["RESULTS"]["insert"][0]
+            process_result["msg_copy_result"] = load["RESULTS"].get("copy", [])
+            process_result["catalog_cache"] = catalog_cache.stats()
+            process_result["header_mapping_cache"] = header_cache.stats()
+            process_result["is_error"] = "EXCEPTION" in load
+            if "EXCEPTION" in load:
+                process_result["exception"] = str(load["EXCEPTION"])
             insert_log["PROCESS_RESULT"] = process_result
-            insert_log["PROCESS_STATUS"] = "SUCCESS"
-            insert_log["is_error"] = False
-            insert_log["END_TIMESTAMP"] = session.sql("SELECT sysdate() AS CURRENT_TIMESTAMP").collect()[0][0]
+            insert_log["PROCESS_STATUS"] = "FAILED" if "EXCEPTION" in load else "SUCCESS"
+            insert_log["END_TIMESTAMP"] = end_timestamp
         
-            merge_log(session,insert_log)
-            return_result[log_id] = "SUCCESS"
+            append_log(log_events,insert_log)
+            return_result[load["LOG_ID"]] = insert_log["PROCESS_STATUS"]
+
+        flush_log(session,log_events)
+
+        # The logs of the failed datasets are already written
+        failed_loads = [load for load in loads if "EXCEPTION" in load]
+        if failed_loads:
+            insert_log = {}
+            raise Exception("; ".join([f"{load['INSERT_LOG']['DATASET_NAME']}: {load['EXCEPTION']}" for load in failed_loads]))
 
     except:
         exc_type, exc_value, exc_traceback = sys.exc_info()
         process_result["exception"] = str(exc_value)
         process_result["is_error"] = True
+        process_result["catalog_cache"] = catalog_cache.stats()
         insert_log["PROCESS_RESULT"] = process_result
         insert_log["PROCESS_STATUS"] = "FAILED"
         insert_log["END_TIMESTAMP"] = session.sql("SELECT sysdate() AS CURRENT_TIMESTAMP").collect()[0][0]
-        merge_log(session,insert_log)
+        if "ID" in insert_log:
+            append_log(log_events,insert_log)
+        # Datasets prepared before the failure were not executed
+        for load in loads:
+            if load["INSERT_LOG"]["PROCESS_STATUS"] == "RUNNING" and load["INSERT_LOG"] is not insert_log:
+                load["INSERT_LOG"].update({"PROCESS_RESULT": dict(load["PROCESS_RESULT"], exception=f"Not executed: {exc_value}", is_error=True),
+                                           "PROCESS_STATUS": "FAILED", "END_TIMESTAMP": insert_log["END_TIMESTAMP"]})
+                append_log(log_events,load["INSERT_LOG"])
+        flush_log(session,log_events)
         return_result[log_id] = "FAILED"
         raise exc_type(exc_value).with_traceback(exc_traceback)
     return return_result
@@ -0,0 +1,527 @@
+/**
+ * Stages a batch of files with one COPY per dataset and COB.
+ *
+ * @param FILE_LIST - JSON array of files: [{"FILE_NAME": "", "FOLDER_PATH": "", "CONTAINER": ""}, ...]
+ * @param EVENT_TRIGGER - The event that triggered this procedure.
+ * @param FLAG_CREATE_CSV_SELECT - Flag to create CSV select.
+ * @param DATABASE_TARGET - The target database.
+ *
+ * The files are resolved to datasets with RAVEN.FN_RESOLVE_FILE_DATASETS and grouped by (dataset, COB).
+ * Each group runs one LIST, one DELETE and one COPY INTO ... FILES = (...). The RUNNING log records of a group are written with one INSERT
+ * before its COPY, the final log records of the batch with one INSERT at the end.
+ * Datasets with LOAD_STRATEGY = COB_REPLACE COPY into a transient shadow table and replace the COB slice in one transaction.
+ * Files with a dataset that needs the file header (CSV mapping) or reads a trigger folder are staged by one call of RAVEN.PY_STAGE_ME
+ * per file, after the groups: PY_STAGE_ME loads all the datasets of the file, so these files are not in the COPY of the groups.
+ * The outcome of each file and dataset is SUCCESS, FAILED or SKIPPED (listed file not loaded by the COPY, already loaded).
+ * A failure only marks the files of its group (or of its COPY chunk) as FAILED, the rest of the batch continues.
+ */
+CREATE OR REPLACE PROCEDURE RAVEN.PY_STAGE_ME_BATCH(
+    "FILE_LIST" VARCHAR(16777216),
+    "EVENT_TRIGGER" VARCHAR(16777216),
+    "FLAG_CREATE_CSV_SELECT" BOOLEAN,
+    "DATABASE_TARGET" VARCHAR(16777216))
+RETURNS VARIANT
+LANGUAGE PYTHON
+RUNTIME_VERSION = '3.8'
+PACKAGES = ('snowflake-snowpark-python')
+IMPORTS = ('@RAVEN.INTSTAGE_RAVEN_FILES/models/shared/catalog_cache.py','@RAVEN.INTSTAGE_RAVEN_FILES/models/shared/stage_me_log.py',
+           '@RAVEN.INTSTAGE_RAVEN_FILES/models/shared/copy_cob.py')
+HANDLER = 'run'
+EXECUTE AS caller
+AS
+$$
+
+import json
+import random
+import sys
+import re
+from snowflake.snowpark.functions import col, lit, parse_json, current_timestamp
+from snowflake.snowpark.types import StructField, StructType, StringType, LongType, TimestampType
+from catalog_cache import CatalogCache
+from stage_me_log import file_key, log_keys
+from copy_cob import COB_PLACEHOLDER, cob_expression
+
+# Maximum number of files in the COPY option FILES
+COPY_MAX_FILES = 1000
+
+# Status of a file in the COPY result
+COPY_STATUS_SUCCESS = ["LOADED"]
+COPY_STATUS_FAILED = ["LOAD_FAILED", "PARTIALLY_LOADED", "LOAD_SKIPPED"]
+
+def get_container_name(container):
+    """
+    Removes the environment version from the container name, same rule as PY_STAGE_ME.
+    Example: test3-<dataset name>, where "test3" is the version
+    """
+    env_with_version = ["int_","dvlp","test","rlse"]
+    arr_container_name = container.split("-")
+    container_first_part = "int_" if "int" in arr_container_name[0] else arr_container_name[0]
+    return container.replace(f"{arr_container_name[0]}-", "") if container_first_part[:4] in env_with_version else container
+
+def get_cobid(full_file_path):
+    """
+    Get COBID from the folder path or file name, same rule as PY_STAGE_ME
+    """
+    cob_list = [x for x in [int(s) for s in re.split('_|-|/|\.', full_file_path) if s.isdigit()] if x > 19000100]
+    return cob_list[0] if len(cob_list) > 0 else 19000101
+
+def relative_path(file_url, stage_name, stage_url):
+    """
+    Normalized path of a file returned by LIST or COPY, relative to the stage (same value as file_key of the file path)
+
+    file_url: URL of the file for external stages, <stage>/<path> for internal stages
+    stage_url: URL of the stage, empty for internal stages
+    """
+    file_url = str(file_url or "")
+    if stage_url and file_url.startswith(stage_url):
+        file_url = file_url[len(stage_url):]
+    elif "://" not in file_url and file_url.lower().startswith(stage_name.split(".")[-1].lower() + "/"):
+        file_url = file_url.split("/", 1)[1]
+    return file_key(file_url)
+
+def file_outcome(stage_file, chunk, listed_files):
+    """
+    Outcome of a file of a COPY chunk: SUCCESS, FAILED or SKIPPED
+
+    return Status, message and the COPY result rows of the file
+
+    stage_file: Normalized path of the file
+    chunk (Dictionary): Chunk of the group (see stage_group), with the COPY result rows by normalized path
+    listed_files: Normalized paths of the files found by the LIST of the group (blob files of stage_group)
+    """
+    if "EXCEPTION" in chunk:
+        return "FAILED", chunk["EXCEPTION"], []
+    file_copy_result = chunk["COPY_RESULT"].get(stage_file, [])
+    if not file_copy_result:
+        if stage_file not in listed_files:
+            return "FAILED", "File not found in the stage", []
+        return "SKIPPED", "File not loaded by the COPY (already loaded)", []
+    copy_status = [str(r.get("status", "")).upper() for r in file_copy_result]
+    if any(s in COPY_STATUS_FAILED for s in copy_status) or not all(s in COPY_STATUS_SUCCESS for s in copy_status):
+        return "FAILED", copy_status, file_copy_result
+    return "SUCCESS", copy_status, file_copy_result
+
+def generate_log_id(start_timestamp,cobid,file_name,folder_path):
+    """
+    Generages a random ID for the table RAVEN.LOG_STAGE_ME_STATUS
+
+    return a random number
+
+    start_timestamp,cobid,file_name and folder_path are used for the hash code
+    """
+    random_num = random.randint(-1000000000000,1000000000000)
+    return hash( (start_timestamp,cobid,file_name,folder_path,random_num) )
+
+def flush_logs(session,insert_logs):
+    """
+    Inserts log records in the append-only table RAVEN.LOG_STAGE_ME_STATUS_EVENT with one INSERT.
+    The latest event of each ID is merged in RAVEN.LOG_STAGE_ME_STATUS by TASK_MERGE_LOG_STAGE_ME_STATUS
+
+    session: session connection
+    insert_logs (List of Dictionary): Detail about the COPY process of each file
+    """
+    if not insert_logs:
+        return
+
+    schema = StructType([
+        StructField("ID", LongType()),
+        StructField("RAVEN_COBID", LongType()),
+        StructField("DATASET_NAME", StringType()),
+        StructField("PROCESS_PARAMETERS", StringType()),
+        StructField("PROCESS_RESULT", StringType()),
+        StructField("PROCESS_STATUS", StringType()),
+        StructField("START_TIMESTAMP", TimestampType()),
+        StructField("END_TIMESTAMP", TimestampType()),
+        StructField("BLOB_FILE", StringType()),
+        StructField("EVENT_SEQUENCE", LongType()),
+        StructField("FILE_KEY", StringType()),
+        StructField("CONTAINER_NAME", StringType()),
+        StructField("FAILURE_REASON", StringType())
+    ])
+    rows = [[
+        log["ID"],
+        int(log["RAVEN_COBID"]),
+        log["DATASET_NAME"],
+        json.dumps(log["PROCESS_PARAMETERS"], default=str),
+        json.dumps(log["PROCESS_RESULT"], default=str),
+        log["PROCESS_STATUS"],
+        log["START_TIMESTAMP"],
+        log["END_TIMESTAMP"],
+        json.dumps(log["BLOB_FILE"], default=str),
+        idx
+        ] + list(log_keys(log["PROCESS_PARAMETERS"], log["PROCESS_STATUS"], log["PROCESS_RESULT"]).values())
+        for idx, log in enumerate(insert_logs)]
+
+    session.create_dataframe(rows, schema=schema) \
+        .select(
+            col("ID"),
+            col("RAVEN_COBID"),
+            col("DATASET_NAME"),
+            parse_json(col("PROCESS_PARAMETERS")).alias("PROCESS_PARAMETERS"),
+            parse_json(col("PROCESS_RESULT")).alias("PROCESS_RESULT"),
+            col("PROCESS_STATUS"),
+            col("START_TIMESTAMP"),
+            col("END_TIMESTAMP"),
+            parse_json(col("BLOB_FILE")).alias("BLOB_FILE"),
+            col("EVENT_SEQUENCE"),
+            current_timestamp().alias("EVENT_TIMESTAMP"),
+            col("FILE_KEY"),
+            col("CONTAINER_NAME"),
+            col("FAILURE_REASON")) \
+        .write.mode("append").save_as_table("RAVEN.LOG_STAGE_ME_STATUS_EVENT")
+
+def single_file_results(session, single_files, call_errors, session_id, call_timestamp):
+    """
+    Outcome of the files staged by RAVEN.PY_STAGE_ME: the latest status event of each dataset it logged for the file
+    in this session since call_timestamp
+
+    return List with the result of each file and dataset
+
+    single_files (List): Files staged by RAVEN.PY_STAGE_ME
+    call_errors (Dictionary): Exception of the call of each file, (CONTAINER_NAME, STAGE_FILE) as key
+    session_id: Session of the batch, the calls of RAVEN.PY_STAGE_ME log it in PROCESS_RESULT
+    call_timestamp: Timestamp before the first call
+    """
+    file_keys = list({file_key(f["STAGE_FILE"]) for f in single_files})
+    events = {}
+    for r in session.table("RAVEN.LOG_STAGE_ME_STATUS_EVENT") \
+            .filter(col("EVENT_TIMESTAMP") >= lit(call_timestamp)) \
+            .filter(f"PROCESS_RESULT:session_id::STRING = '{session_id}'") \
+            .filter(col("FILE_KEY").isin(file_keys)) \
+            .select("ID", "RAVEN_COBID", "DATASET_NAME", "PROCESS_STATUS", "FILE_KEY", "CONTAINER_NAME", "EVENT_TIMESTAMP", "EVENT_SEQUENCE",
+                    col("PROCESS_RESULT")["exception"].cast(StringType()).alias("EXCEPTION")) \
+            .sort("EVENT_TIMESTAMP", "EVENT_SEQUENCE") \
+            .collect():
+        # Latest event of each ID
+        events.setdefault((r["CONTAINER_NAME"], r["FILE_KEY"]), {})[r["ID"]] = r
+
+    file_results = []
+    for f in single_files:
+        key = (f["CONTAINER_NAME"], f["STAGE_FILE"])
+        file_events = events.get((f["CONTAINER_NAME"], file_key(f["STAGE_FILE"])), {})
+        if not file_events:
+            file_results.append({"FILE_NAME": f["FILE_NAME"], "FOLDER_PATH": f["FOLDER_PATH"], "DATASET_NAME": None,
+                                 "RAVEN_COBID": f["RAVEN_COBID"], "STATUS": "FAILED", "LOG_ID": None,
+                                 "MESSAGE": call_errors.get(key, "No status logged by RAVEN.PY_STAGE_ME")})
+            continue
+        for r in file_events.values():
+            # A load still RUNNING when the call returned did not finish
+            status = r["PROCESS_STATUS"] if r["PROCESS_STATUS"] in ("SUCCESS", "FAILED", "SKIPPED") else "FAILED"
+            file_results.append({"FILE_NAME": f["FILE_NAME"], "FOLDER_PATH": f["FOLDER_PATH"], "DATASET_NAME": r["DATASET_NAME"],
+                                 "RAVEN_COBID": r["RAVEN_COBID"], "STATUS": status, "LOG_ID": r["ID"],
+                                 "MESSAGE": r["EXCEPTION"] or (call_errors.get(key) if status == "FAILED" else None) or r["PROCESS_STATUS"]})
+    return file_results
+
+def stage_group(session, group, sf_smp, db_target, catalog_cache, current_database, current_warehouse):
+    """
+    Stages all files of one (dataset, COB) group: one LIST, one DELETE and one COPY per chunk of COPY_MAX_FILES files.
+    With DELETE_INSERT a failed chunk does not stop the next chunks (the chunks before it are already committed),
+    with COB_REPLACE the COB slice is only replaced when all the chunks are copied
+
+    return Dictionary with the group result (process_result), the chunks and the blob files by normalized path of the file.
+           Chunk: FILES, CMD_COPY, COPY_RESULT (rows by normalized path of the file) and EXCEPTION when it failed
+
+    group: List of files (dict) of the group
+    sf_smp: Row of RAVEN.VW_METADATA_STAGE_ME_PARAMETERS_COB of the dataset and COB
+    catalog_cache: CatalogCache of the batch, the warehouses are fetched once
+    """
+    process_result = {}
+    dataset_name = sf_smp["DATASET_NAME"]
+    cobid = sf_smp["RAVEN_COBID"]
+    staging_scope_fields = json.loads(sf_smp["STAGING_SCOPE_FIELDS"])
+    src_file_field = json.loads(sf_smp["SOURCE_FILE_AND_FIELD"])
+    target_table = db_target + "." + src_file_field["DESTINATION_FULL_TABLE_NAME"]
+    stage_name = src_file_field["STAGE_NAME"]
+    flag_delete_by_file_name = src_file_field["DELETE_STAGE_BY_FILE_NAME"]
+    process_result["metadata_version"] = sf_smp["METADATA_VERSION"]
+    process_result["target_table"] = target_table
+
+    stage_files = [f["STAGE_FILE"] for f in group]
+    stage_url = catalog_cache.stage_url(stage_name)
+
+    # Get file details: last_modified, md5, name, size
+    pattern_files = "|".join([re.escape(f) for f in stage_files]).replace("\\", "\\\\").replace("'", "\\'")
+    blob_files = {}
+    for r in session.sql(f"LIST @{stage_name} pattern = '.*({pattern_files})'").collect():
+        blob_files.setdefault(relative_path(r["name"], stage_name, stage_url), []).append(r.as_dict())
+
+    # Set Warehouse
+    warehouse_name = catalog_cache.warehouse_name(current_database,sf_smp["WAREHOUSE_SIZE"])
+    if warehouse_name != current_warehouse:
+        session.sql(f"USE WAREHOUSE {warehouse_name}").collect()
+    process_result["warehouse_size"] = sf_smp["WAREHOUSE_SIZE"]
+    process_result["warehouse_name"] = warehouse_name
+
+    ##### Delete older version of the files in the staging table ####
+    if flag_delete_by_file_name:
+        raven_files = ",".join([f"""'{f.replace("/", "")}'""" for f in stage_files])
+        delete_option = f"replace(RAVEN_FILENAME,'/','') IN ({raven_files})"
+    else:
+        delete_option = f"RAVEN_DATASET_NAME = '{dataset_name}'"
+    cmd_delete = f" DELETE FROM {target_table} WHERE RAVEN_COBID = {cobid} AND {delete_option}"
+    process_result["cmd_delete"] = cmd_delete
+
+    # COB_REPLACE: the files are copied into a shadow table and the COB slice is replaced after the COPY
+    load_strategy = sf_smp["LOAD_STRATEGY"] or "DELETE_INSERT"
+    process_result["load_strategy"] = load_strategy
+    copy_table = target_table
+    if load_strategy == "COB_REPLACE":
+        copy_table = f"{target_table}_SHADOW_{random.randint(0,1000000000000)}"
+        session.sql(f"CREATE TRANSIENT TABLE IF NOT EXISTS {copy_table} LIKE {target_table}").collect()
+    else:
+        process_result["msg_delete_result"] = session.sql(cmd_delete).collect()[0].as_dict()
+
+    # COPY compiled by RAVEN.COMPILE_LOAD_PLANS, reading the listed files instead of a pattern
+    copy_template = sf_smp["COPY_TEMPLATE"] \
+        .replace("|:DATABASE_TARGET:|", db_target) \
+        .replace("|:STAGING_SCOPE_FIELDS:|", str(staging_scope_fields)) \
+        .replace(", pattern => '.*|:PATTERN_FILE:|'", "")
+    idx_from_end = copy_template.rfind(")") + 1
+    force = " FORCE = TRUE " if bool(sf_smp["ALLOW_RELOAD"]) else ""
+
+    chunks = []
+    try:
+        for idx in range(0, len(stage_files), COPY_MAX_FILES):
+            chunk_files = stage_files[idx:idx + COPY_MAX_FILES]
+            files = ",".join([f"'{f}'" for f in chunk_files])
+            cmd_copy = copy_template[:idx_from_end] + f" FILES = ({files}) " + copy_template[idx_from_end:] + force
+            # The COPY reads only the listed files: the COB is a literal when they share it
+            cmd_copy = cmd_copy.replace(COB_PLACEHOLDER, cob_expression(chunk_files))
+            cmd_copy = cmd_copy.replace(f"COPY INTO {target_table} ", f"COPY INTO {copy_table} ", 1)
+            chunk = {"FILES": chunk_files, "CMD_COPY": cmd_copy, "COPY_RESULT": {}}
+            chunks.append(chunk)
+            try:
+                for r in session.sql(cmd_copy).collect():
+                    r = r.as_dict()
+                    chunk["COPY_RESULT"].setdefault(relative_path(r.get("file"), stage_name, stage_url), []).append(r)
+            except Exception as e:
+                chunk["EXCEPTION"] = str(e)
+
+        failed_chunks = [chunk for chunk in chunks if "EXCEPTION" in chunk]
+        if copy_table != target_table and failed_chunks:
+            # The shadow table is incomplete: the COB slice is kept as it is and all the files of the group failed
+            raise Exception("; ".join([chunk["EXCEPTION"] for chunk in failed_chunks]))
+
+        if copy_table != target_table:
+            session.sql("BEGIN TRANSACTION").collect()
+            try:
+                process_result["msg_delete_result"] = session.sql(cmd_delete).collect()[0].as_dict()
+                process_result["msg_insert_result"] = session.sql(f"INSERT INTO {target_table} SELECT * FROM {copy_table}").collect()[0].as_dict()
+                session.sql("COMMIT").collect()
+            except:
+                session.sql("ROLLBACK").collect()
+                raise
+    finally:
+        if copy_table != target_table:
+            session.sql(f"DROP TABLE IF EXISTS {copy_table}").collect()
+
+    process_result["cmd_copy"] = [chunk["CMD_COPY"] for chunk in chunks]
+    process_result["chunks"] = [{"files": len(chunk["FILES"]), "status": "FAILED" if "EXCEPTION" in chunk else "SUCCESS"} for chunk in chunks]
+
+    return process_result, chunks, blob_files
+
+def run(session, file_list, event_trigger, flag_create_csv_mapping, database_target):
+    # Main function
+    """
+    session: mandatory parameter
+    file_list: JSON array with FILE_NAME, FOLDER_PATH and CONTAINER of each file
+    event_trigger: JSON Format | Indicates where the trigger started
+    flag_create_csv_mapping: If True, get the file header position from the first row of the file (staged by RAVEN.PY_STAGE_ME)
+    database_target: If empty, use the current DB, else use the value in the parameter
+    """
+    insert_logs = []
+    file_results = []
+    catalog_cache = CatalogCache(session)
+    try:
+        # Get initial timestamp, current database, session id and warehouse
+        sf_config = session.sql("SELECT sysdate() AS CURRENT_TIMESTAMP, current_database() AS CURRENT_DATABASE, current_session() AS CURRENT_SESSION, current_warehouse() AS CURRENT_WAREHOUSE").collect()[0]
+        start_timestamp = sf_config["CURRENT_TIMESTAMP"]
+        current_database = sf_config["CURRENT_DATABASE"]
+        current_warehouse = sf_config["CURRENT_WAREHOUSE"]
+        db_target = current_database if not database_target else database_target
+
+        # Convert ADF Evente Trigger values to Dictonary
+        lst = [x.split(":") for x in event_trigger.split(",")]
+        dct_et = {lst[i][0]: lst[i][1] for i in range(0, len(lst), 1)} if lst[0][0] else {'Adf': 'none'}
+
+        # Prepare files
+        files = []
+        for file in json.loads(file_list):
+            source_folder = "/".join(filter(None,file["FOLDER_PATH"].split("/")))
+            full_file_path = "/".join([file["FOLDER_PATH"].rstrip('/'),file["FILE_NAME"]])
+            files.append({
+                "FILE_NAME": file["FILE_NAME"],
+                "FOLDER_PATH": file["FOLDER_PATH"],
+                "CONTAINER": file["CONTAINER"],
+                "CONTAINER_NAME": get_container_name(file["CONTAINER"]),
+                "SOURCE_FOLDER": source_folder,
+                "FULL_FILE_PATH": full_file_path,
+                "STAGE_FILE": f"{source_folder}/{file['FILE_NAME']}" if source_folder else file["FILE_NAME"],
+                "RAVEN_COBID": get_cobid(full_file_path),
+                "PROCESS_PARAMETERS": {
+                    "container_name": get_container_name(file["CONTAINER"]),
+                    "event_trigger": dct_et,
+                    "file_stage_me": f"{source_folder}/{file['FILE_NAME']}",
+                    "file_name": file["FILE_NAME"],
+                    "folder_path": source_folder,
+                    "database_target": db_target,
+                    "flag_create_table": False,
+                    "flag_create_pipe": False,
+                    "flag_create_csv_mapping": flag_create_csv_mapping,
+                    "batch_session_id": sf_config["CURRENT_SESSION"]
+                }
+            })
+
+        if not files:
+            return {"files": [], "summary": {}}
+
+        # Resolve all files to datasets in one query
+        resolve_list = json.dumps([{"CONTAINER_NAME": f["CONTAINER_NAME"], "FILE_PATH": f["FULL_FILE_PATH"]} for f in files]).replace("'", "''")
+        sf_resolved = session.sql(f"""SELECT DISTINCT CONTAINER_NAME, FILE_PATH, DATASET_NAME
+                                       FROM TABLE(RAVEN.FN_RESOLVE_FILE_DATASETS(PARSE_JSON('{resolve_list}')::ARRAY))
+                                      WHERE DATASET_NAME IS NOT NULL""").collect()
+        dct_resolved = {}
+        for r in sf_resolved:
+            dct_resolved.setdefault((r["CONTAINER_NAME"], r["FILE_PATH"]), []).append(r["DATASET_NAME"])
+
+        # Metadata of all datasets and COBs of the batch in one query
+        datasets = list({d for v in dct_resolved.values() for d in v})
+        cobids = list({f["RAVEN_COBID"] for f in files})
+        dct_smp = {}
+        if datasets:
+            for r in session.table("RAVEN.VW_METADATA_STAGE_ME_PARAMETERS_COB") \
+                    .filter(col("RAVEN_COBID").isin(cobids)) \
+                    .filter(col("DATASET_NAME").isin(datasets)) \
+                    .collect():
+                dct_smp[(r["DATASET_NAME"], r["RAVEN_COBID"])] = r
+
+        # Group files by dataset and COB
+        groups = {}
+        for file in files:
+            file_datasets = dct_resolved.get((file["CONTAINER_NAME"], file["FULL_FILE_PATH"]), [])
+            if not file_datasets:
+                insert_logs.append({
+                    "ID": generate_log_id(start_timestamp,file["RAVEN_COBID"],file["FILE_NAME"],file["FOLDER_PATH"]),
+                    "RAVEN_COBID": file["RAVEN_COBID"],
+                    "DATASET_NAME": None,
+                    "PROCESS_PARAMETERS": file["PROCESS_PARAMETERS"],
+                    "PROCESS_RESULT": {"exception": f"There is no metadata for the folder/file: {file['SOURCE_FOLDER']}/{file['FILE_NAME']}", "is_error": True},
+                    "PROCESS_STATUS": "FAILED",
+                    "START_TIMESTAMP": start_timestamp,
+                    "END_TIMESTAMP": None,
+                    "BLOB_FILE": None
+                })
+                file_results.append({"FILE_NAME": file["FILE_NAME"], "FOLDER_PATH": file["FOLDER_PATH"], "DATASET_NAME": None,
+                                     "RAVEN_COBID": file["RAVEN_COBID"], "STATUS": "FAILED", "LOG_ID": insert_logs[-1]["ID"],
+                                     "MESSAGE": insert_logs[-1]["PROCESS_RESULT"]["exception"]})
+                continue
+            for dataset_name in file_datasets:
+                groups.setdefault((dataset_name, file["RAVEN_COBID"]), []).append(file)
+
+        # Groups that can not be staged and files staged by RAVEN.PY_STAGE_ME (CSV mapping from the file header, trigger files).
+        # PY_STAGE_ME loads all the datasets of a file, so these files are removed from the COPY of the other groups
+        group_errors = {}
+        single_files = {}
+        for (dataset_name, cobid), group in groups.items():
+            sf_smp = dct_smp.get((dataset_name, cobid))
+            if not sf_smp:
+                group_errors[(dataset_name, cobid)] = f"There is no metadata for the dataset {dataset_name} and COB {cobid}"
+                continue
+            src_file_field = json.loads(sf_smp["SOURCE_FILE_AND_FIELD"])
+            file_format = catalog_cache.file_format(src_file_field["FILE_FORMAT"])
+            if not file_format:
+                group_errors[(dataset_name, cobid)] = f"File Format not found: {src_file_field['FILE_FORMAT']}"
+                continue
+            use_csv_mapping = flag_create_csv_mapping == True and file_format["SKIP_HEADER"] == 1
+            if use_csv_mapping or bool(sf_smp["IS_TRIGGER_FILE"]) or not sf_smp["COPY_TEMPLATE"]:
+                single_files.update({(f["CONTAINER_NAME"], f["STAGE_FILE"]): f for f in group})
+
+        for (dataset_name, cobid), group in groups.items():
+            if (dataset_name, cobid) not in group_errors:
+                group = [f for f in group if (f["CONTAINER_NAME"], f["STAGE_FILE"]) not in single_files]
+            if not group:
+                continue
+            group_logs = [{
+                "ID": generate_log_id(start_timestamp,cobid,f["FILE_NAME"],f["FOLDER_PATH"]),
+                "RAVEN_COBID": cobid,
+                "DATASET_NAME": dataset_name,
+                "PROCESS_PARAMETERS": f["PROCESS_PARAMETERS"],
+                "PROCESS_RESULT": None,
+                "PROCESS_STATUS": "RUNNING",
+                "START_TIMESTAMP": start_timestamp,
+                "END_TIMESTAMP": None,
+                "BLOB_FILE": None
+                } for f in group]
+            try:
+                if (dataset_name, cobid) in group_errors:
+                    raise Exception(group_errors[(dataset_name, cobid)])
+
+                # The RUNNING events are written before the COPY, so RAVEN.VW_LOG_UNSTAGED_FILES excludes the files in progress
+                flush_logs(session,group_logs)
+
+                process_result, chunks, blob_files = stage_group(session, group, dct_smp[(dataset_name, cobid)], db_target, catalog_cache, current_database, current_warehouse)
+                end_timestamp = session.sql("SELECT sysdate() AS CURRENT_TIMESTAMP").collect()[0][0]
+
+                for f, log in zip(group, group_logs):
+                    # Result of the COPY chunk of the file and blob details of the file
+                    stage_file = file_key(f["STAGE_FILE"])
+                    chunk = next(chunk for chunk in chunks if f["STAGE_FILE"] in chunk["FILES"])
+                    status, message, file_copy_result = file_outcome(stage_file, chunk, blob_files)
+                    file_blob = blob_files.get(stage_file, [])
+
+                    log["PROCESS_RESULT"] = dict(process_result, msg_copy_result=file_copy_result, is_error=status == "FAILED", catalog_cache=catalog_cache.stats())
+                    if status != "SUCCESS":
+                        log["PROCESS_RESULT"]["exception" if status == "FAILED" else "message"] = str(message)
+                    log["PROCESS_STATUS"] = status
+                    log["END_TIMESTAMP"] = end_timestamp
+                    log["BLOB_FILE"] = {"FILE_LIST": file_blob, "FILE_COUNT": len(file_blob)}
+                    insert_logs.append(log)
+                    file_results.append({"FILE_NAME": f["FILE_NAME"], "FOLDER_PATH": f["FOLDER_PATH"], "DATASET_NAME": dataset_name,
+                                         "RAVEN_COBID": cobid, "STATUS": status, "LOG_ID": log["ID"], "MESSAGE": message})
+
+            except:
+                # The failure only affects the files of this group
+                exc_type, exc_value, exc_traceback = sys.exc_info()
+                end_timestamp = session.sql("SELECT sysdate() AS CURRENT_TIMESTAMP").collect()[0][0]
+                for f, log in zip(group, group_logs):
+                    log["PROCESS_RESULT"] = {"exception": str(exc_value), "is_error": True}
+                    log["PROCESS_STATUS"] = "FAILED"
+                    log["END_TIMESTAMP"] = end_timestamp
+                    insert_logs.append(log)
+                    file_results.append({"FILE_NAME": f["FILE_NAME"], "FOLDER_PATH": f["FOLDER_PATH"], "DATASET_NAME": dataset_name,
+                                         "RAVEN_COBID": cobid, "STATUS": "FAILED", "LOG_ID": log["ID"], "MESSAGE": str(exc_value)})
+
+        # Files staged by RAVEN.PY_STAGE_ME, one call per file after the groups
+        if single_files:
+            call_timestamp = session.sql("SELECT current_timestamp() AS CURRENT_TIMESTAMP").collect()[0][0]
+            call_errors = {}
+            for key, f in single_files.items():
+                try:
+                    session.call("RAVEN.PY_STAGE_ME", f["FILE_NAME"], f["FOLDER_PATH"], f["CONTAINER"], event_trigger,
+                                 False, False, flag_create_csv_mapping, database_target)
+                except Exception as e:
+                    call_errors[key] = str(e)
+            file_results += single_file_results(session, list(single_files.values()), call_errors, sf_config["CURRENT_SESSION"], call_timestamp)
+
+        # Restore the warehouse of the session
+        if current_warehouse:
+            session.sql(f"USE WAREHOUSE {current_warehouse}").collect()
+
+        summary = {
+            "files": len(files),
+            "groups": len(groups),
+            "success": len([r for r in file_results if r["STATUS"] == "SUCCESS"]),
+            "failed": len([r for r in file_results if r["STATUS"] == "FAILED"]),
+            "skipped": len([r for r in file_results if r["STATUS"] == "SKIPPED"]),
+            "files_stage_me": len(single_files),
+            "catalog_cache": catalog_cache.stats()
+        }
+        return {"files": file_results, "summary": summary}
+
+    finally:
+        # All log records in one statement
+        flush_logs(session,insert_logs)
+
+
+$$
+;
@@ -10,6 +10,10 @@
  * - FLAG_CREATE_PIPE: Whether to create a Snowpipe instead of COPY command
  * - FLAG_CREATE_CSV_SELECT: Whether to infer CSV header positions
  * - DATABASE_TARGET: Target database, defaults to current if empty
+ *
+ * The schema inferred from a CSV file is cached in RAVEN.METADATA_INFER_SCHEMA_CACHE by dataset and layout fingerprint
+ * (header hash, delimiter and column count). On a cache miss the schema is inferred locally from a sample of one file
+ * (INFER_SAMPLE_ROWS rows, INFER_SAMPLE_BYTES bytes); INFER_SCHEMA is used for other file types or when the local inference fails.
 */
 CREATE OR REPLACE PROCEDURE RAVEN.PY_STAGE_ME_INFER_SCHEMA(
     "FILE_NAME" VARCHAR(16777216), 
@@ -24,18 +28,30 @@ RETURNS VARCHAR(16777216)
 LANGUAGE PYTHON
 RUNTIME_VERSION = '3.8'
 PACKAGES = ('snowflake-snowpark-python','pandas','numpy')
+IMPORTS = ('@RAVEN.INTSTAGE_RAVEN_FILES/models/shared/catalog_cache.py','@RAVEN.INTSTAGE_RAVEN_FILES/models/shared/stage_me_log.py',
+           '@RAVEN.INTSTAGE_RAVEN_FILES/models/shared/header_probe.py','@RAVEN.INTSTAGE_RAVEN_FILES/models/shared/type_inference.py',
+           '@RAVEN.INTSTAGE_RAVEN_FILES/models/shared/copy_cob.py')
 HANDLER = 'run'
 EXECUTE AS caller
 AS
 $$
 
 # Imports
-import sys, re, random, json
+import sys, re, random, json, hashlib, codecs
 import pandas as pd
 from collections import Counter
-from snowflake.snowpark.functions import col, concat_ws, lit, when_matched, when_not_matched
-from snowflake.snowpark.types import StructField, StructType, StringType
+from snowflake.snowpark.functions import col, concat_ws, lit, parse_json, current_timestamp, when_not_matched
+from snowflake.snowpark.types import StructField, StructType, StringType, LongType, TimestampType
 from snowflake.snowpark import DataFrame
+from stage_me_log import log_keys
+from catalog_cache import CatalogCache
+from header_probe import header_hash, probe_header, probe_text, stage_file_path, strip_bom
+from type_inference import infer_types, read_sample
+from copy_cob import cob_expression
+
+# Sampling budget of the schema inference: rows per file (also MAX_RECORDS_PER_FILE of INFER_SCHEMA) and bytes read by the local inference
+INFER_SAMPLE_ROWS = 10000
+INFER_SAMPLE_BYTES = 4 * 1024 * 1024
 
 def run(session,file_name, folder_path, container, event_trigger, flag_create_table, flag_create_pipe, flag_create_csv_mapping, database_target):
 	stage_me = StageMe(session,file_name, folder_path, container, event_trigger, flag_create_table, flag_create_pipe, flag_create_csv_mapping, database_target)
@@ -67,9 +83,11 @@ class StageMe:
         self.database_target = database_target
         self.process_parameters = {}
         self.insert_log = {}
+        self.log_events = []
         self.process_result = {}
         self.log_id = -1
         self.return_result = {}
+        self.catalog_cache = CatalogCache(session)
 
         # Remove any "/" at the beginning and end
         self.source_folder = "/".join(filter(None,self.folder_path.split("/")))
@@ -189,34 +207,67 @@ class StageMe:
             
         return return_msg
 
-    def merge_log(self):
+    def append_log(self):
         """
-        Insert or Update log table RAVEN.LOG_STAGE_ME_STATUS
+        Buffers the current log record as a status event. The events are written by flush_log in RAVEN.LOG_STAGE_ME_STATUS_EVENT
+        and the latest event of each ID is merged in RAVEN.LOG_STAGE_ME_STATUS by TASK_MERGE_LOG_STAGE_ME_STATUS
 
         """
-        target = self.session.table("RAVEN.LOG_STAGE_ME_STATUS")
-        source = self.session.create_dataframe([self.insert_log])
+        self.log_events.append({
+            "ID" : self.insert_log["ID"],
+            "RAVEN_COBID" : int(self.insert_log["RAVEN_COBID"]),
+            "DATASET_NAME" : self.insert_log["DATASET_NAME"],
+            "PROCESS_PARAMETERS" : json.dumps(self.insert_log["PROCESS_PARAMETERS"], default=str),
+            "PROCESS_RESULT" : json.dumps(self.insert_log["PROCESS_RESULT"], default=str),
+            "PROCESS_STATUS" : self.insert_log["PROCESS_STATUS"],
+            "START_TIMESTAMP" : self.insert_log["START_TIMESTAMP"],
+            "END_TIMESTAMP" : self.insert_log["END_TIMESTAMP"],
+            "BLOB_FILE" : json.dumps(self.insert_log["BLOB_FILE"], default=str),
+            "EVENT_SEQUENCE" : len(self.log_events),
+            **log_keys(self.insert_log["PROCESS_PARAMETERS"], self.insert_log["PROCESS_STATUS"], self.insert_log["PROCESS_RESULT"])
+        })
+
+    def flush_log(self):
+        """
+        Inserts the buffered events in the append-only table RAVEN.LOG_STAGE_ME_STATUS_EVENT with one INSERT
 
-        target.merge(source, target["ID"] == source["ID"],
-            [when_matched().update({
-                "DATASET_NAME" : source["DATASET_NAME"],
-                "PROCESS_PARAMETERS" : source["PROCESS_PARAMETERS"],
-                "PROCESS_RESULT" : source["PROCESS_RESULT"],
-                "PROCESS_STATUS" : source["PROCESS_STATUS"],
-                "START_TIMESTAMP" : source["START_TIMESTAMP"],
-                "END_TIMESTAMP" : source["END_TIMESTAMP"],
-                "BLOB_FILE" : source["BLOB_FILE"]}), 
-            when_not_matched().insert({
-                "ID" : source["ID"],
-                "RAVEN_COBID" : source["RAVEN_COBID"],
-                "DATASET_NAME" : source["DATASET_NAME"],
-                "PROCESS_PARAMETERS" : source["PROCESS_PARAMETERS"],
-                "PROCESS_RESULT" : source["PROCESS_RESULT"],
-                "PROCESS_STATUS" : source["PROCESS_STATUS"],
-                "START_TIMESTAMP" : source["START_TIMESTAMP"],
-                "END_TIMESTAMP" : source["END_TIMESTAMP"],
-                "BLOB_FILE" : source["BLOB_FILE"]})
-            ])
+        """
+        if not self.log_events:
+            return
+
+        schema = StructType([
+            StructField("ID", LongType()),
+            StructField("RAVEN_COBID", LongType()),
+            StructField("DATASET_NAME", StringType()),
+            StructField("PROCESS_PARAMETERS", StringType()),
+            StructField("PROCESS_RESULT", StringType()),
+            StructField("PROCESS_STATUS", StringType()),
+            StructField("START_TIMESTAMP", TimestampType()),
+            StructField("END_TIMESTAMP", TimestampType()),
+            StructField("BLOB_FILE", StringType()),
+            StructField("EVENT_SEQUENCE", LongType()),
+            StructField("FILE_KEY", StringType()),
+            StructField("CONTAINER_NAME", StringType()),
+            StructField("FAILURE_REASON", StringType())
+        ])
+        self.session.create_dataframe([[e[f.name] for f in schema.fields] for e in self.log_events], schema=schema) \
+            .select(
+                col("ID"),
+                col("RAVEN_COBID"),
+                col("DATASET_NAME"),
+                parse_json(col("PROCESS_PARAMETERS")).alias("PROCESS_PARAMETERS"),
+                parse_json(col("PROCESS_RESULT")).alias("PROCESS_RESULT"),
+                col("PROCESS_STATUS"),
+                col("START_TIMESTAMP"),
+                col("END_TIMESTAMP"),
+                parse_json(col("BLOB_FILE")).alias("BLOB_FILE"),
+                col("EVENT_SEQUENCE"),
+                current_timestamp().alias("EVENT_TIMESTAMP"),
+                col("FILE_KEY"),
+                col("CONTAINER_NAME"),
+                col("FAILURE_REASON")) \
+            .write.mode("append").save_as_table("RAVEN.LOG_STAGE_ME_STATUS_EVENT")
+        self.log_events = []
 
     def generate_log_id(self,start_timestamp: str,cobid: str) -> int:
         """
@@ -259,10 +310,150 @@ class StageMe:
 
         return normal_string
 
-    def infer_schema(self,src_file_field: str,stage_name: str,pattern_file_parse: str,file_format: str,target_table: str,file_format_type: str):
+    def layout_fingerprint(header: str, delimiter: str) -> str:
+        """
+        Fingerprint of the file layout: header hash, delimiter and column count
 
-        def isNaN(num):
-            return num != num
+        header: First line of the file, without BOM
+        delimiter: Field delimiter of the file format
+        """
+        column_count = len(header.split(delimiter))
+        return hashlib.sha256(f"{header_hash(header, delimiter)}|{delimiter}|{column_count}".encode("utf-8")).hexdigest()
+
+    def get_cached_schema(self,dataset_name: str,fingerprint: str):
+        """
+        Schema cached for the dataset and layout, None if it is not cached. A hit adds 1 to HIT_COUNT
+
+        return pandas dataframe with COLUMN_NAME_SOURCE, TYPE and SELECT_POSITION
+        """
+        sf_cache = self.session.table("RAVEN.METADATA_INFER_SCHEMA_CACHE") \
+            .filter(col("DATASET_NAME") == dataset_name) \
+            .filter(col("LAYOUT_FINGERPRINT") == fingerprint) \
+            .select("INFERRED_SCHEMA") \
+            .collect()
+        if not sf_cache:
+            return None
+
+        self.session.sql(f"""UPDATE RAVEN.METADATA_INFER_SCHEMA_CACHE
+                                SET HIT_COUNT = HIT_COUNT + 1, LAST_HIT_TIMESTAMP = current_timestamp()
+                              WHERE DATASET_NAME = '{dataset_name}' AND LAYOUT_FINGERPRINT = '{fingerprint}'""").collect()
+        return pd.DataFrame(json.loads(sf_cache[0]["INFERRED_SCHEMA"]), columns=["COLUMN_NAME_SOURCE","TYPE","SELECT_POSITION"])
+
+    def save_cached_schema(self,dataset_name: str,fingerprint: str,header: str,delimiter: str,df_infer,inference_engine: str):
+        """
+        Saves the inferred schema of the dataset and layout in RAVEN.METADATA_INFER_SCHEMA_CACHE
+        """
+        schema = StructType([
+            StructField("DATASET_NAME", StringType()),
+            StructField("LAYOUT_FINGERPRINT", StringType()),
+            StructField("CSV_HEADER", StringType()),
+            StructField("FIELD_DELIMITER", StringType()),
+            StructField("COLUMN_COUNT", LongType()),
+            StructField("INFERRED_SCHEMA", StringType()),
+            StructField("INFERENCE_ENGINE", StringType())
+        ])
+        inferred_schema = json.dumps(df_infer[["COLUMN_NAME_SOURCE","TYPE","SELECT_POSITION"]].to_dict("records"))
+        source = self.session.create_dataframe([[dataset_name, fingerprint, header, delimiter, len(header.split(delimiter)), inferred_schema, inference_engine]], schema=schema)
+
+        target = self.session.table("RAVEN.METADATA_INFER_SCHEMA_CACHE")
+        target.merge(source,
+            (target["DATASET_NAME"] == source["DATASET_NAME"]) &
+            (target["LAYOUT_FINGERPRINT"] == source["LAYOUT_FINGERPRINT"])
+            ,
+            [when_not_matched().insert({
+                "DATASET_NAME" : source["DATASET_NAME"],
+                "LAYOUT_FINGERPRINT" : source["LAYOUT_FINGERPRINT"],
+                "CSV_HEADER" : source["CSV_HEADER"],
+                "FIELD_DELIMITER" : source["FIELD_DELIMITER"],
+                "COLUMN_COUNT" : source["COLUMN_COUNT"],
+                "INFERRED_SCHEMA" : parse_json(source["INFERRED_SCHEMA"]),
+                "INFERENCE_ENGINE" : source["INFERENCE_ENGINE"],
+                "SAMPLE_ROWS" : lit(INFER_SAMPLE_ROWS),
+                "HIT_COUNT" : lit(0),
+                "CREATED_TIMESTAMP" : current_timestamp()
+                })
+            ])
+
+    def infer_schema_local(self,stage_file: str,delimiter: str):
+        """
+        Infers the schema from a sample of the file (INFER_SAMPLE_ROWS rows, at most INFER_SAMPLE_BYTES bytes read)
+
+        return pandas dataframe with COLUMN_NAME_SOURCE, TYPE and SELECT_POSITION
+
+        stage_file: @<stage>/<path> of the file
+        delimiter: Field delimiter of the file format
+        """
+        text, truncated = probe_text(stage_file, INFER_SAMPLE_BYTES)
+        df_sample = read_sample(text, delimiter, INFER_SAMPLE_ROWS, truncated)
+        df_infer = pd.DataFrame(infer_types(df_sample), columns=["COLUMN_NAME","POSITION","TYPE"])
+        return pd.DataFrame({
+            "COLUMN_NAME_SOURCE": df_infer["COLUMN_NAME"],
+            "TYPE": df_infer["TYPE"],
+            "SELECT_POSITION": "$" + df_infer["POSITION"].astype(str)
+            })
+
+    def infer_schema_query(self,stage_name: str,pattern_file_parse: str,file_format_parse: str):
+        """
+        Infers the schema with INFER_SCHEMA (INFER_SAMPLE_ROWS records per file)
+
+        return pandas dataframe with COLUMN_NAME_SOURCE, TYPE and SELECT_POSITION
+        """
+        cmd_infer = f"""
+            SELECT 
+                TRIM(COLUMN_NAME) AS COLUMN_NAME_SOURCE,
+                TYPE,
+                SPLIT_PART(EXPRESSION,'::',1) AS SELECT_POSITION
+            FROM TABLE(
+                INFER_SCHEMA(
+                LOCATION=>'@{stage_name}/{pattern_file_parse}'
+                , FILE_FORMAT=>'RAVEN.{file_format_parse}'
+                , MAX_RECORDS_PER_FILE => {INFER_SAMPLE_ROWS}
+                )
+            )
+        """
+        return self.session.sql(cmd_infer).to_pandas()
+
+    def get_file_schema(self,dataset_name: str,stage_name: str,pattern_file_parse: str,file_format: str,file_format_type: str,delimiter: str,first_file: str):
+        """
+        Schema of the files: cached schema of the layout, else local inference (CSV), else INFER_SCHEMA.
+        The source is logged in process_result["infer_schema_source"]
+
+        return pandas dataframe with COLUMN_NAME_SOURCE, TYPE and SELECT_POSITION
+
+        first_file: Name returned by LIST of one file of the pattern
+        """
+        file_format_parse = f'{file_format}_PARSE_HEADER' if file_format_type.upper() == "CSV" else file_format
+
+        header, fingerprint, stage_file, df_infer = None, None, None, None
+        if file_format_type.upper() == "CSV" and delimiter:
+            try:
+                stage_file = stage_file_path(stage_name, first_file, self.catalog_cache.stage_url(stage_name))
+                header = probe_header(stage_file)
+            except Exception as e:
+                self.process_result["header_probe_exception"] = str(e)
+        if header:
+            header = strip_bom(header)
+            fingerprint = StageMe.layout_fingerprint(header, delimiter)
+            self.process_result["layout_fingerprint"] = fingerprint
+            df_infer = StageMe.get_cached_schema(self,dataset_name,fingerprint)
+            if df_infer is not None:
+                self.process_result["infer_schema_source"] = "CACHE"
+                return df_infer
+            try:
+                df_infer = StageMe.infer_schema_local(self,stage_file,delimiter)
+                self.process_result["infer_schema_source"] = "LOCAL"
+            except Exception as e:
+                self.process_result["local_infer_exception"] = str(e)
+
+        if df_infer is None:
+            df_infer = StageMe.infer_schema_query(self,stage_name,pattern_file_parse,file_format_parse)
+            self.process_result["infer_schema_source"] = "INFER_SCHEMA"
+
+        if fingerprint and not df_infer.empty:
+            StageMe.save_cached_schema(self,dataset_name,fingerprint,header,delimiter,df_infer,self.process_result["infer_schema_source"])
+        return df_infer
+
+    def infer_schema(self,src_file_field: str,stage_name: str,pattern_file_parse: str,file_format: str,target_table: str,file_format_type: str,dataset_name: str,delimiter: str,first_file: str):
 
         # Get all metadata Fields
         list_column_name_source = src_file_field["LIST_COLUMN_NAME_SOURCE"]
@@ -289,25 +480,9 @@ class StageMe:
             'COLUMN_UNKNOWN_POSITION_SOURCE_TRANSFORM': list_column_unknown_position_source_transform
             })
 
-        file_format_parse = f'{file_format}_PARSE_HEADER' if file_format_type.upper() == "CSV" else file_format
-        
-        # Infer Schema from file
-        cmd_infer = f"""
-            SELECT 
-            FILENAMES,TYPE, 
-            TRIM(COLUMN_NAME) AS COLUMN_NAME_SOURCE,         
-                'NULLIF('||SPLIT_PART(EXPRESSION,'::',1)||','''')'||'::'||TYPE||' AS "'||COLUMN_NAME_SOURCE||'"'  AS SELECT_EXPRESSION,
-                SPLIT_PART(EXPRESSION,'::',1) AS SELECT_POSITION
-            FROM TABLE(
-                INFER_SCHEMA(
-                LOCATION=>'@{stage_name}/{pattern_file_parse}'
-                , FILE_FORMAT=>'RAVEN.{file_format_parse}'
-                , MAX_RECORDS_PER_FILE => 10000
-                )
-            )
-        """
-        # Transform to pandas dataframe
-        df_infer = self.session.sql(cmd_infer).to_pandas()
+        # Schema of the file (cache, local inference or INFER_SCHEMA)
+        df_infer = StageMe.get_file_schema(self,dataset_name,stage_name,pattern_file_parse,file_format,file_format_type,delimiter,first_file)
+        df_infer["SELECT_EXPRESSION"] = "NULLIF(" + df_infer["SELECT_POSITION"] + ",'')::" + df_infer["TYPE"] + ' AS "' + df_infer["COLUMN_NAME_SOURCE"] + '"'
         
         # Split uppercase strings
         df_infer["COLUMN_NAME_TARGET_INFER"] = '"'+ df_infer["COLUMN_NAME_SOURCE"].map(StageMe.split_join_str_uppercase) + '"' 
@@ -320,10 +495,12 @@ class StageMe:
         df_merge = df_infer.merge(df_metadata, on='COLUMN_NAME_SOURCE', how='left')
 
         # Replace "|:REPLACE_POSITION:|" with "SELECT_POSITION" in column: COLUMN_UNKNOWN_POSITION_SOURCE_TRANSFORM
-        df_merge['COPY_INTO_SELECT'] = df_merge.apply(lambda x: None
-                                                        if isNaN(x["COLUMN_UNKNOWN_POSITION_SOURCE_TRANSFORM"]) 
-                                                        else (str(x["COLUMN_UNKNOWN_POSITION_SOURCE_TRANSFORM"])).replace("|:REPLACE_POSITION:|",x["SELECT_POSITION"]), 
-                                                        axis=1)
+        # The transform is split on the placeholder and joined again with the position of each row (column operations, no apply per row)
+        transform_parts = df_merge["COLUMN_UNKNOWN_POSITION_SOURCE_TRANSFORM"].astype("string").str.split("|:REPLACE_POSITION:|", regex=False, expand=True)
+        copy_into_select = transform_parts[0]
+        for part in transform_parts.columns[1:]:
+            copy_into_select = copy_into_select + (df_merge["SELECT_POSITION"] + transform_parts[part]).fillna("")
+        df_merge['COPY_INTO_SELECT'] = copy_into_select.astype(object)
 
         # Replace missing values with "SELECT_EXPRESSION" in column: 'COPY_INTO_SELECT'
         df_merge['COPY_INTO_SELECT'] = df_merge['COPY_INTO_SELECT'].fillna(df_merge['SELECT_EXPRESSION'])
@@ -386,7 +563,7 @@ class StageMe:
             .select((col("COLUMN_NAME")).as_("COLUMN_NAME_TARGET"))
 
         df_columns = sf_columns.to_pandas()
-        df_columns = df_columns.apply(lambda x: '"'+x+'"')
+        df_columns["COLUMN_NAME_TARGET"] = '"' + df_columns["COLUMN_NAME_TARGET"] + '"'
         df = df_mapping.merge(df_columns, on='COLUMN_NAME_TARGET', how='inner')
         return df
         
@@ -495,6 +672,7 @@ class StageMe:
                 ##~ Log Information ~##
                 self.process_result["source_system_code"] = sf_smp["SOURCE_SYSTEM_CODE"] # SOURCE_SYSTEM_CODE
                 self.process_result["source_feed_code"] = sf_smp["SOURCE_FEED_CODE"]     # SOURCE_FEED_CODE
+                self.process_result["metadata_version"] = sf_smp["METADATA_VERSION"]     # RAVEN.METADATA_LOAD_PLAN version
 
                 # Insert Log
                 self.insert_log = {
@@ -508,7 +686,7 @@ class StageMe:
                     "END_TIMESTAMP" : None,
                     "BLOB_FILE" : None
                 }
-                StageMe.merge_log(self)
+                StageMe.append_log(self)
 
                 # Table destination setup
                 src_file_field = json.loads(sf_smp["SOURCE_FILE_AND_FIELD"])
@@ -546,6 +724,8 @@ class StageMe:
 
                 file_format_type = sf_file_format["FILE_FORMAT_TYPE"]
                 skip_header = sf_file_format["SKIP_HEADER"]
+                # Delimiter of the local inference, only for files with the header in the first row (escapes like \t are decoded)
+                file_delimiter = codecs.decode(sf_file_format["FIELD_DELIMITER"], "unicode_escape") if sf_file_format["FIELD_DELIMITER"] and skip_header == 1 else None
                 
                 # If header is not the first row, re-write the file to skip the rows before
                 if self.flag_create_csv_mapping == True and skip_header > 1:
@@ -557,7 +737,7 @@ class StageMe:
 
                 if len(file_list) > 0 and self.flag_create_csv_mapping == True and skip_header != 0 and allow_infer_schema: 
                 # Infer Schema if the file format has header (SKIPE_HEADER = 1 or NULL) 
-                    mapping_target_columns, mapping_source_columns, mapping_create_columns, mapping_source_seq = StageMe.infer_schema(self,src_file_field,stage_name,pattern_file_parse,file_format,target_table,file_format_type)
+                    mapping_target_columns, mapping_source_columns, mapping_create_columns, mapping_source_seq = StageMe.infer_schema(self,src_file_field,stage_name,pattern_file_parse,file_format,target_table,file_format_type,dataset_name,file_delimiter,file_list[0]["name"])
 
                 else: 
                 # If not using the file to get the field position, use it from the metadata
@@ -581,7 +761,10 @@ class StageMe:
 
                 # Raven metadata fields
                 target_columns_raven = "RAVEN_COBID,RAVEN_STAGE_SCOPE_FIELDS,RAVEN_FILENAME,RAVEN_FILE_ROW_NUMBER,RAVEN_STAGE_TIMESTAMP,RAVEN_DATASET_NAME"
-                source_columns_raven = f"RAVEN.FN_FIND_COB(metadata$filename) AS RAVEN_COBID,{staging_scope_fields}::OBJECT AS RAVEN_STAGE_SCOPE_FIELDS,metadata$filename AS RAVEN_FILENAME,metadata$file_row_number AS RAVEN_FILE_ROW_NUMBER,current_timestamp AS RAVEN_STAGE_TIMESTAMP,'{dataset_name}' AS RAVEN_DATASET_NAME"
+                # COB of the listed files as a literal or a lookup on metadata$filename, instead of RAVEN.FN_FIND_COB on every row
+                stage_url = self.catalog_cache.stage_url(stage_name)
+                raven_cobid = cob_expression([stage_file_path(stage_name, f["name"], stage_url).split("/", 1)[1] for f in file_list], pattern_file)
+                source_columns_raven = f"{raven_cobid} AS RAVEN_COBID,{staging_scope_fields}::OBJECT AS RAVEN_STAGE_SCOPE_FIELDS,metadata$filename AS RAVEN_FILENAME,metadata$file_row_number AS RAVEN_FILE_ROW_NUMBER,current_timestamp AS RAVEN_STAGE_TIMESTAMP,'{dataset_name}' AS RAVEN_DATASET_NAME"
 
                 # Join fields for target and sources
                 target_columns = ",".join( filter(None,[target_columns_file, target_columns_raven]) )
@@ -600,6 +783,9 @@ class StageMe:
                 # Create COPY command that can be used for Snowpipe and direct copy
                 cmd_copy = f" COPY INTO {target_table} ({target_columns}) FROM ({cmd_select}) {on_error}"
                 
+                # The RUNNING event is written before the transaction, so RAVEN.VW_LOG_UNSTAGED_FILES excludes the load in progress
+                StageMe.flush_log(self)
+
                 # Set RAVEN schema and Begin Transaction
                 self.session.sql("USE SCHEMA RAVEN").collect()
                 self.session.sql('BEGIN TRANSACTION').collect()
@@ -650,10 +836,12 @@ class StageMe:
                 self.insert_log["is_error"] = False
                 self.insert_log["END_TIMESTAMP"] = self.session.sql("SELECT sysdate() AS CURRENT_TIMESTAMP").collect()[0][0]
             
-                StageMe.merge_log(self)
+                StageMe.append_log(self)
                 self.return_result[self.log_id] = "SUCCESS"
                 self.session.sql('COMMIT').collect()
 
+            StageMe.flush_log(self)
+
         except:
             exc_type, exc_value, exc_traceback = sys.exc_info()
             self.session.sql('ROLLBACK').collect()
@@ -664,7 +852,9 @@ class StageMe:
             self.insert_log["PROCESS_RESULT"] = self.process_result
             self.insert_log["PROCESS_STATUS"] = "FAILED"
             self.insert_log["END_TIMESTAMP"] = self.session.sql("SELECT sysdate() AS CURRENT_TIMESTAMP").collect()[0][0]
-            StageMe.merge_log(self)
+            if "ID" in self.insert_log:
+                StageMe.append_log(self)
+            StageMe.flush_log(self)
             self.return_result[self.log_id] = "FAILED"
             raise exc_type(exc_value).with_traceback(exc_traceback)
         return self.return_result
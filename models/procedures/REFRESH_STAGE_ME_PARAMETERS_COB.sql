@@ -0,0 +1,210 @@
+/**
+ * Refreshes RAVEN.METADATA_STAGE_ME_PARAMETERS_COB, the stage parameters resolved for the last 180 COBs of the calendar (plus 19000101).
+ *
+ * Only the (DATASET_NAME, RAVEN_COBID) rows that changed are resolved again:
+ *   - New COBs in the calendar window
+ *   - Datasets with a new load plan version (RAVEN.METADATA_LOAD_PLAN) or with changed parameters (PARAMETERS_HASH)
+ * Rows of COBs out of the window, disabled datasets and datasets without a current load plan are deleted.
+ * RAVEN.METADATA_FILE_RESOLUTION_INDEX is kept in sync with the resolved rows.
+ *
+ * Called by COMPILE_LOAD_PLANS (metadata changes) and TASK_REFRESH_STAGE_ME_PARAMETERS_COB (new calendar days).
+ */
+CREATE OR REPLACE PROCEDURE RAVEN.REFRESH_STAGE_ME_PARAMETERS_COB()
+RETURNS VARIANT
+LANGUAGE PYTHON
+RUNTIME_VERSION = '3.8'
+PACKAGES = ('snowflake-snowpark-python')
+HANDLER = 'run'
+EXECUTE AS caller
+AS
+$$
+
+import sys
+
+def run(session):
+    try:
+        # Expected rows: enabled datasets with current load plan x calendar window
+        session.sql("""
+            CREATE OR REPLACE TEMPORARY TABLE RAVEN.TEMP_STAGE_ME_PARAMETERS_COB_KEYS AS
+            WITH LATEST_COBS AS(
+            SELECT 19000101 AS RAVEN_COBID 
+            UNION ALL
+            SELECT RAVEN_COBID FROM 
+                (SELECT 
+                    COBID AS RAVEN_COBID 
+                 FROM RAVEN.METADATA_CALENDAR
+                WHERE MY_DATE <= current_date()
+                  AND IS_PRIMARY_MARKET = TRUE
+                ORDER BY COBID DESC
+                LIMIT 180)
+            )
+            SELECT
+                C.RAVEN_COBID,
+                P.DATASET_NAME,
+                L.METADATA_VERSION,
+                HASH(P.CONTAINER_NAME, P.FILE_PATH, P.FILE_NAME, P.SOURCE_SYSTEM_CODE, P.SOURCE_FEED_CODE, P.IS_TRIGGER_FILE, P.ALLOW_RELOAD, 
+                     P.ENTITY_CODE, P.DEPARTMENT_CODE, P.REGION, P.MARKET, P.IS_CLOUD_COPY, P.EXPECTED_STAGE_TIME, P.WAREHOUSE_SIZE, 
+                     P.ALLOW_INFER_SCHEMA, P.TAGS, P.LOAD_STRATEGY, P.CLUSTER_BY_COBID) AS PARAMETERS_HASH
+            FROM RAVEN.METADATA_STAGE_ME_PARAMETERS     P
+            INNER JOIN RAVEN.METADATA_LOAD_PLAN         L ON L.DATASET_NAME = P.DATASET_NAME
+                                                         AND L.IS_CURRENT = TRUE
+            CROSS JOIN LATEST_COBS                      C
+            WHERE P.IS_ENABLED = TRUE
+        """).collect()
+
+        # Remove rows that are not expected anymore or were resolved with other version/parameters
+        delete_result = session.sql("""
+            DELETE FROM RAVEN.METADATA_STAGE_ME_PARAMETERS_COB T
+            WHERE NOT EXISTS (SELECT 1 
+                                FROM RAVEN.TEMP_STAGE_ME_PARAMETERS_COB_KEYS K
+                               WHERE K.DATASET_NAME = T.DATASET_NAME
+                                 AND K.RAVEN_COBID = T.RAVEN_COBID
+                                 AND K.METADATA_VERSION = T.METADATA_VERSION
+                                 AND K.PARAMETERS_HASH = T.PARAMETERS_HASH)
+        """).collect()[0].as_dict()
+
+        # Resolve the folder and file patterns of the missing rows
+        insert_result = session.sql("""
+            INSERT INTO RAVEN.METADATA_STAGE_ME_PARAMETERS_COB (
+                RAVEN_COBID, DATASET_NAME, METADATA_VERSION, PARAMETERS_HASH, STAGE_NAME, FILE_PATH, FILE_NAME, FILE_NAME_NO_EXTENSION, FILE_EXTENSION,
+                SOURCE_FILE_NAME_PATTERN, CONTAINER_NAME, SOURCE_SYSTEM_CODE, SOURCE_FEED_CODE, IS_ENABLED, IS_TRIGGER_FILE, ALLOW_RELOAD, ENTITY_CODE,
+                DEPARTMENT_CODE, REGION, MARKET, STAGING_SCOPE_FIELDS, IS_CLOUD_COPY, EXPECTED_STAGE_TIME, WAREHOUSE_SIZE, ALLOW_INFER_SCHEMA, TAGS,
+                FOLDER_PATTERN_COB, FOLDER_PATH_COB, FILE_NAME_COB, FOLDER_PATTERN, REFRESH_TIMESTAMP, LOAD_STRATEGY, CLUSTER_BY_COBID)
+            WITH STAGE_ME_COB AS (
+                SELECT
+                    K.RAVEN_COBID,
+                    K.METADATA_VERSION,
+                    K.PARAMETERS_HASH,
+                    L.STAGE_NAME,
+                    L.SOURCE_FILE_NAME_PATTERN,
+                    P.DATASET_NAME, 
+                    P.CONTAINER_NAME, 
+                    P.FILE_PATH, 
+                    P.FILE_NAME,
+                    P.SOURCE_SYSTEM_CODE, 
+                    P.SOURCE_FEED_CODE, 
+                    P.IS_ENABLED, 
+                    P.IS_TRIGGER_FILE, 
+                    P.ALLOW_RELOAD, 
+                    P.ENTITY_CODE, 
+                    P.DEPARTMENT_CODE, 
+                    P.REGION, 
+                    P.MARKET,
+                    P.IS_CLOUD_COPY, 
+                    P.EXPECTED_STAGE_TIME,
+                    P.WAREHOUSE_SIZE,
+                    P.ALLOW_INFER_SCHEMA,
+                    P.TAGS,
+                    P.LOAD_STRATEGY,
+                    P.CLUSTER_BY_COBID
+                FROM RAVEN.TEMP_STAGE_ME_PARAMETERS_COB_KEYS    K
+                INNER JOIN RAVEN.METADATA_STAGE_ME_PARAMETERS   P ON P.DATASET_NAME = K.DATASET_NAME
+                INNER JOIN RAVEN.METADATA_LOAD_PLAN             L ON L.DATASET_NAME = K.DATASET_NAME
+                                                                 AND L.METADATA_VERSION = K.METADATA_VERSION
+                WHERE NOT EXISTS (SELECT 1 
+                                    FROM RAVEN.METADATA_STAGE_ME_PARAMETERS_COB T
+                                   WHERE T.DATASET_NAME = K.DATASET_NAME
+                                     AND T.RAVEN_COBID = K.RAVEN_COBID)
+            )
+            ,STAGE_LIST AS (
+            SELECT 
+                RAVEN_COBID,
+                METADATA_VERSION,
+                PARAMETERS_HASH,
+                STAGE_NAME,
+                DATASET_NAME,
+                FILE_PATH,
+                FILE_NAME,
+                REPLACE(FILE_NAME,'.'||SPLIT_PART(FILE_NAME,'.',-1),'')  AS FILE_NAME_NO_EXTENSION,
+                SPLIT_PART(FILE_NAME,'.',-1) AS FILE_EXTENSION,
+                CASE
+                    WHEN NULLIF(SOURCE_FILE_NAME_PATTERN,'') IS NOT NULL
+                        THEN SOURCE_FILE_NAME_PATTERN
+                    ELSE FILE_NAME
+                END AS SOURCE_FILE_NAME_PATTERN, 
+                CONTAINER_NAME, 
+                SOURCE_SYSTEM_CODE, 
+                SOURCE_FEED_CODE, 
+                IS_ENABLED, 
+                IS_TRIGGER_FILE, 
+                ALLOW_RELOAD, 
+                ENTITY_CODE, 
+                DEPARTMENT_CODE, 
+                REGION, 
+                MARKET,
+                TO_VARIANT(parse_json(TO_JSON(OBJECT_CONSTRUCT(
+                'ENTITY_CODE', ENTITY_CODE
+                ,'DEPARTMENT_CODE', DEPARTMENT_CODE
+                ,'REGION', REGION
+                ,'MARKET', MARKET
+                )))) AS STAGING_SCOPE_FIELDS,
+                IS_CLOUD_COPY, 
+                EXPECTED_STAGE_TIME,
+                WAREHOUSE_SIZE,
+                ALLOW_INFER_SCHEMA,
+                TAGS,
+                LOAD_STRATEGY,
+                CLUSTER_BY_COBID,
+                LISTAGG(IFF(VALUE LIKE ':%:', TO_CHAR(TO_DATE(RAVEN_COBID::VARCHAR,'YYYYMMDD'),REPLACE(VALUE,':','')), '.*/'), '') WITHIN GROUP (ORDER BY INDEX ASC) FOLDER_PATTERN_COB,
+                LISTAGG(IFF(VALUE LIKE ':%:', TO_CHAR(TO_DATE(RAVEN_COBID::VARCHAR,'YYYYMMDD'),REPLACE(VALUE,':','')), VALUE), '') WITHIN GROUP (ORDER BY INDEX ASC) FOLDER_PATH_COB
+            FROM STAGE_ME_COB SPLITTABLE, 
+            LATERAL STRTOK_SPLIT_TO_TABLE(IFF(LEFT(SPLITTABLE.FILE_PATH,1) != '/', '/','') || SPLITTABLE.FILE_PATH|| IFF(RIGHT(SPLITTABLE.FILE_PATH,1) != '/', '/',''), '|')
+            GROUP BY RAVEN_COBID,METADATA_VERSION,PARAMETERS_HASH,STAGE_NAME,SOURCE_FILE_NAME_PATTERN,DATASET_NAME,FILE_PATH,FILE_NAME,CONTAINER_NAME,SOURCE_SYSTEM_CODE,SOURCE_FEED_CODE, 
+                IS_ENABLED,IS_TRIGGER_FILE,ALLOW_RELOAD,ENTITY_CODE,DEPARTMENT_CODE,REGION,MARKET,IS_CLOUD_COPY,EXPECTED_STAGE_TIME,WAREHOUSE_SIZE,ALLOW_INFER_SCHEMA,TAGS,
+                LOAD_STRATEGY,CLUSTER_BY_COBID
+            )
+            SELECT
+                S.RAVEN_COBID, S.DATASET_NAME, S.METADATA_VERSION, S.PARAMETERS_HASH, S.STAGE_NAME, S.FILE_PATH, S.FILE_NAME, S.FILE_NAME_NO_EXTENSION, S.FILE_EXTENSION,
+                S.SOURCE_FILE_NAME_PATTERN, S.CONTAINER_NAME, S.SOURCE_SYSTEM_CODE, S.SOURCE_FEED_CODE, S.IS_ENABLED, S.IS_TRIGGER_FILE, S.ALLOW_RELOAD, S.ENTITY_CODE,
+                S.DEPARTMENT_CODE, S.REGION, S.MARKET, S.STAGING_SCOPE_FIELDS, S.IS_CLOUD_COPY, S.EXPECTED_STAGE_TIME, S.WAREHOUSE_SIZE, S.ALLOW_INFER_SCHEMA, S.TAGS,
+                S.FOLDER_PATTERN_COB,
+                S.FOLDER_PATH_COB,
+                RAVEN.FN_REPLACE_COB_PATTERN(S.FILE_NAME, S.RAVEN_COBID) FILE_NAME_COB,
+                CASE WHEN FILE_PATH LIKE '%YYYY%'
+                    THEN '.*' || SUBSTRING(FOLDER_PATTERN_COB,4,1000) 
+                    ELSE '.*' || IFF(CHARINDEX('/', FOLDER_PATH_COB) = 1, SUBSTRING(FOLDER_PATH_COB,2,1000), FOLDER_PATH_COB) 
+                END FOLDER_PATTERN,
+                CURRENT_TIMESTAMP() AS REFRESH_TIMESTAMP,
+                S.LOAD_STRATEGY,
+                S.CLUSTER_BY_COBID
+            FROM STAGE_LIST S
+        """).collect()[0].as_dict()
+
+        # File resolution index: container -> folder prefix -> file name pattern of every resolved row
+        delete_index_result = session.sql("""
+            DELETE FROM RAVEN.METADATA_FILE_RESOLUTION_INDEX I
+            WHERE NOT EXISTS (SELECT 1 
+                                FROM RAVEN.METADATA_STAGE_ME_PARAMETERS_COB T
+                               WHERE T.DATASET_NAME = I.DATASET_NAME
+                                 AND T.RAVEN_COBID = I.RAVEN_COBID
+                                 AND T.REFRESH_TIMESTAMP = I.SOURCE_REFRESH_TIMESTAMP)
+        """).collect()[0].as_dict()
+
+        insert_index_result = session.sql("""
+            INSERT INTO RAVEN.METADATA_FILE_RESOLUTION_INDEX (
+                RAVEN_COBID, CONTAINER_KEY, FOLDER_PREFIX, FILE_NAME_PREFIX, FILE_NAME_LIKE, DATASET_NAME, SOURCE_REFRESH_TIMESTAMP)
+            SELECT 
+                RAVEN_COBID,
+                IFNULL(NULLIF(CONTAINER_NAME,''), 'NO CONTAINER')                   AS CONTAINER_KEY,
+                UPPER(FOLDER_PATH_COB)                                              AS FOLDER_PREFIX,
+                -- Literal part of the pattern: before the first wildcard (% or _) or escape character (CHR(92), backslash)
+                IFNULL(REGEXP_SUBSTR(ARRAY_TO_STRING(SPLIT(UPPER(FILE_NAME_COB),'*'),'%'), '^[^%_' || CHR(92) || CHR(92) || ']*'), '') AS FILE_NAME_PREFIX,
+                ARRAY_TO_STRING(SPLIT(UPPER(FILE_NAME_COB),'*'),'%')                AS FILE_NAME_LIKE,
+                DATASET_NAME,
+                REFRESH_TIMESTAMP
+            FROM RAVEN.METADATA_STAGE_ME_PARAMETERS_COB T
+            WHERE NOT EXISTS (SELECT 1 
+                                FROM RAVEN.METADATA_FILE_RESOLUTION_INDEX I
+                               WHERE I.DATASET_NAME = T.DATASET_NAME
+                                 AND I.RAVEN_COBID = T.RAVEN_COBID)
+        """).collect()[0].as_dict()
+
+        return {"delete_result": delete_result, "insert_result": insert_result, 
+                "delete_index_result": delete_index_result, "insert_index_result": insert_index_result}
+
+    except:
+        exc_type, exc_value, exc_traceback = sys.exc_info()
+        raise exc_type(exc_value).with_traceback(exc_traceback)
+
+$$
+;
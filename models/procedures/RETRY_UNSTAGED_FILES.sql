@@ -1,45 +1,256 @@
+/**
+ * Retries the files listed in the data lake that were not staged (RAVEN.VW_LOG_UNSTAGED_FILES).
+ *
+ * @param COBID_START - First COB of the files to retry.
+ * @param COBID_END - Last COB of the files to retry.
+ * @param MAX_WORKERS - Maximum number of RAVEN.PY_STAGE_ME_BATCH calls running at the same time. If 0, DEFAULT_MAX_WORKERS.
+ *
+ * The files are resolved to datasets and grouped by (dataset, COB). Each group is staged by one asynchronous call of
+ * RAVEN.PY_STAGE_ME_BATCH, at most MAX_WORKERS groups at the same time.
+ * Files that keep failing are retried with exponential backoff (RAVEN.LOG_RETRY_UNSTAGED_FILE): after N failures the file
+ * waits BACKOFF_BASE_MINUTES * 2^(N-1) minutes, up to BACKOFF_MAX_MINUTES. A new version of the file resets the backoff.
+ * The summary of each run is saved in RAVEN.LOG_RETRY_UNSTAGED_FILES_RUN.
+ * Files are identified by CONTAINER_NAME and FILE_KEY, the normalized path also written in RAVEN.LOG_STAGE_ME_STATUS.
+ */
 CREATE OR REPLACE PROCEDURE RAVEN.RETRY_UNSTAGED_FILES(
-    "COBID_START" VARCHAR(16777216), 
-    "COBID_END" VARCHAR(16777216) )
+    "COBID_START" VARCHAR(16777216),
+    "COBID_END" VARCHAR(16777216),
+    "MAX_WORKERS" INT )
 RETURNS VARCHAR(16777216)
 LANGUAGE PYTHON
 RUNTIME_VERSION = '3.8'
 PACKAGES = ('snowflake-snowpark-python')
+IMPORTS = ('@RAVEN.INTSTAGE_RAVEN_FILES/models/shared/stage_me_log.py')
 HANDLER = 'run'
 EXECUTE AS caller
 AS
 $$
 
-from snowflake.snowpark.functions import col
+import json
+import time
+from datetime import timedelta
+from snowflake.snowpark.functions import col, parse_json, when_matched, when_not_matched
+from snowflake.snowpark.types import StructField, StructType, StringType, LongType, DoubleType, TimestampType
+from stage_me_log import file_key
 
-def run (session, cobid_start, cobid_end):
+DEFAULT_MAX_WORKERS = 8
+BACKOFF_BASE_MINUTES = 30
+BACKOFF_MAX_MINUTES = 1440
+POLL_INTERVAL_SECONDS = 1
+
+def sql_string(value):
+    """String literal for a SQL command"""
+    return "'" + str(value).replace("\\", "\\\\").replace("'", "''") + "'"
+
+def backoff_minutes(failure_count):
+    """Minutes to wait before the next retry of a file that failed failure_count times"""
+    return min(BACKOFF_BASE_MINUTES * 2 ** (failure_count - 1), BACKOFF_MAX_MINUTES)
+
+def dispatch_groups(session,groups,max_workers):
+    """
+    Calls RAVEN.PY_STAGE_ME_BATCH for each group as an asynchronous query (collect_nowait), at most max_workers at the same time
+
+    return Dictionary with the file (CONTAINER_NAME, FILE_PATH) as key and (STATUS, MESSAGE) as value
+
+    session: session connection
+    groups (List): List of files of each group. File: dictionary with CONTAINER_NAME, FOLDER_PATH, FILE_NAME and FILE_PATH
+    max_workers: Maximum number of calls running at the same time
+    """
+    event_trigger = '''{"EVENT_SOURCE": 'SNOWFLAKE Task'}'''
+    file_status = {}
+
+    def submit(group):
+        file_list = json.dumps([{"FILE_NAME": f["FILE_NAME"], "FOLDER_PATH": f["FOLDER_PATH"], "CONTAINER": f["CONTAINER_NAME"]} for f in group])
+        cmd_call = f"CALL RAVEN.PY_STAGE_ME_BATCH({sql_string(file_list)}, {sql_string(event_trigger)}, TRUE, '')"
+        return session.sql(cmd_call).collect_nowait()
+
+    def gather(group, job):
+        try:
+            batch_result = json.loads(job.result()[0][0])
+            file_results = {}
+            # A file matching more than one dataset is FAILED if one of the datasets failed
+            for r in batch_result["files"]:
+                file_path = file_key(r["FOLDER_PATH"] + "/" + r["FILE_NAME"])
+                status, message = file_results.get(file_path, ("SUCCESS", None))
+                file_results[file_path] = ("FAILED", str(r["MESSAGE"])) if r["STATUS"] == "FAILED" else (status, message)
+            for f in group:
+                file_status[(f["CONTAINER_NAME"], f["FILE_PATH"])] = file_results.get(f["FILE_PATH"], ("FAILED", "File not returned by RAVEN.PY_STAGE_ME_BATCH"))
+        except Exception as e:
+            for f in group:
+                file_status[(f["CONTAINER_NAME"], f["FILE_PATH"])] = ("FAILED", str(e))
+
+    pending = list(groups)
+    running = []
+    while pending or running:
+        while pending and len(running) < max_workers:
+            group = pending.pop(0)
+            try:
+                running.append((group, submit(group)))
+            except Exception as e:
+                file_status.update({(f["CONTAINER_NAME"], f["FILE_PATH"]): ("FAILED", str(e)) for f in group})
+
+        done = running if len(running) == 1 and not pending else [(group, job) for group, job in running if job.is_done()]
+        if not done:
+            time.sleep(POLL_INTERVAL_SECONDS)
+            continue
+
+        for group, job in list(done):
+            gather(group, job)
+            running.remove((group, job))
+
+    return file_status
+
+def save_backoff(session,attempted,file_status,backoff_state,attempt_timestamp):
+    """
+    Updates RAVEN.LOG_RETRY_UNSTAGED_FILE: staged files are removed, failed files get the next retry timestamp
+
+    session: session connection
+    attempted (List): Files retried in this run
+    file_status (Dictionary): Result of dispatch_groups
+    backoff_state (Dictionary): Current rows of RAVEN.LOG_RETRY_UNSTAGED_FILE of the files, (CONTAINER_NAME, FILE_PATH) as key
+    attempt_timestamp: Timestamp of the run
+    """
+    rows = []
+    for f in attempted:
+        key = (f["CONTAINER_NAME"], f["FILE_PATH"])
+        status, message = file_status[key]
+        state = backoff_state.get(key)
+        # The failure count restarts when the file changed in the data lake
+        failure_count = state["FAILURE_COUNT"] if state and state["BLOB_LAST_MODIFIED"] == f["BLOB_LAST_MODIFIED"] else 0
+        failure_count = failure_count + 1 if status == "FAILED" else 0
+        next_retry_timestamp = attempt_timestamp + timedelta(minutes=backoff_minutes(failure_count)) if failure_count else None
+        rows.append([f["CONTAINER_NAME"], f["FILE_PATH"], f["RAVEN_COBID"], f["DATASET_NAME"], f["BLOB_LAST_MODIFIED"], status,
+                     failure_count, attempt_timestamp, next_retry_timestamp, message])
+
+    if not rows:
+        return
+
+    schema = StructType([
+        StructField("CONTAINER_NAME", StringType()),
+        StructField("FILE_PATH", StringType()),
+        StructField("RAVEN_COBID", LongType()),
+        StructField("DATASET_NAME", StringType()),
+        StructField("BLOB_LAST_MODIFIED", TimestampType()),
+        StructField("STATUS", StringType()),
+        StructField("FAILURE_COUNT", LongType()),
+        StructField("LAST_ATTEMPT_TIMESTAMP", TimestampType()),
+        StructField("NEXT_RETRY_TIMESTAMP", TimestampType()),
+        StructField("LAST_EXCEPTION", StringType())
+    ])
+    source = session.create_dataframe(rows, schema=schema)
+    target = session.table("RAVEN.LOG_RETRY_UNSTAGED_FILE")
+
+    target.merge(source,
+        (target["CONTAINER_NAME"] == source["CONTAINER_NAME"]) & (target["FILE_PATH"] == source["FILE_PATH"]),
+        [when_matched(source["STATUS"] == "SUCCESS").delete(),
+         when_matched().update({
+            "RAVEN_COBID" : source["RAVEN_COBID"],
+            "DATASET_NAME" : source["DATASET_NAME"],
+            "BLOB_LAST_MODIFIED" : source["BLOB_LAST_MODIFIED"],
+            "FAILURE_COUNT" : source["FAILURE_COUNT"],
+            "LAST_ATTEMPT_TIMESTAMP" : source["LAST_ATTEMPT_TIMESTAMP"],
+            "NEXT_RETRY_TIMESTAMP" : source["NEXT_RETRY_TIMESTAMP"],
+            "LAST_EXCEPTION" : source["LAST_EXCEPTION"]}),
+         when_not_matched(source["STATUS"] == "FAILED").insert({
+            "CONTAINER_NAME" : source["CONTAINER_NAME"],
+            "FILE_PATH" : source["FILE_PATH"],
+            "RAVEN_COBID" : source["RAVEN_COBID"],
+            "DATASET_NAME" : source["DATASET_NAME"],
+            "BLOB_LAST_MODIFIED" : source["BLOB_LAST_MODIFIED"],
+            "FAILURE_COUNT" : source["FAILURE_COUNT"],
+            "LAST_ATTEMPT_TIMESTAMP" : source["LAST_ATTEMPT_TIMESTAMP"],
+            "NEXT_RETRY_TIMESTAMP" : source["NEXT_RETRY_TIMESTAMP"],
+            "LAST_EXCEPTION" : source["LAST_EXCEPTION"]})
+        ])
+
+def run (session, cobid_start, cobid_end, max_workers):
+    start_time = time.time()
+    start_timestamp = session.sql("SELECT current_timestamp() AS CURRENT_TIMESTAMP").collect()[0][0]
+    max_workers = int(max_workers) if max_workers else DEFAULT_MAX_WORKERS
 
     # Retry call
     sf_retry = session \
         .table("RAVEN.VW_LOG_UNSTAGED_FILES") \
-        .filter(col("RAVEN_COBID").between(cobid_start, cobid_end))
-
-    for row in sf_retry.collect():
-        file_name = row["FILE_NAME"]
-        folder_path = row["FOLDER_PATH"]
-        container_name = row["CONTAINER_NAME"]
-        event_trigger = '''{"EVENT_SOURCE": 'SNOWFLAKE Task'}'''
-        flag_create_table = False
-        flag_create_pipe = False
-        flag_create_csv_mapping = True
-        database_target = ""
-        
-        session.call(
-            "RAVEN.PY_STAGE_ME",
-            file_name, 
-            folder_path,
-            container_name,
-            event_trigger,
-            flag_create_table,
-            flag_create_pipe,
-            flag_create_csv_mapping,
-            database_target)
-            
-            
+        .filter(col("RAVEN_COBID").between(cobid_start, cobid_end)) \
+        .select("RAVEN_COBID", "CONTAINER_NAME", "FOLDER_PATH", "FILE_NAME", "FILE_KEY", "BLOB_LAST_MODIFIED") \
+        .distinct() \
+        .collect()
+
+    files = [{
+        "CONTAINER_NAME": row["CONTAINER_NAME"],
+        "FOLDER_PATH": row["FOLDER_PATH"],
+        "FILE_NAME": row["FILE_NAME"],
+        "FILE_PATH": row["FILE_KEY"],
+        "RAVEN_COBID": row["RAVEN_COBID"],
+        "BLOB_LAST_MODIFIED": row["BLOB_LAST_MODIFIED"],
+        "DATASET_NAME": None
+        } for row in sf_retry]
+
+    summary = {"candidate": len(files), "attempted": 0, "succeeded": 0, "failed": 0, "skipped_no_dataset": 0, "skipped_backoff": 0, "groups": 0}
+    if files:
+        # Resolve all files in one query, files without dataset are not retried
+        file_list_json = json.dumps([{"CONTAINER_NAME": f["CONTAINER_NAME"], "FILE_PATH": f["FILE_PATH"]} for f in files]).replace("'", "''")
+        sf_resolved = session.sql(f"""SELECT CONTAINER_NAME, FILE_PATH, MIN(DATASET_NAME) AS DATASET_NAME
+                                       FROM TABLE(RAVEN.FN_RESOLVE_FILE_DATASETS(PARSE_JSON('{file_list_json}')::ARRAY))
+                                      WHERE DATASET_NAME IS NOT NULL
+                                   GROUP BY CONTAINER_NAME, FILE_PATH""").collect()
+        resolved_files = {(r["CONTAINER_NAME"], r["FILE_PATH"]): r["DATASET_NAME"] for r in sf_resolved}
+
+        # Backoff of the files that failed before
+        backoff_state = {(r["CONTAINER_NAME"], r["FILE_PATH"]): r for r in session.table("RAVEN.LOG_RETRY_UNSTAGED_FILE") \
+            .filter(col("RAVEN_COBID").between(cobid_start, cobid_end)) \
+            .collect()}
+
+        groups = {}
+        attempted = []
+        for f in files:
+            key = (f["CONTAINER_NAME"], f["FILE_PATH"])
+            if key not in resolved_files:
+                summary["skipped_no_dataset"] += 1
+                continue
+            state = backoff_state.get(key)
+            if state and state["BLOB_LAST_MODIFIED"] == f["BLOB_LAST_MODIFIED"] and state["NEXT_RETRY_TIMESTAMP"] > start_timestamp:
+                summary["skipped_backoff"] += 1
+                continue
+            f["DATASET_NAME"] = resolved_files[key]
+            groups.setdefault((f["DATASET_NAME"], f["RAVEN_COBID"]), []).append(f)
+            attempted.append(f)
+
+        # Stage the groups at the same time
+        file_status = dispatch_groups(session, list(groups.values()), max_workers)
+        save_backoff(session, attempted, file_status, backoff_state, start_timestamp)
+
+        summary["groups"] = len(groups)
+        summary["attempted"] = len(attempted)
+        summary["succeeded"] = len([s for s, m in file_status.values() if s == "SUCCESS"])
+        summary["failed"] = len([s for s, m in file_status.values() if s == "FAILED"])
+
+    summary["elapsed_seconds"] = round(time.time() - start_time, 3)
+
+    # Run summary
+    end_timestamp = session.sql("SELECT current_timestamp() AS CURRENT_TIMESTAMP").collect()[0][0]
+    schema = StructType([
+        StructField("COBID_START", LongType()),
+        StructField("COBID_END", LongType()),
+        StructField("MAX_WORKERS", LongType()),
+        StructField("START_TIMESTAMP", TimestampType()),
+        StructField("END_TIMESTAMP", TimestampType()),
+        StructField("ELAPSED_SECONDS", DoubleType()),
+        StructField("FILES_CANDIDATE", LongType()),
+        StructField("FILES_ATTEMPTED", LongType()),
+        StructField("FILES_SUCCEEDED", LongType()),
+        StructField("FILES_FAILED", LongType()),
+        StructField("FILES_SKIPPED", LongType()),
+        StructField("GROUPS_DISPATCHED", LongType()),
+        StructField("RUN_DETAIL", StringType())
+    ])
+    session.create_dataframe([[int(cobid_start), int(cobid_end), max_workers, start_timestamp, end_timestamp, summary["elapsed_seconds"],
+                               summary["candidate"], summary["attempted"], summary["succeeded"], summary["failed"],
+                               summary["skipped_no_dataset"] + summary["skipped_backoff"], summary["groups"], json.dumps(summary)]], schema=schema) \
+        .with_column("RUN_DETAIL", parse_json(col("RUN_DETAIL"))) \
+        .write.mode("append").save_as_table("RAVEN.LOG_RETRY_UNSTAGED_FILES_RUN", column_order="name")
+
+    return json.dumps(summary)
+
 $$
 ;
@@ -0,0 +1,109 @@
+"""
+Catalog cache shared by the staging procedures.
+
+The module is uploaded by the build to @RAVEN.INTSTAGE_RAVEN_FILES/models/shared/ and loaded by the procedures with
+IMPORTS = ('@RAVEN.INTSTAGE_RAVEN_FILES/models/shared/catalog_cache.py').
+
+Each catalog (file formats, warehouses, stages, table columns) is fetched once, in bulk, the first time one of its
+entries is requested. The next lookups are served from memory. The hit/miss counters are reported in PROCESS_RESULT
+so the saved round trips can be seen in RAVEN.LOG_STAGE_ME_STATUS.
+"""
+
+
+class CatalogCache:
+
+    def __init__(self, session):
+        self.session = session
+        self.catalogs = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get_catalog(self, key: tuple, loader):
+        """
+        Returns the catalog of the key, loading it with loader() if it is not in the cache.
+        """
+        if key in self.catalogs:
+            self.hits += 1
+        else:
+            self.misses += 1
+            self.catalogs[key] = loader()
+        return self.catalogs[key]
+
+    def invalidate(self, catalog: str = None):
+        """
+        Removes a catalog (FILE_FORMATS, WAREHOUSES, STAGES, COLUMNS) from the cache, or every catalog if catalog is None.
+        Use it after creating or altering the objects of the catalog.
+        """
+        self.catalogs = {key: value for key, value in self.catalogs.items() if catalog is not None and key[0] != catalog}
+
+    def stats(self) -> dict:
+        """Hit/miss counters, reported in PROCESS_RESULT."""
+        return {"hits": self.hits, "misses": self.misses, "catalogs": [".".join([str(k) for k in key]) for key in self.catalogs]}
+
+    def file_format(self, file_format_name: str, schema: str = "RAVEN"):
+        """
+        Row of INFORMATION_SCHEMA.FILE_FORMATS of the file format, None if not found.
+        All the file formats of the schema are fetched with one query.
+        """
+        file_formats = self.get_catalog(("FILE_FORMATS", schema.upper()), lambda: {
+            r["FILE_FORMAT_NAME"]: r for r in self.session.table("INFORMATION_SCHEMA.FILE_FORMATS")
+                .filter(f"FILE_FORMAT_SCHEMA = '{schema.upper()}'")
+                .collect()})
+        return file_formats.get(file_format_name.split(".")[-1].upper())
+
+    def warehouse_name(self, database_name: str, size: str) -> str:
+        """
+        Base on the size and database name, finds the warehouse name.
+        The warehouses are fetched with one SHOW WAREHOUSES per database.
+
+        database_name: database destination for the file
+        size: Value configured in the metadata STAGE_ME_PARAMETERS. If empty, the default value it is XS
+        """
+        # Get first and second part of the database name
+        arr_db_name = database_name.split("_")
+        wh_like = arr_db_name[0] + "%" + arr_db_name[1]
+
+        warehouses = self.get_catalog(("WAREHOUSES", wh_like), lambda: [
+            {"name": r["name"], "size": r["size"], "is_current": r["is_current"]}
+            for r in self.session.sql(f"SHOW WAREHOUSES LIKE '%{wh_like}_%'").collect()])
+
+        # Filter by size from metadata value. If does not return anything, use current connect WH
+        size = size if size else 'X-Small'
+        wh_list = [r["name"] for r in warehouses if r["size"] == size] or [r["name"] for r in warehouses if r["is_current"] == 'Y']
+
+        return wh_list[0]
+
+    def stage(self, stage_name: str, schema: str = "RAVEN"):
+        """
+        Row of SHOW STAGES of the stage as dictionary, None if the stage does not exist.
+        All the stages of the schema are fetched with one SHOW STAGES.
+
+        stage_name: Stage name, with or without schema (<schema>.<stage>)
+        """
+        if "." in stage_name:
+            schema, stage_name = stage_name.split(".")[-2:]
+        stages = self.get_catalog(("STAGES", schema.upper()), lambda: {
+            r["name"]: r.as_dict() for r in self.session.sql(f"SHOW STAGES IN SCHEMA {schema.upper()}").collect()})
+        return stages.get(stage_name.upper())
+
+    def stage_url(self, stage_name: str) -> str:
+        """URL of the stage, without brackets and quotes (same value as the property URL of DESC STAGE)."""
+        stage = self.stage(stage_name)
+        return (stage["url"] or "").translate({ord(i): None for i in '[]"'}) if stage else None
+
+    def table_columns(self, table_name: str) -> list:
+        """
+        Column names (upper case, between double quotes) of the table ordered by position. Empty list if the table does not exist.
+        The columns of every table of the database are fetched with one query.
+
+        table_name: <database>.<schema>.<table>
+        """
+        database_name = table_name.split(".")[0].upper()
+        columns = self.get_catalog(("COLUMNS", database_name), lambda: {
+            r["TABLE_NAME"]: r["LIST_COLUMN_NAME"].split(",")
+            for r in self.session.sql(f""" SELECT UPPER(CONCAT_WS('.',TABLE_CATALOG,TABLE_SCHEMA,TABLE_NAME)) TABLE_NAME,
+                                                  listagg('"'||UPPER(COLUMN_NAME)||'"', ',') within group (order by ORDINAL_POSITION ASC) LIST_COLUMN_NAME
+                                             FROM {database_name}.INFORMATION_SCHEMA."COLUMNS"
+                                         GROUP BY TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME
+                                      """).collect()})
+        return columns.get(table_name.upper(), [])
@@ -0,0 +1,56 @@
+"""
+RAVEN_COBID expression of the COPY statements shared by the staging procedures.
+
+The module is uploaded by the build to @RAVEN.INTSTAGE_RAVEN_FILES/models/shared/ and loaded by the procedures with
+IMPORTS = ('@RAVEN.INTSTAGE_RAVEN_FILES/models/shared/copy_cob.py').
+
+The COPY templates select COB_PLACEHOLDER AS RAVEN_COBID. When the files of the COPY are listed before it runs, the COB of
+each file is found once in Python and the placeholder is replaced by a literal (one COB in the pattern) or by a lookup on
+metadata$filename, instead of RAVEN.FN_FIND_COB running a regular expression for every row. Snowpipe definitions do not know
+their files and keep RAVEN.FN_FIND_COB (FIND_COB_EXPRESSION).
+"""
+import re
+
+COB_PLACEHOLDER = "|:RAVEN_COBID:|"
+
+# Per row COB of the file, for Snowpipe and the files not listed
+FIND_COB_EXPRESSION = "RAVEN.FN_FIND_COB(metadata$filename)"
+
+# Same rule as RAVEN.FN_FIND_COB: 8 digits between non word characters
+COB_PATTERN = re.compile(r"(?:^|\W)(\d{8})(?=\W|$)")
+
+# Above this number of files the lookup is not written in the COPY
+MAX_COB_LOOKUP_FILES = 1000
+
+
+def file_cob(file_path: str) -> int:
+    """COB of the file path (first 8 digits between non word characters), None if there is no COB."""
+    match = COB_PATTERN.search(file_path or "")
+    return int(match.group(1)) if match else None
+
+
+def cob_expression(file_paths: list, pattern: str = None) -> str:
+    """
+    RAVEN_COBID expression of a COPY of the listed files
+
+    - one COB, and the COPY reads only these files (FILES option) or its pattern contains the COB: the COB as a literal
+    - otherwise: CASE on metadata$filename with the COB of each file, RAVEN.FN_FIND_COB for a file not listed
+      (arrived after the LIST) or when there are more than MAX_COB_LOOKUP_FILES files
+
+    file_paths: Paths of the files relative to the stage (as metadata$filename)
+    pattern: Pattern of the COPY, None when the COPY reads the files listed in its FILES option
+    """
+    file_cobs = {path: file_cob(path) for path in file_paths}
+    cobs = set(file_cobs.values())
+    if len(cobs) == 1 and None not in cobs and (pattern is None or str(next(iter(cobs))) in pattern):
+        return str(next(iter(cobs)))
+    if not file_cobs or len(file_cobs) > MAX_COB_LOOKUP_FILES:
+        return FIND_COB_EXPRESSION
+
+    # One WHEN per COB
+    cob_files = {}
+    for path, cob in file_cobs.items():
+        cob_files.setdefault(cob, []).append("'" + path.replace("'", "''") + "'")
+    whens = " ".join(f"WHEN metadata$filename IN ({','.join(paths)}) THEN {cob if cob is not None else 'NULL'}"
+                     for cob, paths in cob_files.items())
+    return f"CASE {whens} ELSE {FIND_COB_EXPRESSION} END"
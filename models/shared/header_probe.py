@@ -0,0 +1,212 @@
+"""
+Header probe and header mapping cache shared by the staging procedures.
+
+The module is uploaded by the build to @RAVEN.INTSTAGE_RAVEN_FILES/models/shared/ and loaded by the procedures with
+IMPORTS = ('@RAVEN.INTSTAGE_RAVEN_FILES/models/shared/header_probe.py').
+
+probe_header reads only the first HEADER_PROBE_BYTES of one staged file (gzip files are decompressed on the fly) instead of
+scanning the files of the pattern with a warehouse query, probe_text reads a bounded sample of the file the same way. HeaderMappingCache keeps the CSV mappings already built in
+RAVEN.METADATA_CSV_HEADER_MAPPING, keyed by (DATASET_NAME, HEADER_HASH, METADATA_VERSION): a file with a known header
+reuses the mapping and a change of the metadata (new METADATA_VERSION) builds a new one.
+"""
+import codecs
+import hashlib
+import json
+import zlib
+
+from snowflake.snowpark.files import SnowflakeFile
+from snowflake.snowpark.functions import current_timestamp, lit, parse_json, when_matched, when_not_matched
+from snowflake.snowpark.types import LongType, StringType, StructField, StructType
+
+HEADER_PROBE_BYTES = 8192
+
+# Byte order marks, UTF-8 is checked first
+BOMS = [(codecs.BOM_UTF8, "utf-8"), (codecs.BOM_UTF16_LE, "utf-16-le"), (codecs.BOM_UTF16_BE, "utf-16-be")]
+
+# ENCODING of RAVEN.TEXT_FORMAT_NO_HEADER, used by the query reading the header when the file can't be probed
+QUERY_HEADER_ENCODING = "windows-1252"
+
+GZIP_MAGIC = b"\x1f\x8b"
+
+
+def strip_bom(text: str) -> str:
+    """Removes the BOM character at the beginning of the decoded text."""
+    return text[1:] if text.startswith("\ufeff") else text
+
+
+def decode_query_header(header: str, encoding: str = QUERY_HEADER_ENCODING) -> str:
+    """
+    Header returned by the query on the stage, decoded with the encoding of the file. The query decodes the bytes as single
+    byte characters (encoding): when the bytes start with a BOM they are decoded with the encoding of the BOM and the BOM
+    is removed, otherwise the header is kept as decoded by the query.
+    """
+    data = bytearray()
+    for c in header:
+        try:
+            data += c.encode(encoding)
+        except UnicodeEncodeError:
+            # Bytes not defined by the encoding are returned as the character of the same code
+            data += c.encode("latin-1", errors="replace")
+    for bom, bom_encoding in BOMS:
+        if data.startswith(bom):
+            return data[len(bom):].decode(bom_encoding, errors="replace")
+    return header
+
+
+def decode_bytes(data: bytes) -> str:
+    """
+    Text of the first bytes of a file. Gzip data is decompressed, the encoding is taken from the BOM (UTF-8 when there is
+    no BOM) and the BOM is removed. A character cut at the end of the bytes is replaced.
+    """
+    if data.startswith(GZIP_MAGIC):
+        data = zlib.decompressobj(zlib.MAX_WBITS | 32).decompress(data)
+
+    encoding = "utf-8"
+    for bom, bom_encoding in BOMS:
+        if data.startswith(bom):
+            data, encoding = data[len(bom):], bom_encoding
+            break
+    if encoding.startswith("utf-16"):
+        data = data[:len(data) - len(data) % 2]
+
+    return data.decode(encoding, errors="replace")
+
+
+def decode_header(data: bytes) -> str:
+    """
+    First line of the file from its first bytes (see decode_bytes), None if the line is longer than the bytes read.
+    """
+    text = decode_bytes(data)
+    lines = text.splitlines()
+    if not lines or (len(lines) == 1 and not text.endswith(("\n", "\r"))):
+        return None
+    return lines[0]
+
+
+def header_hash(header: str, delimiter: str) -> str:
+    """Hash of the header line and the field delimiter (the same line split by another delimiter is another layout)."""
+    return hashlib.sha256(f"{delimiter}\x00{header.strip()}".encode("utf-8")).hexdigest()
+
+
+def stage_file_path(stage_name: str, file_url: str, stage_url: str) -> str:
+    """
+    @<stage>/<path> of a file returned by LIST
+
+    file_url: Name returned by LIST (URL of the file for external stages, <stage>/<path> for internal stages)
+    stage_url: URL of the stage, empty for internal stages
+    """
+    if stage_url and file_url.startswith(stage_url):
+        path = file_url[len(stage_url):].lstrip("/")
+    else:
+        path = file_url.split("/", 1)[-1]
+    return f"@{stage_name}/{path}"
+
+
+def probe_header(stage_file: str) -> str:
+    """
+    Header of the staged file reading only its first HEADER_PROBE_BYTES bytes. None if the header is longer.
+
+    stage_file: @<stage>/<path> of the file
+    """
+    with SnowflakeFile.open(stage_file, "rb", require_scoped_url=False) as f:
+        return decode_header(f.read(HEADER_PROBE_BYTES))
+
+
+def probe_text(stage_file: str, max_bytes: int) -> tuple:
+    """
+    Text of the first max_bytes bytes of the staged file (see decode_bytes) and True if the file is longer
+    (the last line of the text can be cut).
+
+    stage_file: @<stage>/<path> of the file
+    """
+    with SnowflakeFile.open(stage_file, "rb", require_scoped_url=False) as f:
+        data = f.read(max_bytes + 1)
+    return decode_bytes(data[:max_bytes]), len(data) > max_bytes
+
+
+class HeaderMappingCache:
+
+    def __init__(self, session):
+        self.session = session
+        self.mappings = {}
+        self.loaded = set()
+        self.new_mappings = {}
+        self.hit_counts = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, dataset_name: str, header_hash: str, metadata_version: str):
+        """
+        Mapping of the header (dict with source_columns, target_columns and source_seq), None if it is not cached.
+        The mappings of the dataset and metadata version are read with one query the first time.
+        """
+        if (dataset_name, metadata_version) not in self.loaded:
+            self.loaded.add((dataset_name, metadata_version))
+            for r in self.session.table("RAVEN.METADATA_CSV_HEADER_MAPPING") \
+                    .filter(f"DATASET_NAME = '{dataset_name}' AND METADATA_VERSION = '{metadata_version}'") \
+                    .select("HEADER_HASH", "MAPPING") \
+                    .collect():
+                self.mappings[(dataset_name, r["HEADER_HASH"], metadata_version)] = json.loads(r["MAPPING"])
+
+        key = (dataset_name, header_hash, metadata_version)
+        if key in self.mappings:
+            self.hits += 1
+            self.hit_counts[key] = self.hit_counts.get(key, 0) + 1
+            return self.mappings[key]
+        self.misses += 1
+        return None
+
+    def put(self, dataset_name: str, header_hash: str, metadata_version: str, csv_header: str, mapping: dict):
+        """Adds a mapping built for a new header. It is saved by flush."""
+        key = (dataset_name, header_hash, metadata_version)
+        self.mappings[key] = mapping
+        self.new_mappings[key] = (csv_header, mapping)
+
+    def stats(self) -> dict:
+        """Hit/miss counters, reported in PROCESS_RESULT."""
+        return {"hits": self.hits, "misses": self.misses}
+
+    def flush(self):
+        """
+        Saves the new mappings and adds the hits of the call to HIT_COUNT with one MERGE
+        """
+        keys = list(self.new_mappings) + [key for key in self.hit_counts if key not in self.new_mappings]
+        if not keys:
+            return
+
+        schema = StructType([
+            StructField("DATASET_NAME", StringType()),
+            StructField("HEADER_HASH", StringType()),
+            StructField("METADATA_VERSION", StringType()),
+            StructField("CSV_HEADER", StringType()),
+            StructField("MAPPING", StringType()),
+            StructField("HITS", LongType())
+        ])
+        rows = []
+        for key in keys:
+            csv_header, mapping = self.new_mappings.get(key, (None, None))
+            rows.append(list(key) + [csv_header, json.dumps(mapping) if mapping else None, self.hit_counts.get(key, 0)])
+        source = self.session.create_dataframe(rows, schema=schema)
+
+        target = self.session.table("RAVEN.METADATA_CSV_HEADER_MAPPING")
+        target.merge(source,
+            (target["DATASET_NAME"] == source["DATASET_NAME"]) &
+            (target["HEADER_HASH"] == source["HEADER_HASH"]) &
+            (target["METADATA_VERSION"] == source["METADATA_VERSION"])
+            ,
+            [when_matched(source["HITS"] > 0).update({
+                "HIT_COUNT" : target["HIT_COUNT"] + source["HITS"],
+                "LAST_HIT_TIMESTAMP" : current_timestamp()
+                }),
+            when_not_matched(source["MAPPING"].is_not_null()).insert({
+                "DATASET_NAME" : source["DATASET_NAME"],
+                "HEADER_HASH" : source["HEADER_HASH"],
+                "METADATA_VERSION" : source["METADATA_VERSION"],
+                "CSV_HEADER" : source["CSV_HEADER"],
+                "MAPPING" : parse_json(source["MAPPING"]),
+                "HIT_COUNT" : lit(0),
+                "CREATED_TIMESTAMP" : current_timestamp()
+                })
+            ])
+        self.new_mappings = {}
+        self.hit_counts = {}
@@ -0,0 +1,52 @@
+"""
+Search columns of the staging log shared by the staging procedures.
+
+The module is uploaded by the build to @RAVEN.INTSTAGE_RAVEN_FILES/models/shared/ and loaded by the procedures with
+IMPORTS = ('@RAVEN.INTSTAGE_RAVEN_FILES/models/shared/stage_me_log.py').
+
+FILE_KEY, CONTAINER_NAME and FAILURE_REASON are written with each event of RAVEN.LOG_STAGE_ME_STATUS_EVENT so
+RAVEN.VW_LOG_UNSTAGED_FILES can compare plain columns instead of parsing PROCESS_PARAMETERS and PROCESS_RESULT.
+The same rules are applied in SQL by RAVEN.BACKFILL_LOG_STAGE_ME_STATUS_KEYS for the rows logged before the columns existed.
+"""
+import re
+
+# Classified exceptions, first match wins. Files failed with one of them are not retried until they are modified again
+FAILURE_REASONS = [
+    ("NO_METADATA", re.compile("There is no metadata for the folder/file")),
+    ("OBJECT_NOT_FOUND", re.compile("Object.*does not exist or not authorized", re.DOTALL)),
+    ("SQL_COMPILATION_ERROR", re.compile("SQL compilation error"))
+]
+
+
+def file_key(file_path: str) -> str:
+    """
+    Normalized path of the file: without "/" at the beginning and end and without repeated "/".
+    Same value as TRIM(REGEXP_REPLACE(<file_path>,'/+','/'),'/') in SQL.
+    """
+    return "/".join(filter(None, file_path.split("/"))) if file_path else None
+
+
+def failure_reason(process_status: str, exception: str) -> str:
+    """
+    Class of the exception of a failed process (see FAILURE_REASONS), OTHER if it is not classified.
+    None for processes not failed.
+    """
+    if process_status != "FAILED":
+        return None
+    return next((reason for reason, pattern in FAILURE_REASONS if pattern.search(exception or "")), "OTHER")
+
+
+def log_keys(process_parameters: dict, process_status: str, process_result: dict) -> dict:
+    """
+    FILE_KEY, CONTAINER_NAME and FAILURE_REASON of a log record.
+
+    process_parameters (Dictionary): PROCESS_PARAMETERS of the log (file_stage_me and container_name)
+    process_status: PROCESS_STATUS of the log
+    process_result (Dictionary): PROCESS_RESULT of the log (exception)
+    """
+    process_parameters = process_parameters or {}
+    return {
+        "FILE_KEY": file_key(process_parameters.get("file_stage_me")),
+        "CONTAINER_NAME": process_parameters.get("container_name"),
+        "FAILURE_REASON": failure_reason(process_status, (process_result or {}).get("exception"))
+    }
@@ -0,0 +1,262 @@
+"""
+Type inference of delimited files shared by the staging procedures.
+
+The module is uploaded by the build to @RAVEN.INTSTAGE_RAVEN_FILES/models/shared/ and loaded by the procedures with
+IMPORTS = ('@RAVEN.INTSTAGE_RAVEN_FILES/models/shared/type_inference.py').
+
+The sample is read as text (every value is a string) and each column gets the first type of TYPE_PATTERNS that accepts
+all its non-empty values, TEXT otherwise. Empty values are not checked: they are loaded as NULL (NULLIF($n,'') in the COPY).
+The checks run on whole columns with the pandas string methods.
+
+RAVEN.CSV_METADATA_GENERATOR uses the SOURCE_FIELD profile: reservoir_sample keeps a uniform sample of a configurable number
+of rows across the chunks of one or several files, profile_columns types each column with the DATE_INPUT_FORMAT and
+TIMESTAMP_INPUT_FORMAT of the feed (DATE, DATETIME) and sizes VARCHAR lengths and NUMERIC precision/scale from the values.
+The checks run on the distinct values of each column, so a large sample with repeated values costs little more than a small one.
+"""
+import csv
+import io
+import re
+
+import numpy as np
+import pandas as pd
+
+# Checked in order, the first type matching every non-empty value of the column is used
+TYPE_PATTERNS = [
+    ("BOOLEAN", r"(?i:true|false)"),
+    ("NUMBER", r"[+-]?\d+(?:\.\d+)?"),
+    ("FLOAT", r"[+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?"),
+    ("DATE", r"\d{4}-\d{2}-\d{2}"),
+    ("TIMESTAMP_NTZ", r"\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}:\d{2}(?:\.\d{1,9})?")
+]
+NUMBER_MAX_PRECISION = 38
+
+
+def read_sample(text: str, delimiter: str, max_rows: int, truncated: bool = False) -> pd.DataFrame:
+    """
+    Rows of a delimited text as strings, with the first line as column names.
+
+    text: Beginning of the file (see header_probe.probe_text)
+    delimiter: Field delimiter of the file format
+    max_rows: Maximum number of rows read after the header
+    truncated: True when the text is the beginning of a longer file, the last line (it can be cut) is dropped
+    """
+    if truncated:
+        text = text[:text.rfind("\n") + 1]
+    df = pd.read_csv(io.StringIO(text), sep=delimiter, header=None, dtype=str, keep_default_na=False,
+                     nrows=max_rows + 1, engine="python" if len(delimiter) > 1 else "c")
+    if df.empty:
+        return df
+    # Header taken as a row so duplicated names are not renamed by pandas
+    df.columns = [str(name).strip() for name in df.iloc[0]]
+    return df.iloc[1:].reset_index(drop=True)
+
+
+def infer_column_type(values: pd.Series) -> str:
+    """Snowflake type of a column of string values."""
+    values = values.str.strip()
+    values = values[values != ""]
+    if values.empty:
+        return "TEXT"
+
+    for data_type, pattern in TYPE_PATTERNS:
+        if not values.str.fullmatch(pattern).all():
+            continue
+        if data_type == "NUMBER":
+            scale = values.str.extract(r"\.(\d+)$")[0].str.len().max()
+            scale = 0 if pd.isna(scale) else int(scale)
+            integer_digits = values.str.replace(r"^[+-]|\.\d+$", "", regex=True).str.lstrip("0").str.len().max()
+            if integer_digits + scale > NUMBER_MAX_PRECISION:
+                continue
+            return f"NUMBER({NUMBER_MAX_PRECISION}, {scale})"
+        return data_type
+
+    return "TEXT"
+
+
+def infer_types(df_sample: pd.DataFrame) -> list:
+    """
+    Type of each column of the sample (see read_sample)
+
+    return List of dictionaries with COLUMN_NAME, POSITION (1 based) and TYPE, in the file order
+    """
+    return [{"COLUMN_NAME": name, "POSITION": position + 1, "TYPE": infer_column_type(df_sample.iloc[:, position])}
+            for position, name in enumerate(df_sample.columns)]
+
+
+# Delimiters tried by sniff_delimiter
+DELIMITERS = ",|;\t"
+
+# Checked in order after the date formats of the feed
+PROFILE_PATTERNS = [
+    ("BOOLEAN", r"(?i:true|false|yes|no)"),
+    ("NUMERIC", r"[+-]?\d+(?:\.\d+)?"),
+    ("FLOAT", r"[+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?")
+]
+
+# VARCHAR lengths used by the profile: the smallest step holding VARCHAR_HEADROOM times the longest value of the sample
+VARCHAR_LENGTHS = [10, 50, 100, 200, 500, 1000, 4000, 16777216]
+VARCHAR_HEADROOM = 1.5
+
+# Values checked first against each type, a column is checked whole only when they all match
+PROFILE_PREFILTER_ROWS = 100
+
+# Integer digits added to the largest value of the sample (the file can hold larger values than the sample)
+NUMERIC_HEADROOM_DIGITS = 4
+
+# Regular expression of each element of a Snowflake date/time format (longest element first)
+FORMAT_ELEMENTS = [
+    ("YYYY", r"\d{4}"),
+    ("YY", r"\d{2}"),
+    ("MMMM", r"(?i:january|february|march|april|may|june|july|august|september|october|november|december)"),
+    ("MON", r"(?i:jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)"),
+    ("MM", r"(?:0?[1-9]|1[0-2])"),
+    ("DD", r"(?:0?[1-9]|[12]\d|3[01])"),
+    ("DY", r"(?i:mon|tue|wed|thu|fri|sat|sun)"),
+    ("HH24", r"(?:[01]?\d|2[0-3])"),
+    ("HH12", r"(?:0?[1-9]|1[0-2])"),
+    ("HH", r"(?:[01]?\d|2[0-3])"),
+    ("MI", r"[0-5]\d"),
+    ("SS", r"[0-5]\d"),
+    ("AM", r"(?i:am|pm)"),
+    ("PM", r"(?i:am|pm)"),
+    ("TZH", r"[+-]\d{2}"),
+    ("TZM", r"\d{2}")
+]
+FORMAT_ELEMENT_PATTERN = re.compile("FF\\d?|" + "|".join(element for element, _ in FORMAT_ELEMENTS), re.IGNORECASE)
+
+
+def format_pattern(snowflake_format: str) -> str:
+    """
+    Regular expression of the values of a Snowflake date/time format (DATE_INPUT_FORMAT, TIMESTAMP_INPUT_FORMAT).
+    The fraction of seconds (.FF<n>) is optional, as it is for TO_TIMESTAMP.
+    """
+    elements = dict(FORMAT_ELEMENTS)
+    parts, position = [], 0
+    for match in FORMAT_ELEMENT_PATTERN.finditer(snowflake_format):
+        parts.append(re.escape(snowflake_format[position:match.start()]))
+        element = match.group(0).upper()
+        if element.startswith("FF"):
+            # ".FF3" matches "", ".1" ... ".123456789"
+            if parts[-1].endswith(re.escape(".")):
+                parts[-1] = parts[-1][:-len(re.escape("."))]
+            parts.append(r"(?:\.\d{1,9})?")
+        else:
+            parts.append(elements[element])
+        position = match.end()
+    parts.append(re.escape(snowflake_format[position:]))
+    return "".join(parts)
+
+
+def sniff_delimiter(text: str, delimiters: str = DELIMITERS) -> str:
+    """
+    Field delimiter of a delimited text (beginning of the file). csv.Sniffer checks the delimiters on the first lines,
+    when it cannot decide the delimiter found most times in the header is used.
+    """
+    lines = text.splitlines()[:50]
+    try:
+        return csv.Sniffer().sniff("\n".join(lines), delimiters=delimiters).delimiter
+    except csv.Error:
+        header = lines[0] if lines else ""
+        return max(delimiters, key=header.count)
+
+
+def reservoir_sample(chunks, max_rows: int, seed: int = None) -> pd.DataFrame:
+    """
+    Uniform sample of max_rows rows of all the chunks (reservoir sampling, one pass, memory of max_rows rows).
+
+    chunks: Iterable of pandas dataframes of strings (chunks of one or several files with the same header).
+            Columns are aligned by name with the first chunk, columns missing in a file are empty
+    max_rows: Row budget of the sample
+    seed: Seed of the random generator, the same files and seed give the same sample
+    """
+    rng = np.random.default_rng(seed)
+    columns, reservoir, rows_seen = None, None, 0
+    for chunk in chunks:
+        if columns is None:
+            columns = list(chunk.columns)
+            reservoir = np.empty((max_rows, len(columns)), dtype=object)
+        values = chunk.reindex(columns=columns, fill_value="").to_numpy(dtype=object)
+
+        # Rows filling the reservoir
+        fill = min(max(max_rows - rows_seen, 0), len(values))
+        reservoir[rows_seen:rows_seen + fill] = values[:fill]
+
+        # Row i (0 based, over all chunks) replaces a random slot with probability max_rows / (i + 1).
+        # Later rows of the chunk are assigned last, the same result as replacing one row at a time
+        row_numbers = np.arange(rows_seen + fill, rows_seen + len(values))
+        slots = (rng.random(len(row_numbers)) * (row_numbers + 1)).astype(np.int64)
+        replace = slots < max_rows
+        reservoir[slots[replace]] = values[fill:][replace]
+        rows_seen += len(values)
+
+    if columns is None:
+        return pd.DataFrame()
+    return pd.DataFrame(reservoir[:min(rows_seen, max_rows)], columns=columns)
+
+
+def varchar_length(max_length: int) -> int:
+    """Smallest step of VARCHAR_LENGTHS holding VARCHAR_HEADROOM times the longest value."""
+    return next((length for length in VARCHAR_LENGTHS if length >= max_length * VARCHAR_HEADROOM), VARCHAR_LENGTHS[-1])
+
+
+def profile_column(values: pd.Series, date_patterns: list) -> tuple:
+    """
+    SOURCE_FIELD type of a column of string values
+
+    return (DATA_TYPE_NAME, DATA_TYPE_LENGTH, DATA_TYPE_PRECISION, DATA_TYPE_SCALE)
+
+    values: Values of the column
+    date_patterns: List of (DATA_TYPE_NAME, regular expression) of the date formats of the feed
+    """
+    values = pd.Series(pd.Series(values.dropna().unique(), dtype=object).str.strip().unique(), dtype=object)
+    values = values[values != ""]
+    if values.empty:
+        return "VARCHAR", VARCHAR_LENGTHS[0], 0, 0
+
+    lengths = values.str.len().to_numpy()
+    for data_type, pattern in date_patterns + PROFILE_PATTERNS:
+        # The first values reject most types before the whole column is checked
+        if not values.iloc[:PROFILE_PREFILTER_ROWS].str.fullmatch(pattern).all() or not values.str.fullmatch(pattern).all():
+            continue
+        if data_type == "NUMERIC":
+            # Codes with leading zeros (00123) keep the zeros as VARCHAR
+            if values.str.match(r"[+-]?0\d").any():
+                break
+            # Digits before and after the decimal point from the position of the point and the length of the value
+            point = values.str.find(".").to_numpy()
+            sign = values.str.startswith(("+", "-")).to_numpy(dtype=int)
+            scale = int(np.where(point >= 0, lengths - point - 1, 0).max())
+            integer_digits = int((np.where(point >= 0, point, lengths) - sign).max())
+            if integer_digits + scale > NUMBER_MAX_PRECISION:
+                continue
+            return "NUMERIC", 0, min(integer_digits + NUMERIC_HEADROOM_DIGITS + scale, NUMBER_MAX_PRECISION), scale
+        return data_type, 0, 0, 0
+
+    return "VARCHAR", varchar_length(int(lengths.max())), 0, 0
+
+
+def profile_columns(df_sample: pd.DataFrame, date_input_format: str = None, timestamp_input_format: str = None) -> list:
+    """
+    SOURCE_FIELD profile of each column of the sample (see reservoir_sample)
+
+    return List of dictionaries with SOURCE_FIELD_NAME, FIELD_ORDINAL, DATA_TYPE_NAME, DATA_TYPE_LENGTH,
+           DATA_TYPE_PRECISION and DATA_TYPE_SCALE, in the file order
+
+    date_input_format: DATE_INPUT_FORMAT of the feed, columns matching it are DATE
+    timestamp_input_format: TIMESTAMP_INPUT_FORMAT of the feed, columns matching it are DATETIME
+    """
+    date_patterns = [(data_type, format_pattern(snowflake_format))
+                     for data_type, snowflake_format in [("DATE", date_input_format), ("DATETIME", timestamp_input_format)]
+                     if snowflake_format]
+    profile = []
+    for position, name in enumerate(df_sample.columns):
+        data_type, length, precision, scale = profile_column(df_sample.iloc[:, position], date_patterns)
+        profile.append({
+            "SOURCE_FIELD_NAME": str(name).strip(),
+            "FIELD_ORDINAL": position + 1,
+            "DATA_TYPE_NAME": data_type,
+            "DATA_TYPE_LENGTH": length,
+            "DATA_TYPE_PRECISION": precision,
+            "DATA_TYPE_SCALE": scale
+        })
+    return profile
@@ -0,0 +1,4 @@
+CREATE OR REPLACE STREAM RAVEN.STREAM_LOG_STAGE_ME_STATUS_EVENT 
+    ON TABLE RAVEN.LOG_STAGE_ME_STATUS_EVENT 
+    APPEND_ONLY = TRUE
+;
@@ -21,7 +21,7 @@ AS $$
             SP.FILE_NAME_COB    AS FILE_NAME,
             SP.FOLDER_PATH_COB  AS DESTINATION_FILE_PATH
         FROM SOURCE_FILE SF
-        INNER JOIN RAVEN.VW_METADATA_STAGE_ME_PARAMETERS_COB SP
+        INNER JOIN RAVEN.METADATA_STAGE_ME_PARAMETERS_COB SP
             ON SF.SOURCE_SYSTEM_CODE = SP.SOURCE_SYSTEM_CODE 
             AND SF.SOURCE_FEED_CODE = SP.SOURCE_FEED_CODE
         WHERE SP.RAVEN_COBID = cobid
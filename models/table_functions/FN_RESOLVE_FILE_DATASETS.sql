@@ -0,0 +1,52 @@
+/**
+ * Resolves a batch of files to the datasets configured for them, using RAVEN.METADATA_FILE_RESOLUTION_INDEX.
+ *
+ * FILE_LIST: Array of objects {"CONTAINER_NAME": <container without environment version>, "FILE_PATH": <folder path>/<file name>}
+ *
+ * Same rules as the metadata check of PY_STAGE_ME:
+ *   - COB is the first number (> 19000100) of the path split by "_", "-", "/" and ".". Default 19000101
+ *   - Container: empty is "NO CONTAINER"
+ *   - Folder: '/<folder>/' LIKE FOLDER_PATH_COB || '%'
+ *   - File name: LIKE FILE_NAME_COB with "*" as "%"
+ * Files without dataset are returned with DATASET_NAME NULL. A file can match more than one dataset.
+ * Tests: tests/test_file_resolution.py (rules) and tests/test_fn_resolve_file_datasets.py (function against the LIKE filter).
+ */
+CREATE OR REPLACE FUNCTION RAVEN.FN_RESOLVE_FILE_DATASETS("FILE_LIST" ARRAY)
+RETURNS TABLE (CONTAINER_NAME VARCHAR, FILE_PATH VARCHAR, RAVEN_COBID NUMBER, DATASET_NAME VARCHAR)
+LANGUAGE SQL
+AS $$
+    WITH FILES AS (
+        SELECT 
+            F.INDEX                                                     AS FILE_ID,
+            F.VALUE:CONTAINER_NAME::VARCHAR                             AS CONTAINER_NAME,
+            F.VALUE:FILE_PATH::VARCHAR                                  AS FILE_PATH,
+            IFNULL(NULLIF(CONTAINER_NAME,''),'NO CONTAINER')            AS CONTAINER_KEY,
+            UPPER(SPLIT_PART(FILE_PATH,'/',-1))                         AS FILE_NAME_KEY,
+            REGEXP_REPLACE(TRIM(LEFT(FILE_PATH, LENGTH(FILE_PATH) - LENGTH(SPLIT_PART(FILE_PATH,'/',-1))),'/'),'/+','/') AS SOURCE_FOLDER,
+            UPPER('/' || SOURCE_FOLDER || '/')                          AS FOLDER_KEY
+        FROM TABLE(FLATTEN(INPUT => FILE_LIST)) F
+    )
+    ,FILE_COB AS (
+        SELECT 
+            F.FILE_ID,
+            MIN_BY(TRY_TO_NUMBER(T.VALUE), T.INDEX) AS RAVEN_COBID
+        FROM FILES F, LATERAL STRTOK_SPLIT_TO_TABLE(F.FILE_PATH, '_-/.') T
+        WHERE T.VALUE RLIKE '[0-9]+'
+          AND TRY_TO_NUMBER(T.VALUE) > 19000100
+        GROUP BY F.FILE_ID
+    )
+    SELECT 
+        F.CONTAINER_NAME,
+        F.FILE_PATH,
+        IFNULL(C.RAVEN_COBID, 19000101) AS RAVEN_COBID,
+        I.DATASET_NAME
+    FROM FILES F
+    LEFT JOIN FILE_COB C ON C.FILE_ID = F.FILE_ID
+    LEFT JOIN RAVEN.METADATA_FILE_RESOLUTION_INDEX I 
+        ON I.RAVEN_COBID = IFNULL(C.RAVEN_COBID, 19000101)
+        AND I.CONTAINER_KEY = F.CONTAINER_KEY
+        AND STARTSWITH(F.FILE_NAME_KEY, I.FILE_NAME_PREFIX)
+        AND F.FILE_NAME_KEY LIKE I.FILE_NAME_LIKE
+        AND F.FOLDER_KEY LIKE I.FOLDER_PREFIX || '%'
+$$
+;
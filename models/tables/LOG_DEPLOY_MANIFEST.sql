@@ -0,0 +1,9 @@
+CREATE or replace TABLE RAVEN.LOG_DEPLOY_MANIFEST (
+	MODEL_FILE VARCHAR(500) NOT NULL,
+	OBJECT_NAME VARCHAR(500),
+	CONTENT_HASH VARCHAR(64) NOT NULL,
+	DEPLOY_VERSION VARCHAR(50),
+	DEPLOY_TIMESTAMP TIMESTAMP_TZ(9),
+	constraint PK_LOG_DEPLOY_MANIFEST primary key (MODEL_FILE)
+)
+;
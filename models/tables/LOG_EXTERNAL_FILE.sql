@@ -0,0 +1,20 @@
+CREATE or replace TABLE RAVEN.LOG_EXTERNAL_FILE (
+	STAGE_NAME VARCHAR(200) NOT NULL,
+	FILE_PATH VARCHAR(5000) NOT NULL,
+	FILE_NAME VARCHAR(500),
+	FILE_URL VARCHAR(5000),
+	STAGE_URL VARCHAR(500),
+	RAVEN_COBID NUMBER(38,0),
+	FOLDER_PATTERN VARCHAR(5000),
+	FILE_EXTENSION VARCHAR(200),
+	FILE_MD5 VARCHAR(100),
+	FILE_SIZE NUMBER(38,0),
+	LAST_MODIFIED TIMESTAMP_NTZ(9),
+	FIRST_SEEN_TIMESTAMP TIMESTAMP_TZ(9),
+	LAST_SEEN_TIMESTAMP TIMESTAMP_TZ(9),
+	LAST_CHANGED_TIMESTAMP TIMESTAMP_TZ(9),
+	IS_DELETED BOOLEAN NOT NULL DEFAULT FALSE,
+	constraint PK_LOG_EXTERNAL_FILE primary key (STAGE_NAME, FILE_PATH)
+)
+CLUSTER BY (RAVEN_COBID)
+;
@@ -0,0 +1,13 @@
+CREATE or replace TABLE RAVEN.LOG_RETRY_UNSTAGED_FILE (
+	CONTAINER_NAME VARCHAR(5000) NOT NULL,
+	FILE_PATH VARCHAR(5000) NOT NULL,
+	RAVEN_COBID NUMBER(38,0),
+	DATASET_NAME VARCHAR(5000) COLLATE 'UTF8',
+	BLOB_LAST_MODIFIED TIMESTAMP_NTZ(9),
+	FAILURE_COUNT NUMBER(38,0) NOT NULL,
+	LAST_ATTEMPT_TIMESTAMP TIMESTAMP_TZ(9),
+	NEXT_RETRY_TIMESTAMP TIMESTAMP_TZ(9),
+	LAST_EXCEPTION VARCHAR(16777216),
+	constraint PK_LOG_RETRY_UNSTAGED_FILE primary key (CONTAINER_NAME, FILE_PATH)
+)
+;
@@ -0,0 +1,18 @@
+CREATE or replace TABLE RAVEN.LOG_RETRY_UNSTAGED_FILES_RUN (
+	ID NUMBER(38,0) NOT NULL autoincrement,
+	COBID_START NUMBER(38,0),
+	COBID_END NUMBER(38,0),
+	MAX_WORKERS NUMBER(38,0),
+	START_TIMESTAMP TIMESTAMP_TZ(9),
+	END_TIMESTAMP TIMESTAMP_TZ(9),
+	ELAPSED_SECONDS NUMBER(38,3),
+	FILES_CANDIDATE NUMBER(38,0),
+	FILES_ATTEMPTED NUMBER(38,0),
+	FILES_SUCCEEDED NUMBER(38,0),
+	FILES_FAILED NUMBER(38,0),
+	FILES_SKIPPED NUMBER(38,0),
+	GROUPS_DISPATCHED NUMBER(38,0),
+	RUN_DETAIL VARIANT,
+	constraint PK_LOG_RETRY_UNSTAGED_FILES_RUN primary key (ID)
+)
+;
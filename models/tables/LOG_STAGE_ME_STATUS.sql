@@ -8,6 +8,10 @@ CREATE or replace TABLE RAVEN.LOG_STAGE_ME_STATUS (
 	START_TIMESTAMP TIMESTAMP_TZ(9),
 	END_TIMESTAMP TIMESTAMP_TZ(9),
 	BLOB_FILE VARIANT,
+	FILE_KEY VARCHAR(5000),
+	CONTAINER_NAME VARCHAR(500),
+	FAILURE_REASON VARCHAR(100),
 	constraint PK_LOG_STAGE_ME_STATUS primary key (ID)
 )
+CLUSTER BY (TO_DATE(START_TIMESTAMP), CONTAINER_NAME, FILE_KEY)
 ;
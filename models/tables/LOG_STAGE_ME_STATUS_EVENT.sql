@@ -0,0 +1,17 @@
+CREATE or replace TABLE RAVEN.LOG_STAGE_ME_STATUS_EVENT (
+	ID NUMBER(38,0) NOT NULL,
+	RAVEN_COBID NUMBER(38,0) NOT NULL,
+	DATASET_NAME VARCHAR(5000) COLLATE 'UTF8',
+	PROCESS_PARAMETERS VARIANT,
+	PROCESS_RESULT VARIANT,
+	PROCESS_STATUS VARCHAR(500),
+	START_TIMESTAMP TIMESTAMP_TZ(9),
+	END_TIMESTAMP TIMESTAMP_TZ(9),
+	BLOB_FILE VARIANT,
+	EVENT_SEQUENCE NUMBER(38,0) NOT NULL,
+	EVENT_TIMESTAMP TIMESTAMP_TZ(9) DEFAULT CURRENT_TIMESTAMP(),
+	FILE_KEY VARCHAR(5000),
+	CONTAINER_NAME VARCHAR(500),
+	FAILURE_REASON VARCHAR(100)
+)
+;
@@ -13,6 +13,8 @@ CREATE or replace TABLE RAVEN.METADATA_CALENDAR (
 	NEXT_BUSINESS_DAY DATE,
 	FIRST_TIME_INSERTED TIMESTAMP_TZ(9),
 	LAST_MODIFIED TIMESTAMP_TZ(9) DEFAULT CURRENT_TIMESTAMP(),
-	constraint PK_METADATA_CALENDAR primary key (COBID)
+	MARKET VARCHAR(50) COLLATE 'en-ci' NOT NULL DEFAULT '',
+	IS_PRIMARY_MARKET BOOLEAN DEFAULT TRUE,
+	constraint PK_METADATA_CALENDAR primary key (COBID, MARKET)
 )
 ;
@@ -0,0 +1,12 @@
+CREATE or replace TABLE RAVEN.METADATA_CSV_HEADER_MAPPING (
+	DATASET_NAME VARCHAR(5000) NOT NULL COLLATE 'UTF8',
+	HEADER_HASH VARCHAR(64) NOT NULL,
+	METADATA_VERSION VARCHAR(64) NOT NULL,
+	CSV_HEADER VARCHAR(16777216),
+	MAPPING VARIANT,
+	HIT_COUNT NUMBER(38,0) NOT NULL DEFAULT 0,
+	CREATED_TIMESTAMP TIMESTAMP_TZ(9),
+	LAST_HIT_TIMESTAMP TIMESTAMP_TZ(9),
+	constraint PK_METADATA_CSV_HEADER_MAPPING primary key (DATASET_NAME, HEADER_HASH, METADATA_VERSION)
+)
+;
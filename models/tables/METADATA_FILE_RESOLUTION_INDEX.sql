@@ -0,0 +1,12 @@
+CREATE or replace TABLE RAVEN.METADATA_FILE_RESOLUTION_INDEX (
+	RAVEN_COBID NUMBER(38,0) NOT NULL,
+	CONTAINER_KEY VARCHAR(5000) NOT NULL,
+	FOLDER_PREFIX VARCHAR(16777216) NOT NULL,
+	FILE_NAME_PREFIX VARCHAR(16777216) NOT NULL,
+	FILE_NAME_LIKE VARCHAR(16777216) NOT NULL,
+	DATASET_NAME VARCHAR(5000) NOT NULL COLLATE 'UTF8',
+	SOURCE_REFRESH_TIMESTAMP TIMESTAMP_TZ(9),
+	constraint PK_METADATA_FILE_RESOLUTION_INDEX primary key (DATASET_NAME, RAVEN_COBID)
+)
+cluster by (RAVEN_COBID, CONTAINER_KEY)
+;
@@ -0,0 +1,15 @@
+CREATE or replace TABLE RAVEN.METADATA_INFER_SCHEMA_CACHE (
+	DATASET_NAME VARCHAR(5000) NOT NULL COLLATE 'UTF8',
+	LAYOUT_FINGERPRINT VARCHAR(64) NOT NULL,
+	CSV_HEADER VARCHAR(16777216),
+	FIELD_DELIMITER VARCHAR(10),
+	COLUMN_COUNT NUMBER(38,0),
+	INFERRED_SCHEMA VARIANT,
+	INFERENCE_ENGINE VARCHAR(50),
+	SAMPLE_ROWS NUMBER(38,0),
+	HIT_COUNT NUMBER(38,0) NOT NULL DEFAULT 0,
+	CREATED_TIMESTAMP TIMESTAMP_TZ(9),
+	LAST_HIT_TIMESTAMP TIMESTAMP_TZ(9),
+	constraint PK_METADATA_INFER_SCHEMA_CACHE primary key (DATASET_NAME, LAYOUT_FINGERPRINT)
+)
+;
@@ -0,0 +1,17 @@
+CREATE or replace TABLE RAVEN.METADATA_LOAD_PLAN (
+	DATASET_NAME VARCHAR(5000) NOT NULL COLLATE 'UTF8',
+	METADATA_VERSION VARCHAR(64) NOT NULL,
+	IS_CURRENT BOOLEAN NOT NULL DEFAULT TRUE,
+	SOURCE_SYSTEM_CODE VARCHAR(200),
+	SOURCE_FEED_CODE VARCHAR(200),
+	STAGE_NAME VARCHAR(500),
+	SOURCE_FILE_NAME_PATTERN VARCHAR(500),
+	SOURCE_FILE_AND_FIELD VARIANT,
+	TARGET_COLUMN_LIST VARCHAR(16777216),
+	SOURCE_TRANSFORM_LIST VARCHAR(16777216),
+	CREATE_COLUMN_LIST VARCHAR(16777216),
+	COPY_TEMPLATE VARCHAR(16777216),
+	COMPILED_TIMESTAMP TIMESTAMP_TZ(9),
+	constraint PK_METADATA_LOAD_PLAN primary key (DATASET_NAME, METADATA_VERSION)
+)
+;
@@ -19,6 +19,8 @@ CREATE or replace TABLE RAVEN.METADATA_STAGE_ME_PARAMETERS (
 	LAST_MODIFIED TIMESTAMP_TZ(9) DEFAULT CURRENT_TIMESTAMP(),
 	ALLOW_INFER_SCHEMA BOOLEAN NOT NULL DEFAULT TRUE,
 	TAGS VARIANT,
+	LOAD_STRATEGY VARCHAR(50) NOT NULL DEFAULT 'DELETE_INSERT',
+	CLUSTER_BY_COBID BOOLEAN NOT NULL DEFAULT FALSE,
 	constraint PK_METADATA_STAGE_ME_PARAMETERS primary key (DATASET_NAME)
 )
 ;
@@ -0,0 +1,37 @@
+CREATE or replace TABLE RAVEN.METADATA_STAGE_ME_PARAMETERS_COB (
+	RAVEN_COBID NUMBER(38,0) NOT NULL,
+	DATASET_NAME VARCHAR(5000) NOT NULL COLLATE 'UTF8',
+	METADATA_VERSION VARCHAR(64) NOT NULL,
+	PARAMETERS_HASH NUMBER(38,0) NOT NULL,
+	STAGE_NAME VARCHAR(500),
+	FILE_PATH VARCHAR(500),
+	FILE_NAME VARCHAR(500),
+	FILE_NAME_NO_EXTENSION VARCHAR(500),
+	FILE_EXTENSION VARCHAR(500),
+	SOURCE_FILE_NAME_PATTERN VARCHAR(500),
+	CONTAINER_NAME VARCHAR(5000),
+	SOURCE_SYSTEM_CODE VARCHAR(200),
+	SOURCE_FEED_CODE VARCHAR(200),
+	IS_ENABLED BOOLEAN,
+	IS_TRIGGER_FILE BOOLEAN,
+	ALLOW_RELOAD BOOLEAN,
+	ENTITY_CODE VARCHAR(20),
+	DEPARTMENT_CODE VARCHAR(200),
+	REGION VARCHAR(200),
+	MARKET VARCHAR(200),
+	STAGING_SCOPE_FIELDS VARIANT,
+	IS_CLOUD_COPY BOOLEAN,
+	EXPECTED_STAGE_TIME VARCHAR(8),
+	WAREHOUSE_SIZE VARCHAR(200),
+	ALLOW_INFER_SCHEMA BOOLEAN,
+	TAGS VARIANT,
+	FOLDER_PATTERN_COB VARCHAR(16777216),
+	FOLDER_PATH_COB VARCHAR(16777216),
+	FILE_NAME_COB VARCHAR(16777216),
+	FOLDER_PATTERN VARCHAR(16777216),
+	REFRESH_TIMESTAMP TIMESTAMP_TZ(9),
+	LOAD_STRATEGY VARCHAR(50),
+	CLUSTER_BY_COBID BOOLEAN,
+	constraint PK_METADATA_STAGE_ME_PARAMETERS_COB primary key (DATASET_NAME, RAVEN_COBID)
+)
+;
@@ -0,0 +1,8 @@
+CREATE or replace TASK RAVEN.TASK_REFRESH_STAGE_ME_PARAMETERS_COB
+    USER_TASK_MANAGED_INITIAL_WAREHOUSE_SIZE = 'XSMALL'
+    SCHEDULE = 'USING CRON 5 0 * * * UTC'
+    ALLOW_OVERLAPPING_EXECUTION = FALSE
+    SUSPEND_TASK_AFTER_NUM_FAILURES = 15
+AS
+    CALL RAVEN.REFRESH_STAGE_ME_PARAMETERS_COB()
+;
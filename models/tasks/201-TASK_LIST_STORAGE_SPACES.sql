@@ -13,7 +13,7 @@ DECLARE
       MIN(RAVEN_COBID) COBID_START, 
       MAX(RAVEN_COBID) COBID_END 
 		FROM (SELECT DISTINCT RAVEN_COBID 
-						FROM RAVEN.LOG_STAGE_ME_STATUS 
+						FROM RAVEN.VW_LOG_STAGE_ME_STATUS_CURRENT 
             ORDER BY RAVEN_COBID DESC LIMIT 3)
   );
   c1 CURSOR FOR res;
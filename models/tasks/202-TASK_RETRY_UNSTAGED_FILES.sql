@@ -12,8 +12,8 @@ DECLARE
       MAX(RAVEN_COBID) COBID_END 
       FROM (SELECT 
               DISTINCT RAVEN_COBID 
-              FROM RAVEN.LOG_LIST_EXTERNAL_FILE 
-             WHERE FLAG_LAST_VERSION = TRUE 
+              FROM RAVEN.LOG_EXTERNAL_FILE 
+             WHERE IS_DELETED = FALSE 
              ORDER BY RAVEN_COBID DESC LIMIT 5
           )
   );
@@ -22,6 +22,6 @@ BEGIN
   FOR row_variable IN c1 DO
   	COBID_START := row_variable.COBID_START;
     COBID_END := row_variable.COBID_END;
-    CALL RAVEN.RETRY_UNSTAGED_FILES(:COBID_START,:COBID_END);
+    CALL RAVEN.RETRY_UNSTAGED_FILES(:COBID_START,:COBID_END,8);
   END FOR;
 END;
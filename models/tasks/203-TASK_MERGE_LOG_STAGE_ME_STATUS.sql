@@ -0,0 +1,56 @@
+CREATE or replace TASK RAVEN.TASK_MERGE_LOG_STAGE_ME_STATUS
+    USER_TASK_MANAGED_INITIAL_WAREHOUSE_SIZE = 'XSMALL'
+    SCHEDULE = '1 MINUTE'
+    ALLOW_OVERLAPPING_EXECUTION = FALSE
+    SUSPEND_TASK_AFTER_NUM_FAILURES = 15
+WHEN
+    SYSTEM$STREAM_HAS_DATA('RAVEN.STREAM_LOG_STAGE_ME_STATUS_EVENT')
+AS
+    MERGE INTO RAVEN.LOG_STAGE_ME_STATUS AS tgt
+    USING (
+        -- Latest event of each ID
+        SELECT *
+        FROM RAVEN.STREAM_LOG_STAGE_ME_STATUS_EVENT
+        QUALIFY ROW_NUMBER() OVER (PARTITION BY ID ORDER BY EVENT_TIMESTAMP DESC, EVENT_SEQUENCE DESC) = 1
+    ) AS src
+    ON (tgt.ID = src.ID)
+    WHEN MATCHED
+    THEN UPDATE SET
+        tgt.DATASET_NAME = src.DATASET_NAME,
+        tgt.PROCESS_PARAMETERS = src.PROCESS_PARAMETERS,
+        tgt.PROCESS_RESULT = src.PROCESS_RESULT,
+        tgt.PROCESS_STATUS = src.PROCESS_STATUS,
+        tgt.START_TIMESTAMP = src.START_TIMESTAMP,
+        tgt.END_TIMESTAMP = src.END_TIMESTAMP,
+        tgt.BLOB_FILE = src.BLOB_FILE,
+        tgt.FILE_KEY = src.FILE_KEY,
+        tgt.CONTAINER_NAME = src.CONTAINER_NAME,
+        tgt.FAILURE_REASON = src.FAILURE_REASON
+    WHEN NOT MATCHED
+    THEN INSERT (
+        ID, 
+        RAVEN_COBID, 
+        DATASET_NAME, 
+        PROCESS_PARAMETERS, 
+        PROCESS_RESULT, 
+        PROCESS_STATUS, 
+        START_TIMESTAMP, 
+        END_TIMESTAMP, 
+        BLOB_FILE,
+        FILE_KEY,
+        CONTAINER_NAME,
+        FAILURE_REASON
+    ) VALUES (
+        src.ID, 
+        src.RAVEN_COBID, 
+        src.DATASET_NAME, 
+        src.PROCESS_PARAMETERS, 
+        src.PROCESS_RESULT, 
+        src.PROCESS_STATUS, 
+        src.START_TIMESTAMP, 
+        src.END_TIMESTAMP, 
+        src.BLOB_FILE,
+        src.FILE_KEY,
+        src.CONTAINER_NAME,
+        src.FAILURE_REASON)
+;
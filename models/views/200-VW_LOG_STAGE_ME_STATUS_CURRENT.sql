@@ -0,0 +1,18 @@
+-- Latest state of each staging log ID: the rows of RAVEN.LOG_STAGE_ME_STATUS and the events of RAVEN.LOG_STAGE_ME_STATUS_EVENT
+-- not merged yet by TASK_MERGE_LOG_STAGE_ME_STATUS (the stream is only read, its offset moves when the task merges it)
+CREATE OR REPLACE VIEW RAVEN.VW_LOG_STAGE_ME_STATUS_CURRENT AS
+WITH PENDING_EVENT AS (
+	SELECT ID, RAVEN_COBID, DATASET_NAME, PROCESS_PARAMETERS, PROCESS_RESULT, PROCESS_STATUS, START_TIMESTAMP, END_TIMESTAMP, BLOB_FILE,
+	       FILE_KEY, CONTAINER_NAME, FAILURE_REASON
+	FROM RAVEN.STREAM_LOG_STAGE_ME_STATUS_EVENT
+	QUALIFY ROW_NUMBER() OVER (PARTITION BY ID ORDER BY EVENT_TIMESTAMP DESC, EVENT_SEQUENCE DESC) = 1
+)
+SELECT S.ID, S.RAVEN_COBID, S.DATASET_NAME, S.PROCESS_PARAMETERS, S.PROCESS_RESULT, S.PROCESS_STATUS, S.START_TIMESTAMP, S.END_TIMESTAMP, S.BLOB_FILE,
+       S.FILE_KEY, S.CONTAINER_NAME, S.FAILURE_REASON
+FROM RAVEN.LOG_STAGE_ME_STATUS S
+WHERE NOT EXISTS (SELECT 1 FROM PENDING_EVENT E WHERE E.ID = S.ID)
+UNION ALL
+SELECT ID, RAVEN_COBID, DATASET_NAME, PROCESS_PARAMETERS, PROCESS_RESULT, PROCESS_STATUS, START_TIMESTAMP, END_TIMESTAMP, BLOB_FILE,
+       FILE_KEY, CONTAINER_NAME, FAILURE_REASON
+FROM PENDING_EVENT
+;
@@ -4,7 +4,7 @@ SELECT
 	 ID,
 	 SUM(CAST(VALUE:rows_loaded AS INT)) 	AS ROWS_LOADED,
 	 SUM(CAST(VALUE:rows_parsed AS INT))	AS ROWS_PARSED
-FROM RAVEN.LOG_STAGE_ME_STATUS AS S,TABLE (flatten(S.PROCESS_RESULT ,'msg_copy_result', outer => FALSE)) F
+FROM RAVEN.VW_LOG_STAGE_ME_STATUS_CURRENT AS S,TABLE (flatten(S.PROCESS_RESULT ,'msg_copy_result', outer => FALSE)) F
 GROUP BY ID
 )
 ,STAGE_ME AS (
@@ -14,7 +14,7 @@ GROUP BY ID
 		S.RAVEN_COBID,
 		ROWS_LOADED/1.0	AS TOTAL_ROWS_STAGED,
 		PROCESS_STATUS AS STAGE_ME_STATUS
-	FROM RAVEN.LOG_STAGE_ME_STATUS S
+	FROM RAVEN.VW_LOG_STAGE_ME_STATUS_CURRENT S
   LEFT JOIN STAGE_ME_STATUS_TOTAL_ROW SR ON S.ID = SR.ID
 )
 ,ORDERED_LIST AS (
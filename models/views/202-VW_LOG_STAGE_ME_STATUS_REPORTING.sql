@@ -5,7 +5,7 @@ WITH STAGE_ME_STATUS_SPLITED AS (
 		,MAX(REPLACE(VALUE:name::STRING,SPLIT_PART(VALUE:name::STRING,'/',-1),''))	AS BLOB_LOCATION
 		,MAX(VALUE:last_modified::STRING)											AS BLOB_LAST_MODIFIED
 		,SUM(CAST(VALUE:size AS INT))												AS BLOB_FILE_SIZE
-	FROM RAVEN.LOG_STAGE_ME_STATUS AS S,TABLE (flatten(S.BLOB_FILE,'FILE_LIST', outer => FALSE)) F
+	FROM RAVEN.VW_LOG_STAGE_ME_STATUS_CURRENT AS S,TABLE (flatten(S.BLOB_FILE,'FILE_LIST', outer => FALSE)) F
 	GROUP BY ID
 )
 ,STAGE_ME_STATUS_TOTAL_ROW AS(
@@ -13,7 +13,7 @@ WITH STAGE_ME_STATUS_SPLITED AS (
 		ID,
 		SUM(CAST(VALUE:rows_loaded AS INT)) 	AS ROWS_LOADED,
 		SUM(CAST(VALUE:rows_parsed AS INT))	AS ROWS_PARSED
-	FROM RAVEN.LOG_STAGE_ME_STATUS AS S,TABLE (flatten(S.PROCESS_RESULT ,'msg_copy_result', outer => FALSE)) F
+	FROM RAVEN.VW_LOG_STAGE_ME_STATUS_CURRENT AS S,TABLE (flatten(S.PROCESS_RESULT ,'msg_copy_result', outer => FALSE)) F
 	GROUP BY ID
 )
 ,STAGE_ME_STATUS AS (
@@ -39,7 +39,7 @@ WITH STAGE_ME_STATUS_SPLITED AS (
 			,'FROM', '\n FROM \n') 				AS COPY_CMD,
 		ROWS_LOADED,
 		ROWS_PARSED
-	FROM RAVEN.LOG_STAGE_ME_STATUS S
+	FROM RAVEN.VW_LOG_STAGE_ME_STATUS_CURRENT S
 	LEFT JOIN STAGE_ME_STATUS_SPLITED 	L ON S.ID = L.ID
 	LEFT JOIN STAGE_ME_STATUS_TOTAL_ROW R ON S.ID = R.ID
 )
@@ -111,6 +111,7 @@ FROM
 	STAGE_ME_STATUS 							S
 INNER JOIN 
 	RAVEN.METADATA_CALENDAR 					C ON S.RAVEN_COBID = C.COBID
+												   AND C.IS_PRIMARY_MARKET = TRUE
 LEFT JOIN 
 	RAVEN.VW_METADATA_STAGE_ME_PARAMETERS_COB	P 	ON P.DATASET_NAME = S.DATASET_NAME
 												   AND P.RAVEN_COBID = S.RAVEN_COBID
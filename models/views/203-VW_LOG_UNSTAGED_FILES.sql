@@ -1,3 +1,6 @@
+-- The staging log is filtered on its clustering key (TO_DATE(START_TIMESTAMP), CONTAINER_NAME, FILE_KEY). The events of the
+-- last day not merged yet into RAVEN.LOG_STAGE_ME_STATUS are read from the stream.
+-- A file that failed for missing metadata or target table is listed again once it is modified after the failure.
 CREATE OR REPLACE VIEW RAVEN.VW_LOG_UNSTAGED_FILES AS
 WITH LIST_EXT_FILE AS ( 
 SELECT RAVEN_COBID
@@ -13,13 +16,14 @@ SELECT RAVEN_COBID
        END CONTAINER_NAME
       ,FOLDER_PATTERN
       ,FILE_EXTENSION
- 	  ,PROCESS_TIMESTAMP
- 	  ,VALUE:name::VARCHAR  FILE_URL
- 	  ,REPLACE(VALUE:name::VARCHAR,STAGE_URL,'')  EXTERNAL_FILE_PATH
- 	  ,SPLIT_PART(REPLACE(VALUE:name::VARCHAR,STAGE_URL,''),'/',-1) FILE_NAME
-	  ,to_timestamp_ntz(VALUE:last_modified::STRING, 'DY, DD MON YYYY HH24:MI:SS GMT') 	AS BLOB_LAST_MODIFIED
-  FROM RAVEN.LOG_LIST_EXTERNAL_FILE L, LATERAL flatten(input => L.FILE_LIST)
- WHERE FLAG_LAST_VERSION = TRUE
+ 	  ,LAST_SEEN_TIMESTAMP PROCESS_TIMESTAMP
+ 	  ,FILE_URL
+ 	  ,REPLACE(FILE_URL,STAGE_URL,'')  EXTERNAL_FILE_PATH
+ 	  ,TRIM(REGEXP_REPLACE(REPLACE(FILE_URL,STAGE_URL,''),'/+','/'),'/')  FILE_KEY
+ 	  ,FILE_NAME
+	  ,LAST_MODIFIED AS BLOB_LAST_MODIFIED
+  FROM RAVEN.LOG_EXTERNAL_FILE
+ WHERE IS_DELETED = FALSE
 )
 SELECT L.RAVEN_COBID
       ,L.STAGE_NAME
@@ -30,28 +34,36 @@ SELECT L.RAVEN_COBID
       ,L.FILE_EXTENSION
       ,L.STAGE_URL
  	  ,L.EXTERNAL_FILE_PATH
+ 	  ,L.FILE_KEY
  	  ,L.PROCESS_TIMESTAMP
  	  ,L.BLOB_LAST_MODIFIED
 	  ,REPLACE(FOLDER_PATH,'/','_') || SPLIT_PART(L.FILE_NAME,'.',1) || L.RAVEN_COBID AS TAKS_NAME
   FROM LIST_EXT_FILE L
- INNER JOIN RAVEN.VW_METADATA_STAGE_ME_PARAMETERS_COB P ON L.RAVEN_COBID = P.RAVEN_COBID
+ INNER JOIN RAVEN.METADATA_STAGE_ME_PARAMETERS_COB    P ON L.RAVEN_COBID = P.RAVEN_COBID
  				  									   AND L.STAGE_NAME = P.STAGE_NAME
  				                                       AND REPLACE(L.EXTERNAL_FILE_PATH,'/','') = REPLACE(P.FOLDER_PATH_COB || P.FILE_NAME,'/','')
  				                                       AND L.FILE_EXTENSION = P.FILE_EXTENSION								  
  WHERE NOT EXISTS (SELECT 1 
   				     FROM RAVEN.LOG_STAGE_ME_STATUS S 
-  				 	 WHERE REPLACE(S.PROCESS_PARAMETERS:"file_stage_me"::VARCHAR,'/','') = REPLACE(L.EXTERNAL_FILE_PATH,'/','')
-         			   AND S.PROCESS_PARAMETERS:"container_name"::VARCHAR = L.CONTAINER_NAME
+  				 	 WHERE TO_DATE(S.START_TIMESTAMP) >= TO_DATE(L.BLOB_LAST_MODIFIED)
+         			   AND S.CONTAINER_NAME = L.CONTAINER_NAME
+         			   AND S.FILE_KEY = L.FILE_KEY
 					   AND S.START_TIMESTAMP > L.BLOB_LAST_MODIFIED
   				   	   AND S.PROCESS_STATUS <> 'FAILED') -- REMOVE ALL SUCCESS PROCESS
+   AND NOT EXISTS (SELECT 1 
+  				     FROM RAVEN.STREAM_LOG_STAGE_ME_STATUS_EVENT E 
+  				 	 WHERE E.EVENT_TIMESTAMP >= DATEADD(DAY, -1, CURRENT_TIMESTAMP())
+         			   AND E.CONTAINER_NAME = L.CONTAINER_NAME
+         			   AND E.FILE_KEY = L.FILE_KEY
+					   AND E.START_TIMESTAMP > L.BLOB_LAST_MODIFIED
+  				   	   AND E.PROCESS_STATUS <> 'FAILED') -- REMOVE THE PROCESS OF THE LAST DAY NOT MERGED YET BY TASK_MERGE_LOG_STAGE_ME_STATUS
    AND NOT EXISTS (
 		SELECT 1
 	      FROM RAVEN.LOG_STAGE_ME_STATUS SS
-       WHERE REPLACE(SS.PROCESS_PARAMETERS:"file_stage_me"::VARCHAR,'/','') = REPLACE(L.EXTERNAL_FILE_PATH,'/','')
-         AND SS.PROCESS_PARAMETERS:"container_name"::VARCHAR = L.CONTAINER_NAME
-         AND SS.PROCESS_STATUS = 'FAILED'
-         AND (ss.PROCESS_RESULT:"exception"::VARCHAR LIKE '%There is no metadata for the folder/file%'
-              OR ss.PROCESS_RESULT:"exception"::VARCHAR LIKE '%Object%does not exist or not authorized%'
-              OR ss.PROCESS_RESULT:"exception"::VARCHAR LIKE '%SQL compilation error%')
-        ) -- REMOVE ALL FAILED BECAUSE THERE ISN'T METADATA OR TABLE DESTINATION IS NOT CREATED
+       WHERE TO_DATE(SS.START_TIMESTAMP) >= TO_DATE(L.BLOB_LAST_MODIFIED)
+         AND SS.CONTAINER_NAME = L.CONTAINER_NAME
+         AND SS.FILE_KEY = L.FILE_KEY
+         AND SS.START_TIMESTAMP > L.BLOB_LAST_MODIFIED
+         AND SS.FAILURE_REASON IN ('NO_METADATA', 'OBJECT_NOT_FOUND', 'SQL_COMPILATION_ERROR')
+        ) -- REMOVE ALL FAILED BECAUSE THERE ISN'T METADATA OR TABLE DESTINATION IS NOT CREATED (SINCE THE LAST CHANGE OF THE FILE)
    AND TIMESTAMPADD(MINUTE, 30, L.BLOB_LAST_MODIFIED) < CURRENT_TIMESTAMP();
@@ -2,7 +2,8 @@ param(
     [Parameter(Mandatory=$true)] [string]$TargetDatabase,
     [Parameter(Mandatory=$true)] [string]$AppName,
     [Parameter(Mandatory=$true)] [boolean]$FlagBuildRaven = $False,
-    [Parameter(Mandatory=$false)] [int]$EnvNum = 1
+    [Parameter(Mandatory=$false)] [int]$EnvNum = 1,
+    [Parameter(Mandatory=$false)] [boolean]$FlagForceBuild = $False
 )
 
 # Get python installation path
@@ -44,7 +45,8 @@ if ($FlagBuildRaven){
     $build_arg = "-build=True"
     $grant_arg = "-grant=True"
     $env_num = "-envn=$EnvNum"
-    & $python_exe $script $db_arg $app_arg $metadata_arg $build_arg $grant_arg $env_num
+    $force_arg = if ($FlagForceBuild) {"-force"} else {$null}
+    & $python_exe $script $db_arg $app_arg $metadata_arg $build_arg $grant_arg $env_num $force_arg
     
 }
 
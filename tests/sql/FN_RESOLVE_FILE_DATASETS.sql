@@ -0,0 +1,78 @@
+-- Compares RAVEN.FN_RESOLVE_FILE_DATASETS with the LIKE filter PY_STAGE_ME ran on the COB resolved parameters before the index.
+-- Files: variants of a path built from every row of RAVEN.METADATA_STAGE_ME_PARAMETERS_COB ("*" as text or empty, lower case,
+-- repeated and leading "/", empty container, sub folder) and edge cases. Returns the differences, no rows expected.
+WITH PARAMETERS_FILE AS (
+    SELECT DISTINCT
+        IFNULL(CONTAINER_NAME,'') AS CONTAINER_NAME,
+        TRIM(FOLDER_PATH_COB,'/') AS FOLDER,
+        FILE_NAME_COB
+    FROM RAVEN.METADATA_STAGE_ME_PARAMETERS_COB
+    WHERE IS_ENABLED = TRUE
+)
+,FILES AS (
+    SELECT CONTAINER_NAME, FOLDER || '/' || REPLACE(FILE_NAME_COB,'*','X') AS FILE_PATH FROM PARAMETERS_FILE
+    UNION SELECT CONTAINER_NAME, FOLDER || '/' || REPLACE(FILE_NAME_COB,'*','') FROM PARAMETERS_FILE
+    UNION SELECT CONTAINER_NAME, LOWER(FOLDER || '/' || REPLACE(FILE_NAME_COB,'*','x_1')) FROM PARAMETERS_FILE
+    UNION SELECT CONTAINER_NAME, '/' || REPLACE(FOLDER,'/','//') || '//' || REPLACE(FILE_NAME_COB,'*','X') FROM PARAMETERS_FILE
+    UNION SELECT CONTAINER_NAME, FOLDER || '/SUB/' || REPLACE(FILE_NAME_COB,'*','X') FROM PARAMETERS_FILE
+    UNION SELECT CONTAINER_NAME, FOLDER || 'X/' || REPLACE(FILE_NAME_COB,'*','X') FROM PARAMETERS_FILE
+    UNION SELECT '', FOLDER || '/' || REPLACE(FILE_NAME_COB,'*','X') FROM PARAMETERS_FILE
+    UNION SELECT CONTAINER_NAME, FOLDER || '/' || REPLACE(REPLACE(REPLACE(FILE_NAME_COB,'*','X'),'_','-'),'%','X') FROM PARAMETERS_FILE
+    UNION SELECT COLUMN1, COLUMN2 FROM VALUES ('', 'file.csv'), ('', 'data/file_19000100.csv'), ('', 'data/20230626a/file.csv')
+)
+,FILE_LIST AS (
+    SELECT ARRAY_AGG(OBJECT_CONSTRUCT('CONTAINER_NAME', CONTAINER_NAME, 'FILE_PATH', FILE_PATH)) AS FILE_LIST
+    FROM FILES
+)
+,RESOLVED AS (
+    SELECT R.CONTAINER_NAME, R.FILE_PATH, R.RAVEN_COBID, R.DATASET_NAME
+    FROM FILE_LIST L, TABLE(RAVEN.FN_RESOLVE_FILE_DATASETS(L.FILE_LIST)) R
+)
+,COB_TOKEN AS (
+    -- COB of PY_STAGE_ME: first number > 19000100 of the path split by _ - / and .
+    SELECT
+        F.CONTAINER_NAME,
+        F.FILE_PATH,
+        MIN_BY(TRY_TO_NUMBER(T.VALUE), T.INDEX) AS RAVEN_COBID
+    FROM FILES F, LATERAL SPLIT_TO_TABLE(REGEXP_REPLACE(F.FILE_PATH, '[_./-]', '|'), '|') T
+    WHERE T.VALUE RLIKE '[0-9]+'
+      AND TRY_TO_NUMBER(T.VALUE) > 19000100
+    GROUP BY F.CONTAINER_NAME, F.FILE_PATH
+)
+,FILE_COB AS (
+    SELECT
+        F.CONTAINER_NAME,
+        F.FILE_PATH,
+        IFNULL(C.RAVEN_COBID, 19000101) AS RAVEN_COBID
+    FROM FILES F
+    LEFT JOIN COB_TOKEN C ON C.CONTAINER_NAME = F.CONTAINER_NAME AND C.FILE_PATH = F.FILE_PATH
+)
+,VIEW_FILTER AS (
+    SELECT
+        F.CONTAINER_NAME,
+        F.FILE_PATH,
+        F.RAVEN_COBID,
+        P.DATASET_NAME
+    FROM FILE_COB F
+    JOIN RAVEN.METADATA_STAGE_ME_PARAMETERS_COB P
+        ON P.IS_ENABLED = TRUE
+        AND P.RAVEN_COBID = F.RAVEN_COBID
+        AND UPPER(SPLIT_PART(F.FILE_PATH,'/',-1)) LIKE ARRAY_TO_STRING(SPLIT(UPPER(P.FILE_NAME_COB),'*'),'%')
+        -- Folder without "/" at the beginning and end and without repeated "/", as source_folder of PY_STAGE_ME
+        AND UPPER('/' || REGEXP_REPLACE(TRIM(LEFT(F.FILE_PATH, LENGTH(F.FILE_PATH) - LENGTH(SPLIT_PART(F.FILE_PATH,'/',-1))),'/'),'/+','/') || '/')
+            LIKE UPPER(P.FOLDER_PATH_COB || '%')
+        AND IFNULL(NULLIF(P.CONTAINER_NAME,''), 'NO CONTAINER') = IFNULL(NULLIF(F.CONTAINER_NAME,''),'NO CONTAINER')
+)
+SELECT 'ONLY_FUNCTION' AS DIFFERENCE, * FROM (
+    SELECT CONTAINER_NAME, FILE_PATH, RAVEN_COBID, DATASET_NAME FROM RESOLVED WHERE DATASET_NAME IS NOT NULL
+    MINUS
+    SELECT CONTAINER_NAME, FILE_PATH, RAVEN_COBID, DATASET_NAME FROM VIEW_FILTER)
+UNION ALL
+SELECT 'ONLY_VIEW_FILTER', * FROM (
+    SELECT CONTAINER_NAME, FILE_PATH, RAVEN_COBID, DATASET_NAME FROM VIEW_FILTER
+    MINUS
+    SELECT CONTAINER_NAME, FILE_PATH, RAVEN_COBID, DATASET_NAME FROM RESOLVED WHERE DATASET_NAME IS NOT NULL)
+UNION ALL
+SELECT 'COB', F.CONTAINER_NAME, F.FILE_PATH, F.RAVEN_COBID, NULL
+FROM FILE_COB F
+WHERE NOT EXISTS (SELECT 1 FROM RESOLVED R WHERE R.CONTAINER_NAME = F.CONTAINER_NAME AND R.FILE_PATH = F.FILE_PATH AND R.RAVEN_COBID = F.RAVEN_COBID)
@@ -0,0 +1,194 @@
+"""
+Rules of RAVEN.FN_RESOLVE_FILE_DATASETS and RAVEN.METADATA_FILE_RESOLUTION_INDEX compared with the metadata check that
+PY_STAGE_ME ran on the COB resolved parameters before the index (LIKE filter on VW_METADATA_STAGE_ME_PARAMETERS_COB).
+
+The SQL expressions are reproduced in Python:
+- old_*: COB of PY_STAGE_ME and its LIKE filter
+- index_*: index row built by REFRESH_STAGE_ME_PARAMETERS_COB and join condition of FN_RESOLVE_FILE_DATASETS
+The function itself is compared with the old filter in Snowflake by test_fn_resolve_file_datasets.py.
+"""
+import itertools
+import re
+
+import pytest
+
+
+def sql_like(value, pattern):
+    """Snowflake LIKE: % is any string, _ is any character, a backslash escapes the next character."""
+    regex = ""
+    chars = iter(pattern)
+    for c in chars:
+        if c == "\\":
+            regex += re.escape(next(chars, "\\"))
+        elif c == "%":
+            regex += ".*"
+        elif c == "_":
+            regex += "."
+        else:
+            regex += re.escape(c)
+    return re.fullmatch(regex, value, re.DOTALL) is not None
+
+
+def old_cobid(full_file_path):
+    """COB of PY_STAGE_ME: first number > 19000100 of the path split by _ - / and ."""
+    cob_list = [x for x in [int(s) for s in re.split(r'_|-|/|\.', full_file_path) if s.isdigit()] if x > 19000100]
+    return cob_list[0] if len(cob_list) > 0 else 19000101
+
+
+def old_match(container_name, file_path, row):
+    """Filter of PY_STAGE_ME on the COB resolved parameters"""
+    folder_path, _, file_name = file_path.rpartition("/")
+    source_folder = "/".join(filter(None, folder_path.split("/")))
+    return row["RAVEN_COBID"] == old_cobid(file_path) \
+        and sql_like(file_name.upper(), "%".join(row["FILE_NAME_COB"].upper().split("*"))) \
+        and sql_like(f"/{source_folder}/".upper(), (row["FOLDER_PATH_COB"] + "%").upper()) \
+        and (row["CONTAINER_NAME"] or "NO CONTAINER") == (container_name or "NO CONTAINER")
+
+
+def index_cobid(file_path):
+    """COB of FN_RESOLVE_FILE_DATASETS: first token of STRTOK_SPLIT_TO_TABLE(FILE_PATH, '_-/.') RLIKE '[0-9]+' and > 19000100"""
+    cobs = [int(t) for t in re.split(r"[_\-/.]", file_path) if t and re.fullmatch("[0-9]+", t) and int(t) > 19000100]
+    return cobs[0] if cobs else 19000101
+
+
+def index_row(row):
+    """Row of RAVEN.METADATA_FILE_RESOLUTION_INDEX built by REFRESH_STAGE_ME_PARAMETERS_COB"""
+    file_name_like = "%".join(row["FILE_NAME_COB"].upper().split("*"))
+    return {
+        "RAVEN_COBID": row["RAVEN_COBID"],
+        "CONTAINER_KEY": row["CONTAINER_NAME"] or "NO CONTAINER",
+        "FOLDER_PREFIX": row["FOLDER_PATH_COB"].upper(),
+        "FILE_NAME_PREFIX": re.match(r"[^%_\\]*", file_name_like).group(0),
+        "FILE_NAME_LIKE": file_name_like,
+    }
+
+
+def index_match(container_name, file_path, index):
+    """Join condition of FN_RESOLVE_FILE_DATASETS"""
+    file_name = file_path.split("/")[-1]
+    source_folder = re.sub("/+", "/", file_path[:len(file_path) - len(file_name)].strip("/"))
+    return index["RAVEN_COBID"] == index_cobid(file_path) \
+        and index["CONTAINER_KEY"] == (container_name or "NO CONTAINER") \
+        and file_name.upper().startswith(index["FILE_NAME_PREFIX"]) \
+        and sql_like(file_name.upper(), index["FILE_NAME_LIKE"]) \
+        and sql_like(f"/{source_folder}/".upper(), index["FOLDER_PREFIX"] + "%")
+
+
+def parameters(cobid, container_name, folder_path_cob, file_name_cob):
+    return {"RAVEN_COBID": cobid, "CONTAINER_NAME": container_name, "FOLDER_PATH_COB": folder_path_cob, "FILE_NAME_COB": file_name_cob}
+
+
+PARAMETERS = [
+    parameters(20230626, "trades", "/hd_input/2023/202306/20230626/", "TRADES_*.csv"),
+    parameters(20230626, "", "/risk/", "var_20230626.csv"),
+    parameters(20230626, None, "/risk/eod/", "pnl*summary*.csv"),
+    parameters(20230626, "market", "/", "prices-*.csv.gz"),
+    parameters(19000101, "static", "/reference/", "BOOK_*.csv"),
+    parameters(20230626, "static", "/reference/", "a_b%c.csv"),
+    parameters(20230626, "static", "/reference/", "a\\_b.csv"),
+    parameters(20230627, "trades", "/hd_input/2023/202306/20230627/", "TRADES_*.csv"),
+]
+
+FILES = [
+    ("trades", "hd_input/2023/202306/20230626/TRADES_EU.csv"),
+    ("trades", "/hd_input//2023/202306/20230626/trades_.csv"),
+    ("trades", "hd_input/2023/202306/20230626/sub/TRADES_US.csv"),
+    ("trades", "hd_input/2023/202306/20230626/TRADES.csv"),
+    ("trades", "hd_input/2023/202306/20230627/TRADES_EU.csv"),
+    ("", "risk/var_20230626.csv"),
+    ("", "risk/eod/PNL_20230626_summary_v2.csv"),
+    ("other", "risk/var_20230626.csv"),
+    ("market", "prices-20230626.csv.gz"),
+    ("market", "archive/prices-20230626.csv.gz"),
+    ("static", "reference/BOOK_LIST.csv"),
+    ("static", "reference/BOOK_LIST_20230626.csv"),
+    ("static", "reference/axb123c_20230626.csv"),
+    ("static", "reference/a_b_20230626.csv"),
+    ("static", "reference/axb.csv"),
+    ("static", "reference/a_b.csv"),
+]
+
+
+@pytest.mark.parametrize("file_path, cobid", [
+    ("hd_input/2023/202306/20230626/file.csv", 20230626),
+    ("data/file_20230626_v2.csv", 20230626),
+    ("data/20230626/file_20230627.csv", 20230626),
+    ("data/file-20230626.csv.gz", 20230626),
+    ("data//x/20230626.csv", 20230626),
+    ("data/file_020230626.csv", 20230626),
+    ("data/file_19000100.csv", 19000101),
+    ("data/20230626a/file.csv", 19000101),
+    ("data/file.csv", 19000101),
+])
+def test_cob_extraction(file_path, cobid):
+    assert old_cobid(file_path) == cobid
+    assert index_cobid(file_path) == cobid
+
+
+@pytest.mark.parametrize("row_container, file_container, expected", [
+    ("", "", True),
+    (None, "", True),
+    ("", "NO CONTAINER", True),
+    ("static", "static", True),
+    ("static", "", False),
+    ("", "static", False),
+])
+def test_container_default(row_container, file_container, expected):
+    row = parameters(19000101, row_container, "/reference/", "BOOK_*.csv")
+    assert old_match(file_container, "reference/BOOK_LIST.csv", row) is expected
+    assert index_match(file_container, "reference/BOOK_LIST.csv", index_row(row)) is expected
+
+
+@pytest.mark.parametrize("file_path, expected", [
+    ("risk/eod/file.csv", True),
+    ("/RISK//EOD/file.csv", True),
+    ("risk/eod/2023/file.csv", True),
+    ("risk/eodx/file.csv", False),
+    ("risk/file.csv", False),
+    ("file.csv", False),
+])
+def test_folder_prefix(file_path, expected):
+    row = parameters(19000101, "", "/risk/eod/", "*.csv")
+    assert old_match("", file_path, row) is expected
+    assert index_match("", file_path, index_row(row)) is expected
+
+
+@pytest.mark.parametrize("file_name, expected", [
+    ("TRADES_EU.csv", True),
+    ("trades_.csv", True),
+    ("TRADES_EU_2.csv", True),
+    ("TRADES.csv", False),
+    ("XTRADES_EU.csv", False),
+])
+def test_star_wildcard(file_name, expected):
+    row = parameters(19000101, "", "/", "TRADES_*.csv")
+    assert old_match("", file_name, row) is expected
+    assert index_match("", file_name, index_row(row)) is expected
+
+
+@pytest.mark.parametrize("file_name_cob, file_name, expected", [
+    ("a_b.csv", "a_b.csv", True),
+    ("a_b.csv", "axb.csv", True),
+    ("a_b.csv", "ab.csv", False),
+    ("a%b.csv", "a123b.csv", True),
+    ("a%b.csv", "ab.csv", True),
+    ("a%b.csv", "a123c.csv", False),
+    ("a\\_b.csv", "a_b.csv", True),
+    ("a\\_b.csv", "axb.csv", False),
+])
+def test_underscore_and_percent(file_name_cob, file_name, expected):
+    row = parameters(19000101, "", "/", file_name_cob)
+    assert old_match("", file_name, row) is expected
+    assert index_match("", file_name, index_row(row)) is expected
+
+
+def test_file_name_prefix_is_literal():
+    for row in PARAMETERS:
+        index = index_row(row)
+        assert not re.search(r"[%_\\]", index["FILE_NAME_PREFIX"])
+        assert index["FILE_NAME_LIKE"].startswith(index["FILE_NAME_PREFIX"])
+
+
+def test_index_matches_view_filter():
+    for (container_name, file_path), row in itertools.product(FILES, PARAMETERS):
+        assert index_match(container_name, file_path, index_row(row)) == old_match(container_name, file_path, row), (container_name, file_path, row)
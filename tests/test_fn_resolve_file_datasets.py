@@ -0,0 +1,31 @@
+"""
+RAVEN.FN_RESOLVE_FILE_DATASETS compared in Snowflake with the LIKE filter PY_STAGE_ME ran before the resolution index
+(tests/sql/FN_RESOLVE_FILE_DATASETS.sql).
+
+Runs against a deployed RAVEN database, set RAVEN_TEST_DATABASE (e.g. dvlp_musbi_REGOPS) and RAVEN_TEST_APP (e.g. musbi).
+Skipped when they are not set.
+"""
+import os
+import sys
+
+import pytest
+
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope="module")
+def session():
+    if not (os.environ.get("RAVEN_TEST_DATABASE") and os.environ.get("RAVEN_TEST_APP")):
+        pytest.skip("RAVEN_TEST_DATABASE and RAVEN_TEST_APP are not set")
+    sys.path.insert(0, os.path.join(ROOT_PATH, "libs"))
+    from raven_app import RavenTargetDB as raven_app
+
+    session = raven_app(os.environ["RAVEN_TEST_DATABASE"], os.environ["RAVEN_TEST_APP"]).get_snowflake_session()
+    yield session
+    session.close()
+
+
+def test_function_matches_view_filter(session):
+    with open(os.path.join(ROOT_PATH, "tests", "sql", "FN_RESOLVE_FILE_DATASETS.sql")) as f:
+        differences = [r.as_dict() for r in session.sql(f.read()).collect()]
+    assert differences == []
@@ -0,0 +1,64 @@
+"""
+Primary key changes planned by create_tables.plan_table_migration, on a catalog snapshot built from the previous
+version of the CREATE TABLE command.
+"""
+import os
+import sys
+
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_PATH, "libs"))
+
+from create_tables import parse_create_table_columns, parse_primary_key, plan_table_migration
+
+OLD_CALENDAR = """CREATE or replace TABLE RAVEN.METADATA_CALENDAR (
+	COBID NUMBER(38,0) NOT NULL,
+	MY_DATE DATE NOT NULL,
+	constraint PK_METADATA_CALENDAR primary key (COBID)
+)
+;"""
+
+NEW_CALENDAR = """CREATE or replace TABLE RAVEN.METADATA_CALENDAR (
+	COBID NUMBER(38,0) NOT NULL,
+	MY_DATE DATE NOT NULL,
+	MARKET VARCHAR(50) COLLATE 'en-ci' NOT NULL DEFAULT '',
+	constraint PK_METADATA_CALENDAR primary key (COBID, MARKET)
+)
+;"""
+
+
+def catalog_of(obj_cmd):
+    return {"METADATA_CALENDAR": {"BYTES": 1024, "CLUSTERING_KEY": None, "COLUMNS": parse_create_table_columns(obj_cmd),
+                                  "PRIMARY_KEY": parse_primary_key(obj_cmd)}}
+
+
+def test_primary_key_unchanged():
+    assert plan_table_migration(NEW_CALENDAR, catalog_of(NEW_CALENDAR))["STRATEGY"] == "NONE"
+
+
+def test_primary_key_changed_in_place():
+    plan = plan_table_migration(NEW_CALENDAR, catalog_of(OLD_CALENDAR))
+    assert plan["STRATEGY"] == "IN_PLACE"
+    assert plan["STATEMENTS"] == [
+        "ALTER TABLE RAVEN.METADATA_CALENDAR ADD COLUMN MARKET VARCHAR(50) COLLATE 'en-ci' NOT NULL DEFAULT ''",
+        "ALTER TABLE RAVEN.METADATA_CALENDAR DROP PRIMARY KEY",
+        "ALTER TABLE RAVEN.METADATA_CALENDAR ADD CONSTRAINT PK_METADATA_CALENDAR PRIMARY KEY (COBID, MARKET)"]
+
+
+def test_primary_key_only_change():
+    catalog = catalog_of(NEW_CALENDAR)
+    catalog["METADATA_CALENDAR"]["PRIMARY_KEY"] = []
+    plan = plan_table_migration(NEW_CALENDAR, catalog)
+    assert plan["CHANGES"] == [("PRIMARY_KEY", "COBID,MARKET")]
+    assert plan["STATEMENTS"] == ["ALTER TABLE RAVEN.METADATA_CALENDAR ADD CONSTRAINT PK_METADATA_CALENDAR PRIMARY KEY (COBID, MARKET)"]
+
+
+def test_column_primary_key():
+    assert parse_primary_key("CREATE TABLE RAVEN.T (ID NUMBER(38,0) PRIMARY KEY, NAME VARCHAR(10))") == ["ID"]
+    assert parse_create_table_columns("CREATE TABLE RAVEN.T (ID NUMBER(38,0) PRIMARY KEY)")[0]["IS_NULLABLE"] is False
+
+
+def test_calendar_model_file():
+    with open(os.path.join(ROOT_PATH, "models", "tables", "METADATA_CALENDAR.sql")) as f:
+        obj_cmd = f.read()
+    assert parse_primary_key(obj_cmd) == ["COBID", "MARKET"]
+    assert plan_table_migration(obj_cmd, catalog_of(obj_cmd))["STRATEGY"] == "NONE"